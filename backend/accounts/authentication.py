@@ -0,0 +1,56 @@
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+
+from .models import Employee
+from .tokens import device_fingerprint, get_token_generation
+
+
+class DeviceTokenUser(TokenUser):
+    """
+    Usuário reconstruído apenas a partir dos claims do token (sem acesso ao banco).
+    """
+
+    @cached_property
+    def employee_id(self):
+        return self.token["employee_id"]
+
+    @cached_property
+    def employee(self):
+        # Instância leve: suficiente para filtros e chaves estrangeiras.
+        # Funcionários inativos têm os tokens revogados.
+        return Employee(pk=self.employee_id, user_id=self.id, ativo=True)
+
+    @cached_property
+    def email(self):
+        return self.token.get("email", "")
+
+    @cached_property
+    def phone(self):
+        return self.token.get("phone")
+
+    def get_full_name(self):
+        return self.token.get("name", "")
+
+    def has_device(self, device_id):
+        return self.token.get("device") == device_fingerprint(device_id)
+
+
+class DeviceBoundJWTAuthentication(JWTAuthentication):
+    """
+    Autenticação dos endpoints quentes de presença.
+    Tokens emitidos no login com dispositivo (claims employee_id/device/gen) são validados
+    sem consulta ao banco; a revogação é verificada no cache compartilhado.
+    Tokens sem esses claims seguem o fluxo padrão, com leitura do usuário no banco.
+    """
+
+    def get_user(self, validated_token):
+        if "employee_id" not in validated_token or "device" not in validated_token:
+            return super().get_user(validated_token)
+
+        user_id = validated_token.get("user_id")
+        if validated_token.get("gen", 0) != get_token_generation(user_id):
+            raise AuthenticationFailed("Token revogado", code="token_revoked")
+
+        return DeviceTokenUser(validated_token)
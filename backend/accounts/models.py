@@ -39,6 +39,8 @@ class User(AbstractUser):
 
     is_employee = models.BooleanField(default=False)
     is_admin = models.BooleanField(default=False)
+    # Geração dos tokens JWT (ver accounts/tokens.py); o cache compartilhado guarda só uma cópia
+    token_generation = models.PositiveIntegerField(default=0, editable=False)
 
     objects: BaseUserManager = UserManager()  # type: ignore
 
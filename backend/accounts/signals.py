@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Employee, User, UserDevice
+from .tokens import revoke_user_tokens
+
+
+# Guarda os valores carregados do banco para detectar mudanças no save.
+# Lê de __dict__ para não disparar consultas em campos adiados (only/defer).
+
+@receiver(post_init, sender=UserDevice)
+def remember_device(sender, instance, **kwargs):
+    instance._original_device_id = instance.__dict__.get("device_id")
+
+
+@receiver(post_init, sender=Employee)
+def remember_employee(sender, instance, **kwargs):
+    instance._original_ativo = instance.__dict__.get("ativo")
+
+
+@receiver(post_init, sender=User)
+def remember_user(sender, instance, **kwargs):
+    instance._original_access = tuple(
+        instance.__dict__.get(field) for field in ("is_active", "is_staff", "is_superuser")
+    )
+
+
+# Revogação dos tokens
+
+@receiver(post_save, sender=UserDevice)
+def revoke_on_device_change(sender, instance, created, **kwargs):
+    if not created and instance._original_device_id not in (None, instance.device_id):
+        revoke_user_tokens(instance.user_id)
+    instance._original_device_id = instance.device_id
+
+
+@receiver(post_delete, sender=UserDevice)
+def revoke_on_device_removed(sender, instance, **kwargs):
+    revoke_user_tokens(instance.user_id)
+
+
+@receiver(post_save, sender=Employee)
+def revoke_on_employee_change(sender, instance, created, **kwargs):
+    if not created and instance._original_ativo not in (None, instance.ativo):
+        revoke_user_tokens(instance.user_id)
+    instance._original_ativo = instance.ativo
+
+
+@receiver(post_delete, sender=Employee)
+def revoke_on_employee_removed(sender, instance, **kwargs):
+    revoke_user_tokens(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def revoke_on_access_change(sender, instance, created, **kwargs):
+    access = (instance.is_active, instance.is_staff, instance.is_superuser)
+    if not created and None not in instance._original_access and access != instance._original_access:
+        revoke_user_tokens(instance.pk)
+    instance._original_access = access
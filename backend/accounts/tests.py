@@ -1,3 +1,124 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import caches
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+
+from attendance.models import WorkShift, WorkShiftLocation
+from attendance.services.shift_state import get_shift_state
+from .models import Employee, User, UserDevice
+from .views import LoginView
+
+
+class DeviceBoundTokenTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="token@test.com",
+            password="pass1234",
+            first_name="Token",
+        )
+        self.employee = Employee.objects.create(
+            user=self.user,
+            matricula="TOK01",
+            base_latitude=Decimal("10.0"),
+            base_longitude=Decimal("10.0")
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login('DEVICE123')}")
+
+    def login(self, device_id):
+        request = APIRequestFactory().post(
+            "/api/auth/login/",
+            {"email": "token@test.com", "password": "pass1234", "device_id": device_id},
+            format="json"
+        )
+        response = LoginView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["access"]
+
+    def open_shift(self):
+        shift = WorkShift.objects.create(
+            employee=self.employee,
+            start_latitude=10,
+            start_longitude=10,
+            start_time=timezone.now() - timedelta(minutes=30)
+        )
+        WorkShiftLocation.objects.create(
+            work_shift=shift,
+            latitude=10,
+            longitude=10,
+            recorded_at=timezone.now() - timedelta(minutes=5)
+        )
+        return shift
+
+    def track(self, device_id="DEVICE123"):
+        return self.client.post(
+            reverse("shift-tracking"),
+            {"device_id": device_id, "latitude": 10.001, "longitude": 10.001},
+            format="json"
+        )
+
+    def test_tracking_authenticates_without_user_or_device_queries(self):
+        self.open_shift()
+        get_shift_state(self.employee.id)
+        # Estado da jornada em cache: apenas insert da localização, sequência do feed e upsert da última posição
+        with self.assertNumQueries(3):
+            response = self.track()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_other_device_is_rejected_by_token_claim(self):
+        self.open_shift()
+        response = self.track(device_id="OTHER")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_device_change_revokes_tokens(self):
+        self.open_shift()
+        device = UserDevice.objects.get(user=self.user)
+        device.device_id = "NEWDEVICE"
+        device.save()
+
+        response = self.track()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login('NEWDEVICE')}")
+        response = self.track(device_id="NEWDEVICE")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_revocation_survives_cache_eviction(self):
+        self.open_shift()
+        self.employee.ativo = False
+        self.employee.save()
+        self.employee.ativo = True
+        self.employee.save()
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_generation, 2)
+
+        caches["shared"].clear()
+        response = self.track()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_refresh_token_is_rejected(self):
+        request = APIRequestFactory().post(
+            "/api/auth/login/",
+            {"email": "token@test.com", "password": "pass1234", "device_id": "DEVICE123"},
+            format="json"
+        )
+        refresh = LoginView.as_view()(request).data["refresh"]
+        response = APIClient().post(reverse("token_refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        device = UserDevice.objects.get(user=self.user)
+        device.device_id = "NEWDEVICE"
+        device.save()
+        response = APIClient().post(reverse("token_refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_employee_is_revoked(self):
+        self.open_shift()
+        self.employee.ativo = False
+        self.employee.save()
+
+        response = self.track()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
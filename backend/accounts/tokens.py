@@ -0,0 +1,76 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Employee, User
+
+
+# Geração de tokens por usuário: incrementada a cada troca de dispositivo,
+# desativação ou mudança de permissão. Tokens de gerações anteriores são rejeitados.
+# O valor de referência fica em User.token_generation; o cache compartilhado é só uma cópia
+# (uma entrada descartada volta a ser lida do banco, nunca cai para 0).
+TOKEN_GENERATION_KEY = "auth:token_generation:{user_id}"
+
+
+def device_fingerprint(device_id):
+    """Hash do device_id usado no claim de vínculo do dispositivo"""
+    return hmac.new(
+        settings.SECRET_KEY.encode(),
+        str(device_id).encode(),
+        hashlib.sha256
+    ).hexdigest()[:32]
+
+
+def get_token_generation(user_id):
+    cache = caches["shared"]
+    key = TOKEN_GENERATION_KEY.format(user_id=user_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = User.objects.filter(pk=user_id).values_list("token_generation", flat=True).first()
+        if generation is None:
+            # Usuário removido: nenhuma geração é válida
+            return -1
+        # add: não sobrescreve o valor gravado por uma revogação concorrente
+        cache.add(key, generation, timeout=None)
+    return generation
+
+
+def revoke_user_tokens(user_id):
+    """Invalida todos os tokens já emitidos para o usuário (incremento atômico no banco)"""
+    with transaction.atomic():
+        User.objects.filter(pk=user_id).update(token_generation=F("token_generation") + 1)
+        generation = User.objects.filter(pk=user_id).values_list("token_generation", flat=True).first()
+    # Gravado já (não no commit): se a transação for desfeita, tokens válidos são rejeitados até
+    # o cache perder a entrada, nunca o contrário
+    caches["shared"].set(
+        TOKEN_GENERATION_KEY.format(user_id=user_id), -1 if generation is None else generation, timeout=None
+    )
+
+
+def tokens_for_device(user, device_id):
+    """
+    Gera o par de tokens JWT com identidade e vínculo do dispositivo embutidos,
+    para que os endpoints de presença autentiquem sem consultar o banco.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh["email"] = user.email
+    refresh["name"] = user.get_full_name() or user.email
+    refresh["phone"] = user.phone
+    refresh["is_staff"] = user.is_staff
+    refresh["is_superuser"] = user.is_superuser
+    refresh["device"] = device_fingerprint(device_id)
+    refresh["gen"] = get_token_generation(user.pk)
+
+    try:
+        employee = user.employee
+    except Employee.DoesNotExist:
+        employee = None
+    if employee is not None and employee.ativo:
+        refresh["employee_id"] = employee.id
+
+    return refresh
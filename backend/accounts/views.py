@@ -2,11 +2,13 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.exceptions import ValidationError, PermissionDenied
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import UserDevice
 from rest_framework.views import APIView
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import get_token_generation, tokens_for_device
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -39,9 +41,34 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
                 device_id=device_id
             )
 
+        # Tokens com identidade e vínculo do dispositivo embutidos
+        refresh = tokens_for_device(user, device_id)
+        data["refresh"] = str(refresh)
+        data["access"] = str(refresh.access_token)
+
         return data
 
 
+class GenerationTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh que respeita a revogação: um refresh token com claim `gen` de geração anterior
+    (logout, troca de dispositivo, desativação) não emite novos access tokens.
+    Configurado em SIMPLE_JWT["TOKEN_REFRESH_SERIALIZER"].
+    """
+
+    def validate(self, attrs):
+        try:
+            refresh = self.token_class(attrs["refresh"])
+        except TokenError:
+            # Token inválido ou expirado: tratado pela validação padrão
+            return super().validate(attrs)
+
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        if "gen" in refresh and refresh["gen"] != get_token_generation(user_id):
+            raise AuthenticationFailed("Token revogado", code="token_revoked")
+        return super().validate(attrs)
+
+
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
@@ -75,8 +102,8 @@ class LoginView(APIView):
                 {'error': "Usuário já está logado em outro dipositivo"},
                 status=status.HTTP_403_FORBIDDEN)
 
-        # Gera tokens JWT
-        refresh = RefreshToken.for_user(user)
+        # Gera tokens JWT com identidade e vínculo do dispositivo
+        refresh = tokens_for_device(user, device.device_id)
 
         return Response({
             "refresh": str(refresh),
@@ -1,20 +1,55 @@
 from pydoc import resolve
 
 from django.contrib import admin
-from .models import WorkShift, FraudAlert
+from accounts.models import Employee
+from .services.risk_score import resolve_alerts
+from .models import WorkShift, FraudAlert, DailyAttendanceSummary, TrackArchiveEntry, WorkShiftTrack
+
+
+class EmployeeListFilter(admin.RelatedFieldListFilter):
+    """Filtro por funcionário com o usuário no mesmo SELECT (Employee.__str__ usa user.email)"""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin) or ("pk",)
+        employees = Employee.objects.select_related("user").order_by(*ordering)
+        return [(employee.pk, str(employee)) for employee in employees]
 
 
 @admin.register(WorkShift)
 class WorkShiftAdmin(admin.ModelAdmin):
     list_display = ("id", "employee", "start_time", "end_time", "status",)
-    list_filter = ("employee",)
+    list_filter = (("employee", EmployeeListFilter),)
+    list_select_related = ("employee__user",)
+    # Sem o COUNT(*) da tabela inteira além do COUNT filtrado
+    show_full_result_count = False
+
+@admin.register(DailyAttendanceSummary)
+class DailyAttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ("employee", "day", "worked_minutes", "delay_minutes", "extra_minutes", "shift_count", "adjusted", "alert_count",)
+    list_filter = ("adjusted", "day",)
+    search_fields = ("employee__user__email", "employee__matricula",)
+    list_select_related = ("employee__user",)
+
+@admin.register(WorkShiftTrack)
+class WorkShiftTrackAdmin(admin.ModelAdmin):
+    list_display = ("work_shift", "original_points", "stored_points", "tolerance_m", "max_error_m", "created_at",)
+    exclude = ("data",)
+    list_select_related = ("work_shift__employee__user",)
+
+@admin.register(TrackArchiveEntry)
+class TrackArchiveEntryAdmin(admin.ModelAdmin):
+    list_display = ("work_shift", "month", "path", "points", "archived_at",)
+    list_filter = ("month",)
+    list_select_related = ("work_shift__employee__user",)
 
 @admin.register(FraudAlert)
 class FraudAlertAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'fraud_type', 'short_description', 'created_at', 'resolved',)
+    list_display = ('id', 'user', 'fraud_type', 'short_description', 'occurrences', 'created_at', 'last_seen_at', 'resolved',)
     list_filter = ('fraud_type', 'resolved', 'created_at',)
     search_fields = ('user__email', 'description',)
     ordering = ('-created_at',)
+    list_select_related = ('user',)
+    show_full_result_count = False
     actions = ['mark_as_resolved']
     def short_description(self, obj):
         return obj.description[:50] + '...' if len(obj.description) > 50 else obj.description
@@ -22,5 +57,5 @@ class FraudAlertAdmin(admin.ModelAdmin):
     short_description.short_description = 'Descrição'
 
     def mark_as_resolved(self, request, queryset):
-        queryset.update(resolved=True)
+        resolve_alerts(queryset)
     mark_as_resolved.short_description = 'Marcar como resolvido'
\ No newline at end of file
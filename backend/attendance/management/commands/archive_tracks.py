@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from attendance.services.track_archive import ARCHIVE_BATCH_SIZE, archive_old_tracks, get_archive_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as trilhas (pontos brutos e trilhas comprimidas) de jornadas antigas para o arquivo frio: "
+        "arquivos colunares comprimidos por mês em TRACK_ARCHIVE_DIR, indexados por TrackArchiveEntry"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, dest="older_than_days",
+                            help="Idade mínima da jornada encerrada, em dias (padrão TRACK_ARCHIVE_AFTER_DAYS)")
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="Jornadas por lote")
+
+    def handle(self, *args, **options):
+        shifts = points = 0
+        for batch_shifts, batch_points in archive_old_tracks(options["older_than_days"], options["batch_size"]):
+            shifts += batch_shifts
+            points += batch_points
+            self.stdout.write(f"{shifts} jornadas, {points} pontos arquivados")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{shifts} jornadas arquivadas em {get_archive_dir()} ({points} pontos)"
+        ))
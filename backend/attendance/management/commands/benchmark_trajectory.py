@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from attendance.utils.antifraud import haversine
+from attendance.utils.trajectory import MODES, GEODESIC, analyze_trajectory
+
+try:
+    from geopy.distance import geodesic
+except ImportError:
+    geodesic = None
+
+
+class Command(BaseCommand):
+    help = "Compara o cálculo vetorizado de trajetórias (utils.trajectory) com as funções escalares"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--points", type=int, default=10000, help="Pontos na trajetória sintética")
+        parser.add_argument("--repeat", type=int, default=3, help="Repetições (vale o melhor tempo)")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def synthetic_track(self, points, seed):
+        """Trajetória de um vistoriador: um ponto por minuto, deslocamentos de até ~300 m"""
+        rng = np.random.default_rng(seed)
+        latitudes = -23.55 + np.cumsum(rng.normal(0, 0.001, points))
+        longitudes = -46.63 + np.cumsum(rng.normal(0, 0.001, points))
+        times = np.arange(points, dtype=float) * 60
+        return latitudes, longitudes, times
+
+    def best_of(self, repeat, func):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def handle(self, *args, **options):
+        points, repeat = options["points"], options["repeat"]
+        latitudes, longitudes, times = self.synthetic_track(points, options["seed"])
+        lat_list, lon_list = latitudes.tolist(), longitudes.tolist()
+
+        def scalar_haversine():
+            return [
+                haversine(lat_list[i - 1], lon_list[i - 1], lat_list[i], lon_list[i])
+                for i in range(1, points)
+            ]
+
+        results = {}
+        results["escalar haversine (math)"] = self.best_of(repeat, scalar_haversine)
+        if geodesic is not None:
+            results["escalar geodesic (geopy)"] = self.best_of(repeat, lambda: [
+                geodesic((lat_list[i - 1], lon_list[i - 1]), (lat_list[i], lon_list[i])).km
+                for i in range(1, points)
+            ])
+
+        for mode in MODES:
+            results[f"vetorizado {mode}"] = self.best_of(
+                repeat, lambda mode=mode: analyze_trajectory(latitudes, longitudes, times, mode=mode)["segment_km"]
+            )
+
+        reference = np.asarray(results[f"vetorizado {GEODESIC}"][1])
+        baseline = results["escalar haversine (math)"][0]
+        self.stdout.write(f"{points} pontos, melhor de {repeat} execuções")
+        for name, (elapsed, distances) in results.items():
+            error_m = np.max(np.abs(np.asarray(distances) - reference)) * 1000
+            self.stdout.write(
+                f"{name:<28} {elapsed * 1000:10.2f} ms  {baseline / elapsed:7.1f}x  "
+                f"erro máx. vs geodésico {error_m:8.3f} m"
+            )
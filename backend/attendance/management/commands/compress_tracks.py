@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from attendance.services.track_compression import (
+    TRACK_TOLERANCE_M, compress_shift_track, compression_candidates, compression_cutoff
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Comprime as trilhas de jornadas encerradas há mais de TRACK_COMPRESS_AFTER_DAYS dias "
+        "que ainda guardam os pontos brutos (WorkShiftLocation)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tolerance", type=float, default=TRACK_TOLERANCE_M,
+                            help=f"Erro posicional máximo em metros (padrão {TRACK_TOLERANCE_M})")
+        parser.add_argument("--older-than", type=int, dest="older_than_days",
+                            help="Idade mínima da jornada encerrada, em dias (padrão TRACK_COMPRESS_AFTER_DAYS)")
+
+    def handle(self, *args, **options):
+        shift_ids = compression_candidates(compression_cutoff(options["older_than_days"]))
+        original = stored = size = 0
+        for shift_id in shift_ids.iterator():
+            track = compress_shift_track(shift_id, options["tolerance"])
+            original += track.original_points
+            stored += track.stored_points
+            size += len(track.data)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{original} pontos comprimidos em {stored} ({size} bytes)"
+        ))
@@ -0,0 +1,92 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.services.workshift_service import MIN_SHIFT_DURATION, MIN_TRACKING_INTERVAL
+from attendance.utils.load_harness import (
+    HttpTransport, InProcessTransport, LoadRun, build_actors, compare_with_baseline, create_actors, delete_actors,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga sintética de campo: N vistoriadores (login, início, pontos, fim) e M supervisores "
+        "consultando o painel. Relata vazão, latência p50/p95/p99 e consultas SQL por endpoint e "
+        "compara com uma execução de referência. Cria usuários @loadtest.invalid no banco configurado "
+        "(removidos ao final): use um banco de teste."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--inspectors", type=int, default=20, help="Vistoriadores simulados")
+        parser.add_argument("--supervisors", type=int, default=2, help="Supervisores consultando o painel")
+        parser.add_argument("--fixes", type=int, default=10, help="Pontos enviados por vistoriador")
+        parser.add_argument("--cadence", type=int, default=60, help="Segundos (simulados) entre pontos")
+        parser.add_argument("--poll-interval", type=int, default=30, help="Segundos (simulados) entre consultas ao painel")
+        parser.add_argument("--url", help="Servidor em execução (ex.: http://localhost:8000); padrão: no próprio processo")
+        parser.add_argument("--login-path", default="/api/auth/login/", help="Rota de login dos vistoriadores (--url)")
+        parser.add_argument("--concurrency", type=int, default=1, help="Requisições simultâneas (apenas com --url)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--baseline", help="JSON de uma execução anterior para comparação")
+        parser.add_argument("--save", help="Grava o relatório em JSON (referência para execuções futuras)")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Piora aceita vs. referência (0.2 = 20%%)")
+        parser.add_argument("--keep-data", action="store_true", help="Não remove os usuários e jornadas sintéticos")
+
+    def handle(self, *args, **options):
+        if options["cadence"] < MIN_TRACKING_INTERVAL.total_seconds():
+            raise CommandError(f"--cadence deve ser de pelo menos {int(MIN_TRACKING_INTERVAL.total_seconds())} s")
+        if (options["fixes"] + 1) * options["cadence"] < MIN_SHIFT_DURATION.total_seconds():
+            raise CommandError("Jornada simulada menor que a duração mínima: aumente --fixes ou --cadence")
+        if options["concurrency"] > 1 and not options["url"]:
+            raise CommandError("--concurrency só vale com --url (no próprio processo as requisições são sequenciais)")
+
+        baseline = None
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+
+        transport = HttpTransport(options["url"], options["login_path"]) if options["url"] else InProcessTransport()
+        delete_actors()
+        inspectors, staff = create_actors(options["inspectors"], options["supervisors"])
+        try:
+            actors = build_actors(
+                inspectors, staff, options["fixes"], options["cadence"], options["poll_interval"], options["seed"]
+            )
+            report = LoadRun(transport, actors, concurrency=options["concurrency"]).run()
+        finally:
+            if not options["keep_data"]:
+                delete_actors()
+
+        report["scenario"] = {
+            key: options[key] for key in ("inspectors", "supervisors", "fixes", "cadence", "poll_interval", "concurrency")
+        }
+        report["scenario"]["mode"] = "http" if options["url"] else "in-process"
+        self.print_report(report)
+
+        if options["save"]:
+            Path(options["save"]).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Relatório gravado em {options['save']}")
+
+        if baseline:
+            regressions = compare_with_baseline(report, baseline, options["tolerance"])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f"Regressão em {name}: {metric} {before} -> {after}"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressão(ões) acima de {options['tolerance']:.0%}")
+            self.stdout.write(self.style.SUCCESS("Sem regressões em relação à referência"))
+
+    def print_report(self, report):
+        scenario = report["scenario"]
+        self.stdout.write(
+            f"{scenario['inspectors']} vistoriadores, {scenario['supervisors']} supervisores ({scenario['mode']}), "
+            f"{report['wall_seconds']} s"
+        )
+        self.stdout.write(
+            f"{'endpoint':<26} {'req':>6} {'erros':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL méd':>8} {'SQL máx':>8}"
+        )
+        for name, stats in report["endpoints"].items():
+            queries_avg = "-" if stats["queries_avg"] is None else stats["queries_avg"]
+            queries_max = "-" if stats["queries_max"] is None else stats["queries_max"]
+            self.stdout.write(
+                f"{name:<26} {stats['requests']:>6} {stats['errors']:>6} {stats['throughput_rps']:>8} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {queries_avg:>8} {queries_max:>8}"
+            )
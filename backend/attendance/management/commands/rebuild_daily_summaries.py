@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from attendance.services.daily_summary import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = "Regenera os resumos diários de ponto (DailyAttendanceSummary) a partir das jornadas e alertas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--employee", type=int, action="append", dest="employees",
+                            help="Id do funcionário (pode ser repetido). Padrão: todos")
+        parser.add_argument("--start-date", help="Dia inicial (AAAA-MM-DD)")
+        parser.add_argument("--end-date", help="Dia final (AAAA-MM-DD)")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for option in ("start_date", "end_date"):
+            value = options[option]
+            dates[option] = parse_date(value) if value else None
+            if value and dates[option] is None:
+                raise CommandError(f"Data inválida: {value} (use AAAA-MM-DD)")
+
+        total = rebuild_daily_summaries(options["employees"], dates["start_date"], dates["end_date"])
+        self.stdout.write(self.style.SUCCESS(f"{total} resumos diários gerados"))
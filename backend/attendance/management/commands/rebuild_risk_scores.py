@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from attendance.services.risk_score import rebuild_risk_scores
+
+
+class Command(BaseCommand):
+    help = "Recalcula o score de risco (EmployeeRiskScore) de todos os funcionários a partir dos alertas em aberto"
+
+    def handle(self, *args, **options):
+        total = rebuild_risk_scores()
+        self.stdout.write(self.style.SUCCESS(f"{total} scores de risco recalculados"))
@@ -0,0 +1,159 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+# Os serviços são importados dentro das funções: os processos do pool (spawn) importam
+# este módulo antes de configurar o Django.
+
+
+def _init_worker(database_name):
+    # Processo novo (spawn): não herda a conexão nem o cursor abertos no processo pai.
+    # Usa o mesmo banco do processo pai (ex.: o banco de testes)
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = database_name
+    django.setup()
+
+
+def _rescan_chunk(shift_ids, rules):
+    from attendance.services.fraud_rescan import rescan_shifts
+
+    return rescan_shifts(shift_ids, rules)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reaplica as regras de fraude (FRAUD_POINTS) ao histórico de jornadas e pontos de tracking. "
+        "Alertas são gravados com upsert idempotente; execuções interrompidas continuam do checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        from attendance.services.fraud_rescan import RULES
+
+        parser.add_argument("--start-date", help="Jornadas iniciadas a partir do dia (AAAA-MM-DD)")
+        parser.add_argument("--end-date", help="Jornadas iniciadas até o dia (AAAA-MM-DD)")
+        parser.add_argument("--employee", type=int, action="append", dest="employees",
+                            help="Id do funcionário (pode ser repetido). Padrão: todos")
+        parser.add_argument("--rule", action="append", dest="rules", choices=sorted(RULES),
+                            help="Regra a reavaliar (pode ser repetida). Padrão: todas")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Jornadas por bloco de trabalho")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Processos do pool (0 = no próprio processo)")
+        parser.add_argument("--checkpoint", default=str(settings.BASE_DIR / "var" / "rescan_frauds.json"),
+                            help="Arquivo de checkpoint")
+        parser.add_argument("--restart", action="store_true", help="Ignora o checkpoint existente")
+
+    def handle(self, *args, **options):
+        from django.utils import timezone
+
+        from attendance.services.fraud_rescan import (
+            RULES, keyset_chunks, refresh_alert_summaries, rescan_queryset, rescan_shifts,
+        )
+        from attendance.services.risk_score import rebuild_risk_scores
+
+        dates = {}
+        for option in ("start_date", "end_date"):
+            value = options[option]
+            dates[option] = parse_date(value) if value else None
+            if value and dates[option] is None:
+                raise CommandError(f"Data inválida: {value} (use AAAA-MM-DD)")
+
+        rules = sorted(options["rules"] or RULES)
+        filters = {
+            "start_date": options["start_date"],
+            "end_date": options["end_date"],
+            "employees": sorted(options["employees"] or []),
+            "rules": rules,
+        }
+
+        self.checkpoint_path = options["checkpoint"]
+        after_id = None if options["restart"] else self.load_checkpoint(filters)
+        if after_id:
+            self.stdout.write(f"Retomando após a jornada {after_id}")
+
+        shift_ids = rescan_queryset(filters["employees"], dates["start_date"], dates["end_date"], after_id)
+        total = shift_ids.count()
+        chunks = keyset_chunks(shift_ids, options["chunk_size"])
+
+        started_at = timezone.now()
+        self.progress = {"total": total, "shifts": 0, "alerts": 0, "started": time.monotonic()}
+        if options["workers"] > 0:
+            self.run_in_pool(chunks, rules, filters, options["workers"])
+        else:
+            for chunk in chunks:
+                self.chunk_done(rescan_shifts(chunk, rules), chunk[-1], filters)
+
+        self.save_checkpoint(filters, None, finished=True)
+        # Alertas gravados em lote não passam por create_fraud_alert
+        rebuild_risk_scores()
+        refresh_alert_summaries(started_at)
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.progress['shifts']} jornadas reavaliadas, {self.progress['alerts']} alertas gravados"
+        ))
+
+    def run_in_pool(self, chunks, rules, filters, workers):
+        # Blocos em andamento, na ordem de envio: o checkpoint só avança até o
+        # último bloco contínuo concluído, para que a retomada não pule jornadas
+        in_flight = deque()
+        context = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=_init_worker, initargs=(str(connection.settings_dict["NAME"]),),
+        )
+        with pool:
+            for chunk in chunks:
+                in_flight.append((pool.submit(_rescan_chunk, chunk, rules), chunk[-1]))
+                if len(in_flight) >= workers * 2:
+                    wait([future for future, _ in in_flight], return_when=FIRST_COMPLETED)
+                    self.collect(in_flight, filters)
+            while in_flight:
+                wait([future for future, _ in in_flight], return_when=FIRST_COMPLETED)
+                self.collect(in_flight, filters)
+
+    def collect(self, in_flight, filters):
+        while in_flight and in_flight[0][0].done():
+            future, last_id = in_flight.popleft()
+            self.chunk_done(future.result(), last_id, filters)
+
+    def chunk_done(self, result, last_id, filters):
+        shifts, alerts = result
+        self.progress["shifts"] += shifts
+        self.progress["alerts"] += alerts
+        self.save_checkpoint(filters, last_id)
+
+        elapsed = time.monotonic() - self.progress["started"]
+        rate = self.progress["shifts"] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{self.progress['shifts']}/{self.progress['total']} jornadas, "
+            f"{self.progress['alerts']} alertas, {rate:.0f} jornadas/s"
+        )
+
+    def load_checkpoint(self, filters):
+        try:
+            with open(self.checkpoint_path) as checkpoint:
+                data = json.load(checkpoint)
+        except FileNotFoundError:
+            return None
+        if data.get("finished"):
+            return None
+        if data.get("filters") != filters:
+            raise CommandError(
+                "O checkpoint existente foi gerado com outros filtros. Use --restart ou outro --checkpoint."
+            )
+        return data.get("last_shift_id")
+
+    def save_checkpoint(self, filters, last_id, finished=False):
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as checkpoint:
+            json.dump({"filters": filters, "last_shift_id": last_id, "finished": finished}, checkpoint)
+        os.replace(tmp_path, self.checkpoint_path)
@@ -0,0 +1,73 @@
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from attendance.utils.query_budget import QueryRecorder, enforce_budget, publish
+
+
+def is_async_view(request):
+    """A rota da requisição aponta para uma view assíncrona (ex.: o stream SSE do painel)"""
+    try:
+        match = resolve(request.path_info, getattr(request, "urlconf", None))
+    except Resolver404:
+        return False
+    return iscoroutinefunction(match.func)
+
+
+class QueryBudgetMiddleware:
+    """
+    Mede as consultas SQL de cada requisição e confere o orçamento da view resolvida
+    (settings.QUERY_BUDGETS). Com QUERY_BUDGET_HEADERS (padrão: DEBUG) a resposta traz
+    X-Query-Count e X-Query-Time-Ms. Respostas em streaming só contam as consultas feitas
+    antes do primeiro byte.
+
+    Funciona em WSGI e ASGI: sob ASGI a cadeia de middlewares segue assíncrona e as
+    views assíncronas (ex.: o stream SSE) não são medidas.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder = QueryRecorder()
+        with recorder.installed():
+            response = self.get_response(request)
+        return self.finish(request, recorder, response)
+
+    async def __acall__(self, request):
+        if is_async_view(request):
+            return await self.get_response(request)
+
+        # As conexões são por thread e o código síncrono da requisição roda na thread do
+        # sync_to_async dela (ThreadSensitiveContext): o wrapper é instalado e removido lá
+        recorder = QueryRecorder()
+        installed = ExitStack()
+        await sync_to_async(installed.enter_context)(recorder.installed())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(installed.close)()
+        return self.finish(request, recorder, response)
+
+    def finish(self, request, recorder, response):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return response
+
+        report = recorder.report(match.view_name)
+        if getattr(settings, "QUERY_BUDGET_HEADERS", settings.DEBUG):
+            response["X-Query-Count"] = str(report["queries"])
+            response["X-Query-Time-Ms"] = str(report["sql_ms"])
+        publish(report)
+        enforce_budget(report)
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_workshift_adjusted_at_workshift_adjusted_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workshiftlocation',
+            name='recorded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_last_positions(apps, schema_editor):
+    WorkShift = apps.get_model("attendance", "WorkShift")
+    WorkShiftLocation = apps.get_model("attendance", "WorkShiftLocation")
+    WorkShiftLastPosition = apps.get_model("attendance", "WorkShiftLastPosition")
+
+    positions = []
+    for shift in WorkShift.objects.filter(end_time__isnull=True):
+        location = WorkShiftLocation.objects.filter(work_shift=shift).order_by("-created_at").first()
+        if location:
+            positions.append(WorkShiftLastPosition(
+                work_shift=shift,
+                latitude=location.latitude,
+                longitude=location.longitude,
+                recorded_at=location.recorded_at or location.created_at,
+            ))
+    WorkShiftLastPosition.objects.bulk_create(positions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_workshiftlocation_recorded_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkShiftLastPosition',
+            fields=[
+                ('work_shift', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='last_position', serialize=False, to='attendance.workshift')),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('recorded_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_last_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_employee_signature'),
+        ('attendance', '0005_workshiftlastposition'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fraudalert',
+            index=models.Index(condition=models.Q(('resolved', False)), fields=['-created_at'], name='fraudalert_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fraudalert',
+            index=models.Index(fields=['user', '-created_at'], name='fraudalert_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workshift',
+            index=models.Index(condition=models.Q(('end_time__isnull', True)), fields=['employee'], name='workshift_open_employee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workshift',
+            index=models.Index(fields=['employee', 'start_time'], name='workshift_employee_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workshift',
+            index=models.Index(condition=models.Q(('end_time__isnull', False)), fields=['employee', '-end_time'], name='workshift_closed_employee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workshiftlocation',
+            index=models.Index(fields=['work_shift', '-created_at'], name='location_shift_created_idx'),
+        ),
+    ]
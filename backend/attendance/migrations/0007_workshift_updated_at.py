@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_attendance_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workshift',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_employee_signature'),
+        ('attendance', '0007_workshift_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('worked_minutes', models.PositiveIntegerField(default=0)),
+                ('delay_minutes', models.PositiveIntegerField(default=0)),
+                ('extra_minutes', models.PositiveIntegerField(default=0)),
+                ('shift_count', models.PositiveIntegerField(default=0)),
+                ('adjusted', models.BooleanField(default=False)),
+                ('alert_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='accounts.employee')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('employee', 'day'), name='daily_summary_employee_day_uniq')],
+            },
+        ),
+    ]
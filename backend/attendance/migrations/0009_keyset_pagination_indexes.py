@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_employee_signature'),
+        ('attendance', '0008_dailyattendancesummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fraudalert',
+            index=models.Index(fields=['-created_at', '-id'], name='fraudalert_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workshift',
+            index=models.Index(fields=['-start_time', '-id'], name='workshift_start_id_idx'),
+        ),
+    ]
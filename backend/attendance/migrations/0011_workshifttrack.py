@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0010_fraudalert_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkShiftTrack',
+            fields=[
+                ('work_shift', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='track', serialize=False, to='attendance.workshift')),
+                ('data', models.BinaryField()),
+                ('original_points', models.PositiveIntegerField()),
+                ('stored_points', models.PositiveIntegerField()),
+                ('tolerance_m', models.FloatField()),
+                ('max_error_m', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0011_workshifttrack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackArchiveEntry',
+            fields=[
+                ('work_shift', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive_entry', serialize=False, to='attendance.workshift')),
+                ('month', models.CharField(max_length=7)),
+                ('path', models.CharField(max_length=255)),
+                ('offset', models.PositiveIntegerField()),
+                ('points', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='trackarchive_month_idx')],
+            },
+        ),
+    ]
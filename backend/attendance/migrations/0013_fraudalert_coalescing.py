@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_last_seen_at(apps, schema_editor):
+    FraudAlert = apps.get_model("attendance", "FraudAlert")
+    FraudAlert.objects.filter(last_seen_at__isnull=True).update(last_seen_at=models.F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0012_trackarchiveentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fraudalert',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fraudalert',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='fraudalert',
+            index=models.Index(condition=models.Q(('resolved', False)), fields=['user', 'work_shift', 'fraud_type', '-last_seen_at'], name='fraudalert_coalesce_idx'),
+        ),
+        migrations.RunPython(fill_last_seen_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_employee_signature'),
+        ('attendance', '0013_fraudalert_coalescing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeRiskScore',
+            fields=[
+                ('employee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='risk_score', serialize=False, to='accounts.employee')),
+                ('weight', models.FloatField(default=0)),
+                ('last_alert_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-weight'], name='riskscore_weight_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:36
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_updated_at(apps, schema_editor):
+    FraudAlert = apps.get_model("attendance", "FraudAlert")
+    FraudAlert.objects.update(updated_at=Coalesce("last_seen_at", "created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0014_employeeriskscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fraudalert',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='fraudalert',
+            index=models.Index(fields=['updated_at', 'id'], name='fraudalert_updated_id_idx'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_positions_sequence(apps, schema_editor):
+    FeedSequence = apps.get_model("attendance", "FeedSequence")
+    FeedSequence.objects.get_or_create(name="positions")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0015_fraudalert_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PositionTombstone',
+            fields=[
+                ('work_shift', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='position_tombstone', serialize=False, to='attendance.workshift')),
+                ('seq', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='workshiftlastposition',
+            name='first_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workshiftlastposition',
+            name='seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='workshiftlastposition',
+            index=models.Index(fields=['seq'], name='lastposition_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='positiontombstone',
+            index=models.Index(fields=['seq'], name='tombstone_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='positiontombstone',
+            index=models.Index(fields=['created_at'], name='tombstone_created_idx'),
+        ),
+        migrations.RunPython(create_positions_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_employee_signature'),
+        ('attendance', '0016_position_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workshift',
+            name='end_idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='workshift',
+            name='start_idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='workshiftlocation',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='workshiftlocation',
+            index=models.Index(fields=['work_shift', 'recorded_at'], name='location_shift_recorded_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='workshift',
+            constraint=models.UniqueConstraint(fields=('employee', 'start_idempotency_key'), name='workshift_start_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='workshift',
+            constraint=models.UniqueConstraint(fields=('employee', 'end_idempotency_key'), name='workshift_end_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='workshiftlocation',
+            constraint=models.UniqueConstraint(fields=('work_shift', 'idempotency_key'), name='location_shift_key_uniq'),
+        ),
+    ]
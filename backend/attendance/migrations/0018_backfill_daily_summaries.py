@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def backfill_daily_summaries(apps, schema_editor):
+    # Relatórios e PDFs leem os totais só dos resumos diários: gera os resumos do histórico.
+    # Usa o serviço (mesmo cálculo do rebuild_daily_summaries); bancos novos não têm jornadas
+    WorkShift = apps.get_model("attendance", "WorkShift")
+    if not WorkShift.objects.exists():
+        return
+    from attendance.services.daily_summary import rebuild_daily_summaries
+
+    rebuild_daily_summaries()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0017_idempotent_ingestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def close_duplicate_open_shifts(apps, schema_editor):
+    # Antes da constraint: se um funcionário tem mais de um turno aberto, mantém o mais
+    # recente e encerra os anteriores no início do turno seguinte
+    WorkShift = apps.get_model("attendance", "WorkShift")
+    duplicated = (
+        WorkShift.objects.filter(end_time__isnull=True)
+        .values("employee_id")
+        .annotate(open_count=models.Count("id"))
+        .filter(open_count__gt=1)
+        .values_list("employee_id", flat=True)
+    )
+    for employee_id in list(duplicated):
+        shifts = list(WorkShift.objects.filter(employee_id=employee_id, end_time__isnull=True).order_by("start_time", "id"))
+        for shift, following in zip(shifts, shifts[1:]):
+            shift.end_time = following.start_time
+            shift.save(update_fields=["end_time"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_token_generation'),
+        ('attendance', '0018_backfill_daily_summaries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_shifts, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='workshift',
+            name='workshift_open_employee_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='workshift',
+            constraint=models.UniqueConstraint(condition=models.Q(('end_time__isnull', True)), fields=('employee',), name='workshift_one_open_per_employee'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:30
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+
+
+def seed_position_sequence(apps, schema_editor):
+    # A sequência do feed continua de onde o contador "positions" parou: cursores já
+    # entregues aos clientes seguem válidos
+    FeedSequence = apps.get_model("attendance", "FeedSequence")
+    PositionFeedSequence = apps.get_model("attendance", "PositionFeedSequence")
+    counter = FeedSequence.objects.filter(name="positions").first()
+    if counter is None:
+        return
+    if counter.value:
+        PositionFeedSequence.objects.create(id=counter.value)
+        connection = schema_editor.connection
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [PositionFeedSequence]):
+                cursor.execute(sql)
+    counter.delete()
+
+
+def restore_positions_counter(apps, schema_editor):
+    FeedSequence = apps.get_model("attendance", "FeedSequence")
+    PositionFeedSequence = apps.get_model("attendance", "PositionFeedSequence")
+    value = PositionFeedSequence.objects.aggregate(value=models.Max("id"))["value"] or 0
+    FeedSequence.objects.update_or_create(name="positions", defaults={"value": value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0019_one_open_shift_per_employee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionFeedSequence',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.RunPython(seed_position_sequence, restore_positions_counter),
+    ]
@@ -15,6 +15,7 @@ class WorkShift(models.Model):
     end_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
 
     create_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     duration = models.DurationField(null=True, blank=True)
 
     # Ajuste manual da jornada
@@ -25,6 +26,29 @@ class WorkShift(models.Model):
     adjusted_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="workshift_adjustfments")
     adjusted_at = models.DateTimeField(null=True, blank=True)
 
+    # Chaves de idempotência enviadas pelo dispositivo (reenvio de início/fim após perda de sinal)
+    start_idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    end_idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["employee", "start_idempotency_key"], name="workshift_start_key_uniq"),
+            models.UniqueConstraint(fields=["employee", "end_idempotency_key"], name="workshift_end_key_uniq"),
+            # No máximo um turno aberto por funcionário (guarda do MULTI_SHIFT contra inícios concorrentes);
+            # também serve de índice para a busca do turno aberto (start/end/tracking)
+            models.UniqueConstraint(
+                fields=["employee"], condition=models.Q(end_time__isnull=True), name="workshift_one_open_per_employee"
+            ),
+        ]
+        indexes = [
+            # Listagens e relatórios por período
+            models.Index(fields=["employee", "start_time"], name="workshift_employee_start_idx"),
+            # Último turno encerrado (validação de 1 km no início)
+            models.Index(fields=["employee", "-end_time"], condition=models.Q(end_time__isnull=False), name="workshift_closed_employee_idx"),
+            # Listagem geral paginada por cursor (start_time, id)
+            models.Index(fields=["-start_time", "-id"], name="workshift_start_id_idx"),
+        ]
+
     @property
     def status(self):
         return "OPEN" if self.end_time is None else "CLOSED"
@@ -61,12 +85,184 @@ class WorkShiftLocation(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Horário informado pelo dispositivo (envio em lote / offline)
+    recorded_at = models.DateTimeField(null=True, blank=True)
+    # Chave de idempotência do ponto: reenvios da mesma chave são descartados pela constraint
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
     class Meta:
         ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(fields=["work_shift", "idempotency_key"], name="location_shift_key_uniq"),
+        ]
+        indexes = [
+            # Última localização da jornada
+            models.Index(fields=["work_shift", "-created_at"], name="location_shift_created_idx"),
+            # Vizinhos de um ponto atrasado (reenvio offline fora de ordem)
+            models.Index(fields=["work_shift", "recorded_at"], name="location_shift_recorded_idx"),
+        ]
 
     def __str__(self):
         return f"{self.work_shift.employee} @ {self.created_at}"
 
+    def get_recorded_at(self):
+        """
+        Retorna o horário efetivo do ponto: o informado pelo dispositivo,
+        ou o horário de recebimento no servidor para registros antigos.
+        """
+        return self.recorded_at or self.created_at
+
+
+class WorkShiftLastPosition(models.Model):
+    """
+    Última posição conhecida de cada jornada aberta.
+    Mantida pelo serviço de jornada a cada ponto aceito, para que o painel de tracking
+    seja atendido por uma única consulta.
+    """
+    work_shift = models.OneToOneField(WorkShift, on_delete=models.CASCADE, primary_key=True, related_name="last_position")
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    recorded_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    # Sequência do feed de posições (services.position_feed): `seq` muda a cada ponto,
+    # `first_seq` é a da primeira posição da jornada (o cliente ainda não a conhece)
+    seq = models.BigIntegerField(default=0)
+    first_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["seq"], name="lastposition_seq_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.work_shift.employee} @ {self.recorded_at}"
+
+
+class PositionTombstone(models.Model):
+    """
+    Remoção de uma jornada do feed de posições (jornada encerrada), com a sequência em que ocorreu.
+    Mantida por POSITION_TOMBSTONE_TTL_HOURS; clientes com cursor mais antigo recebem a lista completa.
+    """
+    work_shift = models.OneToOneField(WorkShift, on_delete=models.CASCADE, primary_key=True, related_name="position_tombstone")
+    seq = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["seq"], name="tombstone_seq_idx"),
+            models.Index(fields=["created_at"], name="tombstone_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Jornada {self.work_shift_id} encerrada (seq {self.seq})"
+
+
+class FeedSequence(models.Model):
+    """Contador monotônico de um feed versionado (ex.: "positions_pruned")"""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class PositionFeedSequence(models.Model):
+    """
+    Valores da sequência do feed de posições: cada linha inserida é o próximo valor do
+    autoincremento, sem travar uma linha de contador compartilhada entre as gravações.
+    As linhas antigas são descartadas; só o maior valor importa.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class WorkShiftTrack(models.Model):
+    """
+    Trilha comprimida de uma jornada encerrada: pontos simplificados (Douglas-Peucker
+    com tolerância em metros) e codificados em deltas no blob `data`.
+    Substitui as linhas de WorkShiftLocation da jornada; decodificada por get_shift_track.
+    """
+    work_shift = models.OneToOneField(WorkShift, on_delete=models.CASCADE, primary_key=True, related_name="track")
+    data = models.BinaryField()
+    original_points = models.PositiveIntegerField()
+    stored_points = models.PositiveIntegerField()
+    tolerance_m = models.FloatField()
+    max_error_m = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.work_shift_id}: {self.stored_points}/{self.original_points} pontos"
+
+
+class TrackArchiveEntry(models.Model):
+    """
+    Manifesto do arquivo frio de trilhas: em qual arquivo mensal (relativo a
+    TRACK_ARCHIVE_DIR) e em que faixa de linhas estão os pontos da jornada.
+    """
+    work_shift = models.OneToOneField(WorkShift, on_delete=models.CASCADE, primary_key=True, related_name="archive_entry")
+    month = models.CharField(max_length=7)
+    path = models.CharField(max_length=255)
+    offset = models.PositiveIntegerField()
+    points = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["month"], name="trackarchive_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.work_shift_id}: {self.path}"
+
+
+class EmployeeRiskScore(models.Model):
+    """
+    Score de risco do funcionário com decaimento exponencial (meia-vida RISK_SCORE_HALF_LIFE_DAYS).
+    `weight` guarda a soma dos scores dos alertas em aberto escalados para a época fixa do
+    serviço (decaimento "para frente"): criar ou resolver um alerta é um único incremento,
+    e a ordenação por `weight` é a mesma do score atual. Ver services.risk_score.
+    """
+    employee = models.OneToOneField(Employee, on_delete=models.CASCADE, primary_key=True, related_name="risk_score")
+    weight = models.FloatField(default=0)
+    last_alert_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Ranking dos funcionários mais arriscados
+            models.Index(fields=["-weight"], name="riskscore_weight_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} - {self.weight}"
+
+
+class DailyAttendanceSummary(models.Model):
+    """
+    Resumo diário por funcionário (dia local do início da jornada).
+    Atualizado pelo serviço de jornada ao encerrar/ajustar turnos e ao criar alertas;
+    pode ser regenerado com o comando rebuild_daily_summaries.
+    Contém apenas jornadas encerradas.
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="daily_summaries")
+    day = models.DateField()
+    worked_minutes = models.PositiveIntegerField(default=0)
+    delay_minutes = models.PositiveIntegerField(default=0)
+    extra_minutes = models.PositiveIntegerField(default=0)
+    shift_count = models.PositiveIntegerField(default=0)
+    adjusted = models.BooleanField(default=False)
+    alert_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["employee", "day"], name="daily_summary_employee_day_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} - {self.day}"
+
 
 class WorkShiftTracking(models.Model):
     shift = models.ForeignKey('WorkShift', on_delete=models.CASCADE, related_name='trackings')
@@ -100,6 +296,33 @@ class FraudAlert(models.Model):
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     resolved = models.BooleanField(default=False)
+    # Identidade de alertas gerados em lote (ex.: "rescan:SHORT_SHIFT:42"), para upserts idempotentes
+    fingerprint = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    # Ocorrências agrupadas no mesmo alerta (mesmo usuário, jornada e tipo dentro da
+    # janela FRAUD_ALERT_COALESCE_SECONDS): created_at é a primeira, last_seen_at a última
+    occurrences = models.PositiveIntegerField(default=1)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    # Última alteração (criação, nova ocorrência, resolução): marca d'água dos feeds de alertas.
+    # Atualizações com QuerySet.update() devem definir o campo explicitamente.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Alertas em aberto mais recentes (painel)
+            models.Index(fields=["-created_at"], condition=models.Q(resolved=False), name="fraudalert_open_created_idx"),
+            # Alertas do colaborador
+            models.Index(fields=["user", "-created_at"], name="fraudalert_user_created_idx"),
+            # Listagem geral paginada por cursor (created_at, id)
+            models.Index(fields=["-created_at", "-id"], name="fraudalert_created_id_idx"),
+            # Feed de alterações e marca d'água (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="fraudalert_updated_id_idx"),
+            # Alerta em aberto a agrupar (create_fraud_alert)
+            models.Index(
+                fields=["user", "work_shift", "fraud_type", "-last_seen_at"],
+                condition=models.Q(resolved=False),
+                name="fraudalert_coalesce_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.fraud_type}"
\ No newline at end of file
@@ -0,0 +1,111 @@
+import base64
+import binascii
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por chave (keyset) em (ordering_field, id), do mais recente para o mais antigo.
+    Cada página filtra pelo último item da anterior em vez de usar OFFSET:
+    páginas profundas custam o mesmo que a primeira e não pulam/repetem itens
+    quando novos registros chegam.
+
+    O corpo da resposta continua sendo a lista; o link da próxima página vai nos
+    cabeçalhos Link (rel="next") e X-Next-Cursor.
+    """
+    ordering_field = "created_at"
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Cursor inválido"
+
+    next_cursor = None
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, item):
+        raw = f"{getattr(item, self.ordering_field).isoformat()}|{item.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = base64.urlsafe_b64decode(encoded.encode()).decode().rsplit("|", 1)
+            position = (parse_datetime(value), int(pk))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        field = self.ordering_field
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(f"-{field}", "-id")
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            # (campo, id) < cursor: faixa no índice do campo, excluindo os empates já enviados
+            queryset = queryset.filter(**{f"{field}__lte": value}).exclude(**{field: value, "id__gte": pk})
+
+        items = list(queryset[:page_size + 1])
+        page = items[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(items) > page_size else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_headers(self):
+        if self.next_cursor is None:
+            return {}
+        return {
+            "Link": f'<{self.get_next_link()}>; rel="next"',
+            "X-Next-Cursor": self.next_cursor,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(data, headers=self.get_headers())
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor da próxima página (cabeçalho X-Next-Cursor)",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Itens por página (padrão {self.page_size}, máximo {self.max_page_size})",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class ShiftKeysetPagination(KeysetPagination):
+    ordering_field = "start_time"
+
+
+class FraudAlertKeysetPagination(KeysetPagination):
+    ordering_field = "created_at"
@@ -29,6 +29,12 @@ class WorkShiftLocationSerializer(serializers.ModelSerializer):
 
 
 
+class WorkShiftLocationBatchSerializer(serializers.Serializer):
+    device_id = serializers.CharField()
+    fixes = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+
+
 class FraudAlertSerializer(serializers.ModelSerializer):
     user_email = serializers.EmailField(source='user.email', read_only=True)
     employee_name = serializers.CharField(source='user.get_full_name', read_only=True)
@@ -38,7 +44,7 @@ class FraudAlertSerializer(serializers.ModelSerializer):
     class Meta:
         model = FraudAlert
         fields = ['id', 'employee_name', 'employee_matricula', 'user_email', 'shift_id', 'fraud_type', 'severity',
-                  'score', 'description', 'created_at', 'resolved',]
+                  'score', 'description', 'occurrences', 'created_at', 'last_seen_at', 'resolved',]
 
 
 
@@ -62,7 +68,8 @@ class FraudAlertListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = FraudAlert
-        fields = ['id', 'employee_name', 'matricula', 'fraud_type', 'severity', 'score', 'description', 'created_at', 'resolved',]
+        fields = ['id', 'employee_name', 'matricula', 'fraud_type', 'severity', 'score', 'description', 'occurrences',
+                  'created_at', 'last_seen_at', 'resolved',]
 
 
 
@@ -96,6 +103,8 @@ class FraudAlertAdminSerializer(serializers.ModelSerializer):
             'severity',
             'score',
             'description',
+            'occurrences',
             'created_at',
+            'last_seen_at',
             'resolved',
         ]
@@ -0,0 +1,120 @@
+# attendance/services/alert_feed.py
+import base64
+import binascii
+import hashlib
+from datetime import timedelta
+
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
+from rest_framework.exceptions import NotFound
+
+from attendance.models import FraudAlert
+
+
+# Feeds JSON de alertas de fraude versionados pela marca d'água (updated_at, id) do último alerta alterado.
+# O modo ?since=<cursor> só entrega alterações com pelo menos FEED_SETTLE_SECONDS: uma transação
+# que gravou updated_at antes de outra, mas fez commit depois, ainda entra no feed.
+FEED_SETTLE_SECONDS = 2
+FEED_PAGE_SIZE = 200
+SINCE_QUERY_PARAM = "since"
+SINCE_HEADER = "X-Since-Cursor"
+
+
+def encode_since(updated_at, pk):
+    return base64.urlsafe_b64encode(f"{updated_at.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_since(encoded):
+    """Retorna (updated_at, id) do cursor, ou None se inválido"""
+    try:
+        value, pk = base64.urlsafe_b64decode(encoded.encode()).decode().rsplit("|", 1)
+        position = (parse_datetime(value), int(pk))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    return position if position[0] is not None else None
+
+
+def settled_before():
+    return timezone.now() - timedelta(seconds=FEED_SETTLE_SECONDS)
+
+
+def alert_watermark(before=None):
+    """(updated_at, id) do último alerta alterado, por uma busca no índice fraudalert_updated_id_idx"""
+    alerts = FraudAlert.objects.all()
+    if before is not None:
+        alerts = alerts.filter(updated_at__lte=before)
+    return alerts.order_by("-updated_at", "-id").values_list("updated_at", "id").first()
+
+
+def alert_changes(queryset, position, limit=FEED_PAGE_SIZE):
+    """
+    Alertas criados ou alterados após o cursor (updated_at, id), em ordem de alteração.
+    Retorna (alertas, cursor da próxima sincronização, há mais alterações).
+    """
+    updated_at, pk = position
+    changes = list(
+        queryset.filter(updated_at__gte=updated_at, updated_at__lte=settled_before())
+        .exclude(updated_at=updated_at, id__lte=pk)
+        .order_by("updated_at", "id")[:limit + 1]
+    )
+    page = changes[:limit]
+    last = page[-1] if page else None
+    next_cursor = encode_since(last.updated_at, last.pk) if last else encode_since(updated_at, pk)
+    return page, next_cursor, len(changes) > limit
+
+
+def _request_watermark(request):
+    if not hasattr(request, "_alert_watermark"):
+        before = settled_before() if SINCE_QUERY_PARAM in request.GET else None
+        request._alert_watermark = alert_watermark(before)
+    return request._alert_watermark
+
+
+def _etag(request, *args, **kwargs):
+    watermark = _request_watermark(request)
+    key = f"{watermark}|{request.user.pk}|{request.GET.urlencode()}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _last_modified(request, *args, **kwargs):
+    watermark = _request_watermark(request)
+    return watermark[0] if watermark else None
+
+
+def alert_feed_condition(view):
+    """
+    GET condicional para os feeds de alertas: ETag/Last-Modified pela marca d'água,
+    calculados antes da view. Sem alterações desde a última carga, responde 304 sem consultar
+    nem serializar a listagem.
+    """
+    return condition(etag_func=_etag, last_modified_func=_last_modified)(view)
+
+
+def alert_feed_response(request, queryset, paginator, serialize):
+    """
+    Resposta JSON de um feed de alertas:
+    - sem `since`: página da listagem (cursor do paginador nos cabeçalhos Link/X-Next-Cursor);
+    - com ?since=<cursor>: apenas alertas criados/alterados depois do cursor, em ordem de alteração.
+    Em ambos os casos o cabeçalho X-Since-Cursor traz o cursor da próxima sincronização.
+    """
+    since = request.GET.get(SINCE_QUERY_PARAM)
+    if since is not None:
+        position = decode_since(since)
+        if position is None:
+            return JsonResponse({"error": "Cursor inválido"}, status=400)
+        alerts, next_cursor, has_more = alert_changes(queryset, position)
+        headers = {SINCE_HEADER: next_cursor, "X-Has-More": "true" if has_more else "false"}
+    else:
+        try:
+            alerts = paginator.paginate_queryset(queryset, request)
+        except NotFound as e:
+            return JsonResponse({"error": str(e.detail)}, status=404)
+        # A próxima sincronização parte de antes desta carga: alterações ainda não
+        # assentadas podem ser reenviadas uma vez (o cliente atualiza a linha pelo id)
+        headers = dict(paginator.get_headers(), **{SINCE_HEADER: encode_since(settled_before(), 0)})
+
+    response = JsonResponse([serialize(alert) for alert in alerts], safe=False, headers=headers)
+    response["Vary"] = "Cookie"
+    return response
@@ -0,0 +1,164 @@
+# attendance/services/daily_summary.py
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from accounts.models import Employee
+from attendance.models import DailyAttendanceSummary, FraudAlert, WorkShift
+from attendance.utils.dates import date_range_q
+
+
+SUMMARY_FIELDS = ["worked_minutes", "delay_minutes", "extra_minutes", "shift_count", "adjusted", "alert_count"]
+SUMMARY_BATCH_SIZE = 1000
+
+
+def _minutes(value):
+    return int(value.total_seconds() // 60) if value else 0
+
+
+def _day_filter(start_date=None, end_date=None):
+    q = models.Q()
+    if start_date:
+        q &= models.Q(day__gte=start_date)
+    if end_date:
+        q &= models.Q(day__lte=end_date)
+    return q
+
+
+def alert_day(alert):
+    """
+    Dia do resumo em que o alerta conta: o dia local de início da jornada do alerta
+    (o mesmo das horas trabalhadas), ou o dia em que foi criado se não tiver jornada.
+    """
+    if alert.work_shift_id is not None:
+        return timezone.localdate(alert.work_shift.start_time)
+    return timezone.localdate(alert.created_at)
+
+
+def compute_daily_summaries(employee_ids=None, start_date=None, end_date=None):
+    """
+    Calcula os resumos diários a partir das jornadas encerradas e dos alertas,
+    agrupando no banco por funcionário e dia local.
+    Retorna instâncias de DailyAttendanceSummary ainda não gravadas.
+    """
+    from attendance.services.workshift_service import with_shift_metrics
+
+    # Jornadas encerradas: saída registrada ou ajuste administrativo
+    closed = models.Q(end_time__isnull=False) | models.Q(adjusted_end_time__isnull=False)
+    shifts = WorkShift.objects.filter(closed, date_range_q("start_time", start_date, end_date))
+    # Alertas no dia de início da jornada (alert_day), inclusive os da reavaliação do histórico
+    alerts = (
+        FraudAlert.objects.filter(user__employee__isnull=False)
+        .annotate(moment=Coalesce("work_shift__start_time", "created_at"))
+        .filter(date_range_q("moment", start_date, end_date))
+    )
+    if employee_ids is not None:
+        shifts = shifts.filter(employee_id__in=employee_ids)
+        alerts = alerts.filter(user__employee__in=employee_ids)
+
+    summaries = {}
+
+    def summary_for(employee_id, day):
+        key = (employee_id, day)
+        if key not in summaries:
+            summaries[key] = DailyAttendanceSummary(employee_id=employee_id, day=day)
+        return summaries[key]
+
+    shift_rows = (
+        with_shift_metrics(shifts)
+        .annotate(day=TruncDate("start_time"))
+        .values("employee_id", "day")
+        .annotate(
+            worked=models.Sum("worked_time"),
+            delay=models.Sum("delay_time"),
+            extra=models.Sum("extra_time"),
+            shifts=models.Count("id"),
+            adjusted_shifts=models.Count("id", filter=models.Q(adjusted_end_time__isnull=False)),
+        )
+        .order_by()
+    )
+    for row in shift_rows.iterator():
+        summary = summary_for(row["employee_id"], row["day"])
+        summary.worked_minutes = _minutes(row["worked"])
+        summary.delay_minutes = _minutes(row["delay"])
+        summary.extra_minutes = _minutes(row["extra"])
+        summary.shift_count = row["shifts"]
+        summary.adjusted = row["adjusted_shifts"] > 0
+
+    alert_rows = (
+        alerts
+        .annotate(day=TruncDate("moment"))
+        .values("user__employee", "day")
+        .annotate(alerts=models.Count("id"))
+        .order_by()
+    )
+    for row in alert_rows.iterator():
+        summary_for(row["user__employee"], row["day"]).alert_count = row["alerts"]
+
+    return list(summaries.values())
+
+
+def save_daily_summaries(summaries):
+    """Grava os resumos com upsert (INSERT ... ON CONFLICT) por funcionário e dia"""
+    DailyAttendanceSummary.objects.bulk_create(
+        summaries,
+        batch_size=SUMMARY_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["employee", "day"],
+        update_fields=SUMMARY_FIELDS + ["updated_at"],
+    )
+
+
+def refresh_daily_summary(employee_id, day):
+    """Recalcula o resumo de um único dia do funcionário (poucas jornadas)"""
+    summaries = compute_daily_summaries([employee_id], day, day)
+    save_daily_summaries(summaries or [DailyAttendanceSummary(employee_id=employee_id, day=day)])
+
+
+def rebuild_daily_summaries(employee_ids=None, start_date=None, end_date=None):
+    """Regenera os resumos do período: remove os existentes e grava os recalculados"""
+    summaries = compute_daily_summaries(employee_ids, start_date, end_date)
+    existing = DailyAttendanceSummary.objects.filter(_day_filter(start_date, end_date))
+    if employee_ids is not None:
+        existing = existing.filter(employee_id__in=employee_ids)
+
+    with transaction.atomic():
+        existing.delete()
+        save_daily_summaries(summaries)
+    return len(summaries)
+
+
+def count_alert_in_summary(alert, user, employee_id=None):
+    """Soma o alerta ao resumo do dia; cria o resumo se ainda não existir"""
+    if employee_id is None:
+        employee_id = getattr(user, "employee_id", None)
+    if employee_id is None:
+        employee_id = Employee.objects.filter(user_id=user.pk).values_list("id", flat=True).first()
+    if employee_id is None:
+        return
+
+    day = alert_day(alert)
+    updated = DailyAttendanceSummary.objects.filter(employee_id=employee_id, day=day).update(
+        alert_count=models.F("alert_count") + 1,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        refresh_daily_summary(employee_id, day)
+
+
+def summary_totals(employee_id, start_date=None, end_date=None):
+    """
+    Totais do período em minutos, lidos dos resumos diários
+    (uma linha por dia, independente do número de jornadas).
+    """
+    totals = (
+        DailyAttendanceSummary.objects
+        .filter(employee_id=employee_id)
+        .filter(_day_filter(start_date, end_date))
+        .aggregate(
+            worked=Coalesce(models.Sum("worked_minutes"), 0),
+            delay=Coalesce(models.Sum("delay_minutes"), 0),
+            extra=Coalesce(models.Sum("extra_minutes"), 0),
+        )
+    )
+    return totals["worked"], totals["delay"], totals["extra"]
@@ -0,0 +1,110 @@
+# attendance/services/event_broker.py
+import asyncio
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from accounts.models import Employee
+
+
+# Canais publicados para o painel
+POSITIONS_CHANNEL = "positions"
+ALERTS_CHANNEL = "alerts"
+CHANNELS = (POSITIONS_CHANNEL, ALERTS_CHANNEL)
+
+# Eventos pendentes por assinante antes de descartar (cliente lento)
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class EventBroker:
+    """
+    Pub/sub em memória do processo, usado para empurrar eventos ao painel via SSE.
+    publish() pode ser chamado de código síncrono em qualquer thread; cada assinante
+    recebe os eventos na fila do seu próprio event loop.
+    Em produção com vários processos, substituir por um broker compartilhado (Redis etc.).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channels):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = (loop, frozenset(channels))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return any(channel in channels for _, channels in self._subscribers.values())
+
+    def publish(self, channel, payload):
+        message = (channel, json.dumps(payload, cls=DjangoJSONEncoder))
+        with self._lock:
+            targets = [
+                (queue, loop) for queue, (loop, channels) in self._subscribers.items()
+                if channel in channels
+            ]
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # Loop já encerrado: assinante abandonado
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _deliver(queue, message):
+        if not queue.full():
+            queue.put_nowait(message)
+
+
+broker = EventBroker()
+
+
+def publish_position(user, work_shift, latitude, longitude, recorded_at):
+    """Publica a nova posição de um vistoriador para os painéis conectados"""
+    if not broker.has_subscribers(POSITIONS_CHANNEL):
+        return
+    broker.publish(POSITIONS_CHANNEL, {
+        "inspector_id": work_shift.employee_id,
+        "name": user.get_full_name() or user.email,
+        "phone": user.phone,
+        "latitude": float(latitude),
+        "longitude": float(longitude),
+        "last_update": recorded_at,
+        "shift_id": work_shift.id,
+    })
+
+
+def publish_fraud_alert(alert):
+    """Publica um novo alerta de fraude para os painéis conectados"""
+    if not broker.has_subscribers(ALERTS_CHANNEL):
+        return
+    user = alert.user
+    try:
+        matricula = user.employee.matricula
+    except Employee.DoesNotExist:
+        matricula = "N/A"
+    broker.publish(ALERTS_CHANNEL, {
+        "id": alert.id,
+        "employee_name": user.get_full_name() or user.email,
+        "employee_email": user.email,
+        "matricula": matricula,
+        "shift_id": alert.work_shift_id,
+        "fraud_type": alert.fraud_type,
+        "severity": alert.severity,
+        "score": alert.score,
+        "description": alert.description,
+        "created_at": alert.created_at,
+        "resolved": alert.resolved,
+    })
+
+
+def format_sse(channel, data):
+    return f"event: {channel}\ndata: {data}\n\n"
@@ -0,0 +1,182 @@
+# attendance/services/fraud_rescan.py
+from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from attendance.models import FraudAlert, WorkShift
+from attendance.services.daily_summary import rebuild_daily_summaries
+from attendance.services.workshift_service import (
+    MAX_SHIFT_END_DISTANCE_M,
+    MAX_TRACKING_SPEED_KMH,
+    MIN_SHIFT_DURATION,
+    find_tracking_violations,
+    fraud_severity,
+)
+from attendance.services.track_compression import iter_shift_tracks
+from attendance.utils.dates import date_range_q
+from attendance.utils.trajectory import pairwise_distance_km
+
+
+# Regras reavaliadas sobre o histórico: chave de FRAUD_POINTS -> tipo do alerta
+RULES = {
+    "SHORT_SHIFT": "TIME",
+    "OUT_OF_RADIUS": "LOCATION",
+    "SPEED_IMPOSSIBLE": "TRACKING",
+    "GPS_INVALID": "TRACKING",
+    "MULTI_SHIFT": "MULTI_SHIFT",
+}
+
+FINGERPRINT = "rescan:{rule}:{shift_id}"
+
+
+def _effective_end():
+    return Coalesce("adjusted_end_time", "end_time")
+
+
+def _shift_queryset(shift_ids):
+    overlapping = WorkShift.objects.annotate(other_end=_effective_end()).filter(
+        models.Q(other_end__gt=models.OuterRef("start_time")) | models.Q(other_end__isnull=True),
+        employee_id=models.OuterRef("employee_id"),
+        start_time__lt=models.OuterRef("start_time"),
+    )
+    return (
+        WorkShift.objects.filter(id__in=shift_ids)
+        .select_related("employee")
+        .annotate(effective_end=_effective_end(), overlapping=models.Exists(overlapping))
+        .order_by("id")
+    )
+
+
+def _alert(rule, shift, description):
+    points = FraudAlert.FRAUD_POINTS[rule]
+    return FraudAlert(
+        user_id=shift.employee.user_id,
+        work_shift=shift,
+        fraud_type=RULES[rule],
+        severity=fraud_severity(points),
+        score=points,
+        description=description,
+        fingerprint=FINGERPRINT.format(rule=rule, shift_id=shift.id),
+    )
+
+
+def evaluate_shifts(shift_ids, rules=None):
+    """
+    Reaplica as regras de fraude às jornadas informadas (e seus pontos de tracking)
+    com os limites atuais. Retorna os alertas (não gravados), um por regra e jornada.
+    """
+    rules = set(rules or RULES)
+    shifts = {shift.id: shift for shift in _shift_queryset(shift_ids)}
+    alerts = []
+
+    closed = [shift for shift in shifts.values() if shift.effective_end is not None]
+    if "SHORT_SHIFT" in rules:
+        for shift in closed:
+            duration = shift.effective_end - shift.start_time
+            if duration < MIN_SHIFT_DURATION:
+                minutes = int(duration.total_seconds() // 60)
+                alerts.append(_alert("SHORT_SHIFT", shift, f"Jornada de {minutes} min, abaixo do mínimo"))
+
+    ended = [shift for shift in closed if shift.end_latitude is not None and shift.end_longitude is not None]
+    if "OUT_OF_RADIUS" in rules and ended:
+        distances_m = pairwise_distance_km(
+            [shift.start_latitude for shift in ended],
+            [shift.start_longitude for shift in ended],
+            [shift.end_latitude for shift in ended],
+            [shift.end_longitude for shift in ended],
+        ) * 1000
+        for shift, distance in zip(ended, distances_m):
+            if distance > MAX_SHIFT_END_DISTANCE_M:
+                alerts.append(_alert("OUT_OF_RADIUS", shift, f"Fim a {int(distance)}m do início da jornada"))
+
+    if "MULTI_SHIFT" in rules:
+        for shift in shifts.values():
+            if shift.overlapping:
+                alerts.append(_alert("MULTI_SHIFT", shift, "Jornada sobreposta a outra jornada do funcionário"))
+
+    if rules & {"SPEED_IMPOSSIBLE", "GPS_INVALID"}:
+        # Jornadas já comprimidas usam a trilha simplificada: picos dentro da
+        # tolerância da simplificação não são mais visíveis
+        for shift_id, points in iter_shift_tracks(list(shifts)):
+            shift = shifts[shift_id]
+            latitudes, longitudes, moments = zip(*points)
+
+            if "GPS_INVALID" in rules:
+                invalid = sum(1 for lat, lon in zip(latitudes, longitudes) if not lat or not lon)
+                if invalid:
+                    alerts.append(_alert("GPS_INVALID", shift, f"GPS inválido (0,0) em {invalid} pontos"))
+
+            if "SPEED_IMPOSSIBLE" in rules and len(points) > 1:
+                speeding = [
+                    violation for violation in find_tracking_violations(latitudes, longitudes, moments)
+                    if violation[1] == "SPEED_IMPOSSIBLE"
+                ]
+                if speeding:
+                    alerts.append(_alert(
+                        "SPEED_IMPOSSIBLE", shift,
+                        f"Velocidade acima de {MAX_TRACKING_SPEED_KMH} km/h em {len(speeding)} trechos"
+                    ))
+
+    return alerts
+
+
+def save_rescan_alerts(alerts):
+    """
+    Grava os alertas com upsert pela impressão digital: uma nova execução atualiza
+    a descrição e o score, sem duplicar nem reabrir alertas já resolvidos.
+    """
+    FraudAlert.objects.bulk_create(
+        alerts,
+        update_conflicts=True,
+        unique_fields=["fingerprint"],
+        update_fields=["severity", "score", "description", "updated_at"],
+    )
+    return len(alerts)
+
+
+def rescan_shifts(shift_ids, rules=None):
+    """Avalia e grava os alertas de um bloco de jornadas. Retorna (jornadas, alertas)"""
+    alerts = evaluate_shifts(shift_ids, rules)
+    return len(shift_ids), save_rescan_alerts(alerts)
+
+
+def rescan_queryset(employee_ids=None, start_date=None, end_date=None, after_id=None):
+    """Ids das jornadas a reavaliar, em ordem (chave do checkpoint)"""
+    queryset = WorkShift.objects.filter(date_range_q("start_time", start_date, end_date))
+    if employee_ids:
+        queryset = queryset.filter(employee_id__in=employee_ids)
+    if after_id:
+        queryset = queryset.filter(id__gt=after_id)
+    return queryset.order_by("id").values_list("id", flat=True)
+
+
+def keyset_chunks(shift_ids, size):
+    """
+    Blocos de ids em ordem, lidos página a página (id > último id) com uma consulta
+    curta por bloco: nenhum cursor fica aberto enquanto os workers gravam (SQLite bloqueia).
+    """
+    last_id = None
+    while True:
+        page = shift_ids.filter(id__gt=last_id) if last_id else shift_ids
+        chunk = list(page[:size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def refresh_alert_summaries(since):
+    """
+    Recalcula os resumos diários (alert_count) dos funcionários que receberam alertas
+    da reavaliação desde `since`: a gravação em lote não passa por count_alert_in_summary.
+    Os alertas contam no dia de início da jornada reavaliada, não no dia da reavaliação.
+    """
+    alerts = (
+        FraudAlert.objects.filter(fingerprint__startswith="rescan:", created_at__gte=since, user__employee__isnull=False)
+        .annotate(moment=Coalesce("work_shift__start_time", "created_at"))
+    )
+    stamp = alerts.aggregate(first=models.Min("moment"), last=models.Max("moment"))
+    if stamp["first"] is None:
+        return 0
+    employee_ids = list(alerts.values_list("user__employee", flat=True).distinct())
+    return rebuild_daily_summaries(employee_ids, timezone.localdate(stamp["first"]), timezone.localdate(stamp["last"]))
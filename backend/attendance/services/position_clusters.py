@@ -0,0 +1,112 @@
+# attendance/services/position_clusters.py
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from attendance.services.position_index import DEFAULT_MAX_FIX_AGE_SECONDS, position_index
+
+
+# Agrupamento das posições abertas para o mapa: grade de CELLS_PER_TILE x CELLS_PER_TILE células
+# por tile de 256 px do zoom (células de ~64 px na tela). Os agregados de cada zoom são calculados
+# sobre o índice em memória e reaproveitados por CLUSTER_REFRESH_SECONDS: com centenas de
+# vistoriadores enviando pontos, invalidar a cada ponto faria o cache quase nunca acertar.
+CELLS_PER_TILE = 4
+MAX_CLUSTER_ZOOM = 20
+# Ids das jornadas enviados por grupo; `count` traz o total
+MAX_CLUSTER_MEMBERS = 20
+CLUSTER_REFRESH_SECONDS = 5
+# Células que uma consulta pode cobrir: acima disso (mundo inteiro em zoom alto) a caixa é obrigatória
+MAX_BBOX_CELLS = 4096
+
+
+def cell_size_deg(zoom):
+    return 360 / (2 ** zoom * CELLS_PER_TILE)
+
+
+def aggregate_positions(positions, zoom):
+    """Células do zoom -> {count, soma das latitudes/longitudes, ids das jornadas}"""
+    size = cell_size_deg(zoom)
+    cells = {}
+    for position in positions:
+        key = (math.floor(position["latitude"] / size), math.floor(position["longitude"] / size))
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = {"count": 0, "latitude": 0.0, "longitude": 0.0, "shift_ids": []}
+        cell["count"] += 1
+        cell["latitude"] += position["latitude"]
+        cell["longitude"] += position["longitude"]
+        if len(cell["shift_ids"]) < MAX_CLUSTER_MEMBERS:
+            cell["shift_ids"].append(position["shift_id"])
+    return cells
+
+
+def bbox_cells(zoom, bbox=None):
+    """Quantidade de células do zoom dentro da caixa (sul, oeste, norte, leste); sem caixa, o mundo"""
+    south, west, north, east = bbox if bbox is not None else (-90, -180, 90, 180)
+    width = east - west if west <= east else 360 - (west - east)
+    size = cell_size_deg(zoom)
+    return math.ceil(max(north - south, 0) / size) * math.ceil(width / size)
+
+
+def _in_bbox(latitude, longitude, bbox):
+    south, west, north, east = bbox
+    if not south <= latitude <= north:
+        return False
+    if west <= east:
+        return west <= longitude <= east
+    # Caixa que cruza o antimeridiano
+    return longitude >= west or longitude <= east
+
+
+class ClusterCache:
+    """
+    Agregados por zoom, recalculados no máximo a cada CLUSTER_REFRESH_SECONDS.
+    Posições mais antigas que DEFAULT_MAX_FIX_AGE_SECONDS ficam de fora, como na busca dos mais próximos.
+    """
+
+    def __init__(self, index):
+        self._index = index
+        self._lock = threading.Lock()
+        self._by_zoom = {}
+
+    def cells(self, zoom):
+        self._index.refresh_if_stale()
+        cached = self._by_zoom.get(zoom)
+        if cached and time.monotonic() - cached[0] < CLUSTER_REFRESH_SECONDS:
+            return cached[1]
+        _, positions = self._index.snapshot()
+        cutoff = timezone.now() - timedelta(seconds=DEFAULT_MAX_FIX_AGE_SECONDS)
+        cells = aggregate_positions([position for position in positions if position["recorded_at"] >= cutoff], zoom)
+        with self._lock:
+            self._by_zoom[zoom] = (time.monotonic(), cells)
+        return cells
+
+    def clusters(self, zoom, bbox=None):
+        """
+        Grupos do zoom dentro da caixa (sul, oeste, norte, leste), com centróide,
+        quantidade e ids das jornadas. A quantidade de grupos é limitada pelas células
+        visíveis, não pelo número de vistoriadores.
+        """
+        result = []
+        for cell in self.cells(zoom).values():
+            latitude = cell["latitude"] / cell["count"]
+            longitude = cell["longitude"] / cell["count"]
+            if bbox is not None and not _in_bbox(latitude, longitude, bbox):
+                continue
+            result.append({
+                "latitude": round(latitude, 6),
+                "longitude": round(longitude, 6),
+                "count": cell["count"],
+                "shift_ids": cell["shift_ids"],
+            })
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._by_zoom = {}
+
+
+cluster_cache = ClusterCache(position_index)
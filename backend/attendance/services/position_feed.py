@@ -0,0 +1,119 @@
+# attendance/services/position_feed.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from attendance.models import FeedSequence, PositionFeedSequence, PositionTombstone, WorkShiftLastPosition
+
+
+# Feed versionado das últimas posições: cada posição gravada e cada jornada encerrada recebem
+# o próximo valor do autoincremento de PositionFeedSequence. O INSERT não trava nenhuma linha
+# compartilhada, então as gravações de tracking não fazem fila entre si; em troca, uma sequência
+# menor pode ser confirmada depois de uma maior. Por isso o cursor entregue ao cliente só avança
+# até as gravações com mais de POSITION_FEED_SETTLE_SECONDS (mais longo que qualquer transação
+# de tracking): as posteriores voltam na consulta seguinte e o cliente nunca perde uma gravação.
+
+# Maior sequência de remoção já descartada; cursores anteriores a ela exigem a lista completa
+TOMBSTONES_FLOOR = "positions_pruned"
+
+
+def next_sequence():
+    """Próximo valor da sequência do feed (um INSERT no autoincremento)"""
+    return PositionFeedSequence.objects.create().pk
+
+
+def save_position(work_shift, latitude, longitude, recorded_at):
+    """
+    Grava a última posição da jornada com um único upsert (INSERT ... ON CONFLICT),
+    sem leitura prévia, na próxima sequência do feed.
+    """
+    with transaction.atomic(savepoint=False):
+        seq = next_sequence()
+        WorkShiftLastPosition.objects.bulk_create(
+            [WorkShiftLastPosition(
+                work_shift=work_shift,
+                latitude=latitude,
+                longitude=longitude,
+                recorded_at=recorded_at,
+                seq=seq,
+                first_seq=seq,
+            )],
+            update_conflicts=True,
+            unique_fields=["work_shift"],
+            update_fields=["latitude", "longitude", "recorded_at", "updated_at", "seq"]
+        )
+
+
+def remove_position(work_shift):
+    """Retira a jornada do feed (jornada encerrada), deixando uma remoção para os clientes"""
+    with transaction.atomic(savepoint=False):
+        WorkShiftLastPosition.objects.filter(work_shift=work_shift).delete()
+        seq = next_sequence()
+        PositionTombstone.objects.bulk_create(
+            [PositionTombstone(work_shift=work_shift, seq=seq)],
+            update_conflicts=True,
+            unique_fields=["work_shift"],
+            update_fields=["seq"]
+        )
+        # Valores anteriores da sequência já foram usados: basta manter o maior
+        PositionFeedSequence.objects.filter(id__lt=seq).delete()
+        prune_tombstones()
+
+
+def prune_tombstones(now=None):
+    """Descarta remoções mais antigas que POSITION_TOMBSTONE_TTL_HOURS. Retorna a quantidade"""
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=getattr(settings, "POSITION_TOMBSTONE_TTL_HOURS", 24))
+    stale = PositionTombstone.objects.filter(created_at__lt=cutoff)
+    floor = stale.aggregate(floor=models.Max("seq"))["floor"]
+    if floor is None:
+        return 0
+    FeedSequence.objects.update_or_create(name=TOMBSTONES_FLOOR, defaults={"value": floor})
+    return stale.filter(seq__lte=floor).delete()[0]
+
+
+def settled_cursor(rows, since, now=None):
+    """
+    Maior sequência entre as linhas gravadas há mais de POSITION_FEED_SETTLE_SECONDS
+    (rows: [(sequência, horário da gravação)]), e nunca menor que `since`.
+    Toda sequência menor já foi confirmada ou descartada.
+    """
+    now = now or timezone.now()
+    settled_before = now - timedelta(seconds=getattr(settings, "POSITION_FEED_SETTLE_SECONDS", 5))
+    return max([since] + [seq for seq, written_at in rows if written_at <= settled_before])
+
+
+def position_changes(since):
+    """
+    Alterações do feed após a sequência `since`.
+    Retorna (cursor, reset, posições alteradas, ids das jornadas removidas).
+    Com reset (since=0 ou cursor anterior às remoções mantidas), as posições são todas as
+    jornadas abertas e o cliente deve descartar o que tinha. Gravações ainda dentro da janela
+    de POSITION_FEED_SETTLE_SECONDS vêm na resposta e de novo na seguinte.
+    """
+    # Uma consulta: o piso das remoções vem como subconsulta (o Max só a torna agregável;
+    # sem nenhuma sequência gravada o cliente recebe a lista completa de qualquer forma)
+    counters = PositionFeedSequence.objects.aggregate(
+        latest=models.Max("id"),
+        floor=models.Max(models.Subquery(FeedSequence.objects.filter(name=TOMBSTONES_FLOOR).values("value")[:1])),
+    )
+    latest, floor = counters["latest"] or 0, counters["floor"] or 0
+    reset = since <= 0 or since < floor or since > latest
+
+    positions = (
+        WorkShiftLastPosition.objects.filter(work_shift__end_time__isnull=True)
+        .select_related("work_shift__employee__user")
+        .order_by("seq")
+    )
+    if reset:
+        positions = list(positions)
+        return settled_cursor([(p.seq, p.updated_at) for p in positions], 0), True, positions, []
+
+    positions = list(positions.filter(seq__gt=since))
+    removed = list(PositionTombstone.objects.filter(seq__gt=since).values_list("work_shift_id", "seq", "created_at"))
+    cursor = settled_cursor(
+        [(p.seq, p.updated_at) for p in positions] + [(seq, created_at) for _, seq, created_at in removed], since
+    )
+    return cursor, False, positions, [shift_id for shift_id, _, _ in removed]
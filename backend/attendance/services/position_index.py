@@ -0,0 +1,202 @@
+# attendance/services/position_index.py
+import heapq
+import math
+import threading
+import time
+
+from django.utils import timezone
+
+from attendance.models import WorkShiftLastPosition
+from attendance.utils.antifraud import haversine
+
+
+# Índice espacial em memória das últimas posições das jornadas abertas.
+# Grade de células de CELL_SIZE_DEG graus (~1,1 km de latitude): a busca dos mais
+# próximos percorre anéis de células ao redor do ponto até que nenhuma célula
+# ainda não visitada possa conter um vizinho mais próximo que os já encontrados.
+CELL_SIZE_DEG = 0.01
+KM_PER_DEGREE = 111.195
+
+# O índice é por processo: recebe as posições aceitas neste processo e é
+# recarregado do banco periodicamente para incluir as dos demais workers.
+INDEX_REFRESH_SECONDS = 15
+
+# Posições mais antigas que isto não são consideradas na busca
+DEFAULT_MAX_FIX_AGE_SECONDS = 15 * 60
+
+
+def _cell(latitude, longitude):
+    return math.floor(latitude / CELL_SIZE_DEG), math.floor(longitude / CELL_SIZE_DEG)
+
+
+def _ring(center, radius):
+    """Células na borda do quadrado de raio `radius` (em células) ao redor de `center`"""
+    row, col = center
+    if radius == 0:
+        yield center
+        return
+    for dc in range(-radius, radius + 1):
+        yield row - radius, col + dc
+        yield row + radius, col + dc
+    for dr in range(-radius + 1, radius):
+        yield row + dr, col - radius
+        yield row + dr, col + radius
+
+
+def _ring_min_distance_km(latitude, radius):
+    """
+    Limite inferior da distância do ponto (em qualquer lugar da célula central) até as
+    células do anel `radius` e além: radius - 1 células inteiras em latitude ou em
+    longitude (estreitadas pelo cosseno da latitude mais distante).
+    """
+    farthest_lat = min(abs(latitude) + (radius + 1) * CELL_SIZE_DEG, 89.9)
+    cell_km = CELL_SIZE_DEG * KM_PER_DEGREE * math.cos(math.radians(farthest_lat))
+    return max(radius - 1, 0) * cell_km
+
+
+class PositionIndex:
+    """
+    Grade em memória: célula -> {shift_id: posição}.
+    As operações são protegidas por um lock; a busca é feita sobre poucas células
+    e não acessa o banco.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._positions = {}
+        self._loaded_at = None
+        # Incrementada a cada alteração
+        self.version = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def snapshot(self):
+        """(versão, posições) consistentes entre si"""
+        with self._lock:
+            return self.version, list(self._positions.values())
+
+    def update(self, shift_id, employee_id, latitude, longitude, recorded_at):
+        latitude, longitude = float(latitude), float(longitude)
+        cell = _cell(latitude, longitude)
+        with self._lock:
+            current = self._positions.get(shift_id)
+            if current and current["recorded_at"] > recorded_at:
+                return
+            if current and current["cell"] != cell:
+                self._discard(shift_id, current["cell"])
+            position = {
+                "shift_id": shift_id,
+                "employee_id": employee_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "recorded_at": recorded_at,
+                "cell": cell,
+            }
+            self._positions[shift_id] = position
+            self._cells.setdefault(cell, {})[shift_id] = position
+            self.version += 1
+
+    def remove(self, shift_id):
+        with self._lock:
+            current = self._positions.pop(shift_id, None)
+            if current:
+                self._discard(shift_id, current["cell"])
+                self.version += 1
+
+    def _discard(self, shift_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.pop(shift_id, None)
+            if not members:
+                del self._cells[cell]
+
+    def load(self, positions):
+        """Substitui o conteúdo do índice pelas posições informadas"""
+        cells, by_shift = {}, {}
+        for position in positions:
+            position = dict(position, latitude=float(position["latitude"]), longitude=float(position["longitude"]))
+            position["cell"] = _cell(position["latitude"], position["longitude"])
+            by_shift[position["shift_id"]] = position
+            cells.setdefault(position["cell"], {})[position["shift_id"]] = position
+        with self._lock:
+            self._cells, self._positions = cells, by_shift
+            self._loaded_at = time.monotonic()
+            self.version += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def refresh_if_stale(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > INDEX_REFRESH_SECONDS:
+            self.load(load_open_positions())
+
+    def nearest(self, latitude, longitude, k=5, max_age_seconds=DEFAULT_MAX_FIX_AGE_SECONDS, now=None):
+        """
+        Retorna até k posições mais próximas do ponto, da mais próxima para a mais distante,
+        com distance_km e fix_age_seconds. Posições mais antigas que max_age_seconds são ignoradas.
+        """
+        latitude, longitude = float(latitude), float(longitude)
+        now = now or timezone.now()
+        center = _cell(latitude, longitude)
+        best = []  # heap de (-distância, shift_id, posição)
+
+        def visit(members):
+            for position in members.values():
+                age = (now - position["recorded_at"]).total_seconds()
+                if age > max_age_seconds:
+                    continue
+                distance = haversine(latitude, longitude, position["latitude"], position["longitude"])
+                item = (-distance, position["shift_id"], dict(position, fix_age_seconds=max(age, 0)))
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, item)
+
+        with self._lock:
+            remaining = len(self._positions)
+            radius = 0
+            while remaining and k > 0:
+                if len(best) == k and -best[0][0] <= _ring_min_distance_km(latitude, radius):
+                    break
+                if 8 * radius > len(self._cells):
+                    # Vizinhos distantes: o anel já tem mais células que o índice inteiro,
+                    # então percorre de uma vez as células ocupadas ainda não visitadas
+                    for cell, members in self._cells.items():
+                        if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) >= radius:
+                            visit(members)
+                    break
+                for cell in _ring(center, radius):
+                    members = self._cells.get(cell)
+                    if members:
+                        remaining -= len(members)
+                        visit(members)
+                radius += 1
+
+        results = []
+        for negative_distance, _, position in sorted(best, reverse=True):
+            position.pop("cell")
+            position["distance_km"] = -negative_distance
+            results.append(position)
+        return results
+
+
+def load_open_positions():
+    return [
+        {
+            "shift_id": row["work_shift_id"],
+            "employee_id": row["work_shift__employee_id"],
+            "latitude": row["latitude"],
+            "longitude": row["longitude"],
+            "recorded_at": row["recorded_at"],
+        }
+        for row in WorkShiftLastPosition.objects.filter(work_shift__end_time__isnull=True).values(
+            "work_shift_id", "work_shift__employee_id", "latitude", "longitude", "recorded_at"
+        ).iterator()
+    ]
+
+
+position_index = PositionIndex()
@@ -0,0 +1,87 @@
+# attendance/services/report_export.py
+import csv
+
+from django.utils import timezone
+
+from attendance.models import WorkShift
+from attendance.services.workshift_service import build_shift_report_row, with_shift_metrics
+from attendance.utils.dates import date_range_q
+from attendance.utils.xlsx_stream import stream_xlsx
+
+
+# Jornadas lidas do banco por vez (cursor no servidor quando o banco suporta)
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_HEADER = [
+    "Matrícula",
+    "Funcionário",
+    "E-mail",
+    "Data",
+    "Entrada",
+    "Saída",
+    "Duração",
+    "Atraso",
+    "Hora extra",
+    "Duração (min)",
+    "Atraso (min)",
+    "Hora extra (min)",
+    "Ajustada",
+]
+
+
+def export_queryset(employee_ids=None, start_date=None, end_date=None):
+    queryset = (
+        with_shift_metrics(WorkShift.objects.select_related("employee__user"))
+        .filter(date_range_q("start_time", start_date, end_date))
+        .order_by("employee_id", "start_time")
+    )
+    if employee_ids:
+        queryset = queryset.filter(employee_id__in=employee_ids)
+    return queryset
+
+
+def iter_export_rows(queryset):
+    """
+    Linhas da exportação, uma jornada por vez.
+    Mesmas regras de duração/atraso/hora extra do relatório (build_shift_report_row),
+    com data e horários no fuso local.
+    """
+    for shift in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = build_shift_report_row(shift)
+        user = shift.employee.user
+        start = timezone.localtime(shift.start_time)
+        end = shift.get_effective_end_time()
+        yield [
+            shift.employee.matricula,
+            user.get_full_name() or user.email,
+            user.email,
+            start.strftime("%d/%m/%Y"),
+            start.strftime("%H:%M"),
+            timezone.localtime(end).strftime("%H:%M") if end else "",
+            row["duration"] or "",
+            row["delay"],
+            row["extra"],
+            row["duration_minutes"],
+            row["delay_minutes"],
+            row["extra_minutes"],
+            "Sim" if row["adjusted"] else "Não",
+        ]
+
+
+class _Echo:
+    """Pseudo-buffer: o csv.writer devolve a linha formatada em vez de acumulá-la"""
+
+    def write(self, value):
+        return value
+
+
+def stream_export_csv(queryset):
+    # BOM + ";" para abrir corretamente no Excel em pt-BR
+    writer = csv.writer(_Echo(), delimiter=";")
+    yield "﻿" + writer.writerow(EXPORT_HEADER)
+    for values in iter_export_rows(queryset):
+        yield writer.writerow(["" if value is None else value for value in values])
+
+
+def stream_export_xlsx(queryset):
+    return stream_xlsx(EXPORT_HEADER, iter_export_rows(queryset), sheet_name="Jornadas")
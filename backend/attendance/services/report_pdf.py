@@ -0,0 +1,254 @@
+# attendance/services/report_pdf.py
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, models
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from weasyprint import HTML
+
+from attendance.models import DailyAttendanceSummary, WorkShift
+from attendance.services.workshift_service import get_workshifts_for_user
+from attendance.utils.dates import date_range_q
+
+
+# Situação dos jobs de PDF
+JOB_PENDING = "PENDING"
+JOB_RUNNING = "RUNNING"
+JOB_DONE = "DONE"
+JOB_FAILED = "FAILED"
+
+JOB_KEY = "pdf_job:{job_id}"
+JOB_TIMEOUT = 60 * 60 * 24
+# Prazo de um job PENDING/RUNNING: passado o prazo (thread do pool morta, processo
+# reiniciado), o pedido seguinte agenda a geração de novo
+JOB_RENDER_DEADLINE = 60 * 5
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "REPORT_PDF_WORKERS", 2),
+            thread_name_prefix="report-pdf"
+        )
+    return _executor
+
+
+def get_reports_dir():
+    path = getattr(settings, "REPORT_PDF_CACHE_DIR", settings.BASE_DIR / "var" / "reports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _as_date(value):
+    if isinstance(value, date) or value is None:
+        return value
+    return parse_date(value)
+
+
+def report_data_version(employee, start_date, end_date):
+    """
+    Carimbo dos dados do relatório: muda quando uma jornada do período é criada,
+    editada, encerrada ou ajustada (updated_at), quando a jornada padrão do funcionário
+    muda (atraso e hora extra) ou quando um resumo diário do período é regravado
+    (os totais vêm dos resumos). Jornadas abertas mudam a cada minuto.
+    """
+    queryset = WorkShift.objects.filter(date_range_q("start_time", start_date, end_date), employee=employee)
+
+    stamp = queryset.aggregate(
+        count=models.Count("id"),
+        last_update=models.Max("updated_at"),
+        open_count=models.Count("id", filter=models.Q(end_time__isnull=True)),
+    )
+    summaries = DailyAttendanceSummary.objects.filter(employee=employee)
+    if start_date:
+        summaries = summaries.filter(day__gte=start_date)
+    if end_date:
+        summaries = summaries.filter(day__lte=end_date)
+    summary_stamp = summaries.aggregate(count=models.Count("id"), last_update=models.Max("updated_at"))
+
+    version = ":".join([
+        str(stamp["count"]),
+        stamp["last_update"].isoformat() if stamp["last_update"] else "-",
+        employee.jornada.isoformat() if employee.jornada else "-",
+        str(summary_stamp["count"]),
+        summary_stamp["last_update"].isoformat() if summary_stamp["last_update"] else "-",
+    ])
+    if stamp["open_count"]:
+        version += f":{timezone.now().strftime('%Y%m%d%H%M')}"
+    return version
+
+
+def report_cache_key(employee, start_date, end_date, signature_base64):
+    """Chave do PDF no cache: funcionário, período, hash da assinatura e versão dos dados"""
+    signature_hash = hashlib.sha256((signature_base64 or "").encode()).hexdigest()
+    parts = [
+        str(employee.id),
+        start_date.isoformat() if start_date else "-",
+        end_date.isoformat() if end_date else "-",
+        signature_hash,
+        report_data_version(employee, start_date, end_date),
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def cached_pdf_path(key):
+    return os.path.join(get_reports_dir(), f"{key}.pdf")
+
+
+def render_workshift_report_pdf(user, start_date, end_date, signature_base64):
+    """Renderiza o espelho de ponto em PDF (WeasyPrint)"""
+    employee = user.employee
+    rows, totals = get_workshifts_for_user(user, start_date, end_date)
+
+    html_string = render_to_string(
+        "attendance/workshift_report_pdf.html",
+        {
+            "user": user,
+            "employee": employee,
+            "rows": rows,
+            "totals": totals,
+            "start_date": start_date,
+            "end_date": end_date,
+            "signature_base64": signature_base64,
+            "signature_rotated": True,
+            "signed_at": timezone.now(),
+        }
+    )
+    return HTML(string=html_string).write_pdf()
+
+
+def evict_cached_pdfs(max_age=None):
+    """
+    Remove do cache os PDFs (e temporários abandonados) mais antigos que REPORT_PDF_CACHE_TTL.
+    Jornadas abertas geram uma versão por minuto: sem a remoção o diretório só cresce.
+    Retorna o número de arquivos removidos.
+    """
+    max_age = max_age if max_age is not None else getattr(settings, "REPORT_PDF_CACHE_TTL", JOB_TIMEOUT)
+    oldest = time.time() - max_age
+    removed = 0
+    with os.scandir(get_reports_dir()) as entries:
+        for entry in entries:
+            if not entry.name.endswith((".pdf", ".tmp")) or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime < oldest:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                # Removido por outro worker
+                continue
+    return removed
+
+
+def _write_cached_pdf(key, pdf_file):
+    path = cached_pdf_path(key)
+    fd, tmp_path = tempfile.mkstemp(dir=get_reports_dir(), suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp:
+        tmp.write(pdf_file)
+    os.replace(tmp_path, path)
+    evict_cached_pdfs()
+    return path
+
+
+def get_or_render_report_pdf(user, start_date, end_date, signature_base64):
+    """Retorna o PDF do cache, ou renderiza e grava no cache"""
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    key = report_cache_key(user.employee, start_date, end_date, signature_base64)
+    path = cached_pdf_path(key)
+    if os.path.exists(path):
+        with open(path, "rb") as cached:
+            return cached.read()
+
+    pdf_file = render_workshift_report_pdf(user, start_date, end_date, signature_base64)
+    _write_cached_pdf(key, pdf_file)
+    return pdf_file
+
+
+def get_job(job_id):
+    return caches["shared"].get(JOB_KEY.format(job_id=job_id))
+
+
+def discard_job(job_id):
+    caches["shared"].delete(JOB_KEY.format(job_id=job_id))
+
+
+def _set_job(job_id, **fields):
+    cache = caches["shared"]
+    job = cache.get(JOB_KEY.format(job_id=job_id)) or {}
+    job.update(fields, job_id=job_id)
+    cache.set(JOB_KEY.format(job_id=job_id), job, timeout=JOB_TIMEOUT)
+    return job
+
+
+def _run_job(job_id, user, start_date, end_date, signature_base64):
+    try:
+        _set_job(job_id, status=JOB_RUNNING, started_at=timezone.now())
+        pdf_file = render_workshift_report_pdf(user, start_date, end_date, signature_base64)
+        _write_cached_pdf(job_id, pdf_file)
+        _set_job(job_id, status=JOB_DONE, finished_at=timezone.now())
+    except Exception as e:
+        _set_job(job_id, status=JOB_FAILED, error=str(e))
+
+
+def _run_job_in_pool(*args):
+    try:
+        _run_job(*args)
+    finally:
+        # Conexões abertas pela thread do pool
+        connections.close_all()
+
+
+def job_in_progress(job):
+    """Job PENDING/RUNNING dentro do prazo de geração (REPORT_PDF_RENDER_DEADLINE)"""
+    if not job or job.get("status") not in (JOB_PENDING, JOB_RUNNING):
+        return False
+    since = job.get("started_at") or job.get("created_at")
+    deadline = getattr(settings, "REPORT_PDF_RENDER_DEADLINE", JOB_RENDER_DEADLINE)
+    return since is not None and (timezone.now() - since).total_seconds() < deadline
+
+
+def submit_report_pdf_job(user, start_date=None, end_date=None, signature_base64=None):
+    """
+    Agenda a geração do PDF no pool de workers.
+    O id do job é a própria chave do cache: pedidos idênticos reaproveitam o mesmo job
+    e, se o PDF já existe, o job nasce concluído. Um job parado além do prazo de
+    geração é agendado de novo.
+    """
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    employee = user.employee  # em cache quando a view já o consultou
+    job_id = report_cache_key(employee, start_date, end_date, signature_base64)
+
+    if os.path.exists(cached_pdf_path(job_id)):
+        return _set_job(job_id, status=JOB_DONE, user_id=user.pk)
+
+    job = get_job(job_id)
+    if job_in_progress(job):
+        return job
+
+    job = _set_job(
+        job_id,
+        status=JOB_PENDING,
+        user_id=user.pk,
+        created_at=timezone.now(),
+        started_at=None,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    if getattr(settings, "REPORT_PDF_WORKERS", 2) > 0:
+        get_executor().submit(_run_job_in_pool, job_id, user, start_date, end_date, signature_base64)
+        return job
+
+    # Sem pool (REPORT_PDF_WORKERS = 0): gera na própria requisição
+    _run_job(job_id, user, start_date, end_date, signature_base64)
+    return get_job(job_id)
@@ -0,0 +1,118 @@
+# attendance/services/risk_score.py
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from accounts.models import Employee
+from attendance.models import EmployeeRiskScore, FraudAlert
+
+
+# Decaimento "para frente": o score de um alerta criado em t vale score * 2^(-(agora - t) / meia-vida).
+# Guardamos score * 2^((t - EPOCH) / meia-vida), que não depende de "agora": criar/resolver alertas
+# é somar/subtrair uma constante, e o score atual é weight * 2^(-(agora - EPOCH) / meia-vida).
+# Com meia-vida de 14 dias, os pesos cabem em float por ~39 anos a partir da época.
+RISK_SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _half_life_seconds():
+    return getattr(settings, "RISK_SCORE_HALF_LIFE_DAYS", 14) * 86400
+
+
+def alert_weight(score, created_at):
+    return score * math.pow(2, (created_at - RISK_SCORE_EPOCH).total_seconds() / _half_life_seconds())
+
+
+def decay_factor(now=None):
+    """Fator que converte o peso guardado no score atual"""
+    now = now or timezone.now()
+    return math.pow(2, -(now - RISK_SCORE_EPOCH).total_seconds() / _half_life_seconds())
+
+
+def current_score(weight, now=None):
+    # Subtrações de alertas resolvidos podem deixar resíduos de arredondamento negativos
+    return max(weight * decay_factor(now), 0.0)
+
+
+def _employee_id_for(user_id):
+    return Employee.objects.filter(user_id=user_id).values_list("id", flat=True).first()
+
+
+def _add_weight(employee_id, delta, last_alert_at=None):
+    changes = {"weight": models.F("weight") + delta, "updated_at": timezone.now()}
+    if last_alert_at is not None:
+        changes["last_alert_at"] = last_alert_at
+
+    if EmployeeRiskScore.objects.filter(employee_id=employee_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            EmployeeRiskScore.objects.create(employee_id=employee_id, weight=delta, last_alert_at=last_alert_at)
+    except IntegrityError:
+        # Criado por outra requisição entre o UPDATE e o INSERT
+        EmployeeRiskScore.objects.filter(employee_id=employee_id).update(**changes)
+
+
+def register_alert(alert, employee_id=None):
+    """Soma um alerta novo ao score do funcionário (um UPDATE)"""
+    employee_id = employee_id or _employee_id_for(alert.user_id)
+    if employee_id is None:
+        return
+    _add_weight(employee_id, alert_weight(alert.score, alert.created_at), alert.created_at)
+
+
+def unregister_alerts(alerts):
+    """Retira alertas resolvidos do score dos funcionários (um UPDATE por funcionário)"""
+    deltas = {}
+    rows = alerts.filter(user__employee__isnull=False).values_list("user__employee", "score", "created_at")
+    for employee_id, score, created_at in rows:
+        deltas[employee_id] = deltas.get(employee_id, 0.0) + alert_weight(score, created_at)
+    for employee_id, delta in deltas.items():
+        _add_weight(employee_id, -delta)
+
+
+def resolve_alerts(alerts):
+    """Marca os alertas em aberto como resolvidos e atualiza os scores. Retorna a quantidade"""
+    with transaction.atomic():
+        pending = FraudAlert.objects.filter(pk__in=list(alerts.filter(resolved=False).values_list("pk", flat=True)))
+        unregister_alerts(pending)
+        return pending.update(resolved=True, updated_at=timezone.now())
+
+
+def rebuild_risk_scores():
+    """Recalcula todos os scores a partir dos alertas em aberto (ex.: após rescan_frauds)"""
+    scores = {}
+    rows = (
+        FraudAlert.objects.filter(resolved=False, user__employee__isnull=False)
+        .values_list("user__employee", "score", "created_at")
+        .iterator()
+    )
+    for employee_id, score, created_at in rows:
+        weight, last_alert_at = scores.get(employee_id, (0.0, created_at))
+        scores[employee_id] = (weight + alert_weight(score, created_at), max(last_alert_at, created_at))
+
+    with transaction.atomic():
+        EmployeeRiskScore.objects.all().delete()
+        EmployeeRiskScore.objects.bulk_create([
+            EmployeeRiskScore(employee_id=employee_id, weight=weight, last_alert_at=last_alert_at)
+            for employee_id, (weight, last_alert_at) in scores.items()
+        ])
+    return len(scores)
+
+
+def get_risk_score(user_id, now=None):
+    score = EmployeeRiskScore.objects.filter(employee__user_id=user_id).values_list("weight", flat=True).first()
+    return current_score(score or 0.0, now)
+
+
+def top_risky_employees(limit=10, now=None):
+    """Funcionários com maior score atual, lidos do índice de weight (sem agregar alertas)"""
+    factor = decay_factor(now)
+    ranking = (
+        EmployeeRiskScore.objects.filter(weight__gt=0)
+        .select_related("employee__user")
+        .order_by("-weight")[:limit]
+    )
+    return [(entry, max(entry.weight * factor, 0.0)) for entry in ranking]
@@ -0,0 +1,117 @@
+# attendance/services/shift_state.py
+from django.core.cache import caches
+from django.db.models import F
+
+from attendance.models import WorkShift, WorkShiftLocation
+
+
+# Estado da jornada ativa por funcionário, compartilhado entre os workers.
+# Cada escrita incrementa a versão; um estado cuja versão difere da versão
+# corrente é considerado obsoleto e reconstruído a partir do banco.
+STATE_KEY = "shift_state:{employee_id}"
+VERSION_KEY = "shift_state_version:{employee_id}"
+
+
+def _cache():
+    return caches["shared"]
+
+
+def _keys(employee_id):
+    return STATE_KEY.format(employee_id=employee_id), VERSION_KEY.format(employee_id=employee_id)
+
+
+def _next_version(cache, version_key):
+    # incr é atômico em Redis/Memcached (SHARED_CACHE_URL); no FileBasedCache é leitura + escrita
+    try:
+        return cache.incr(version_key)
+    except ValueError:
+        cache.add(version_key, 0, timeout=None)
+        return cache.incr(version_key)
+
+
+def build_state_from_db(employee_id):
+    """
+    Reconstrói o estado a partir do banco:
+    turno aberto, último ponto do turno aberto e ponto final do último turno encerrado.
+    """
+    state = {
+        "shift_id": None,
+        "start_time": None,
+        "start_latitude": None,
+        "start_longitude": None,
+        "last_fix": None,
+        "last_end": None,
+    }
+
+    open_shift = WorkShift.objects.filter(employee_id=employee_id, end_time__isnull=True).first()
+    if open_shift:
+        state.update({
+            "shift_id": open_shift.id,
+            "start_time": open_shift.start_time,
+            "start_latitude": open_shift.start_latitude,
+            "start_longitude": open_shift.start_longitude,
+        })
+        # Pelo horário do dispositivo: pontos reenviados fora de ordem são gravados depois de pontos mais recentes
+        last_location = (
+            WorkShiftLocation.objects.filter(work_shift=open_shift)
+            .order_by(F("recorded_at").desc(nulls_last=True), "-created_at")
+            .first()
+        )
+        if last_location:
+            state["last_fix"] = (last_location.latitude, last_location.longitude, last_location.get_recorded_at())
+
+    last_closed = (
+        WorkShift.objects.filter(employee_id=employee_id, end_time__isnull=False)
+        .order_by("-end_time")
+        .values("end_latitude", "end_longitude")
+        .first()
+    )
+    if last_closed:
+        state["last_end"] = (last_closed["end_latitude"], last_closed["end_longitude"])
+
+    return state
+
+
+def get_shift_state(employee_id):
+    """
+    Retorna o estado da jornada do funcionário.
+    Caminho normal: uma leitura do cache (estado + versão), sem acesso ao banco.
+    """
+    cache = _cache()
+    state_key, version_key = _keys(employee_id)
+    cached = cache.get_many([state_key, version_key])
+    state = cached.get(state_key)
+
+    if state is not None and state.get("version") == cached.get(version_key):
+        return state
+
+    state = build_state_from_db(employee_id)
+    return save_shift_state(employee_id, state, expected_version=None)
+
+
+def save_shift_state(employee_id, state, expected_version):
+    """
+    Grava o estado (write-through) com uma nova versão.
+    expected_version é a versão lida antes da alteração. A nova versão vem de um único incr:
+    se não for expected_version + 1, outro worker gravou no meio e o estado local está
+    obsoleto; o cache é invalidado para forçar a reconstrução.
+    """
+    cache = _cache()
+    state_key, version_key = _keys(employee_id)
+
+    version = _next_version(cache, version_key)
+    if expected_version is not None and version != expected_version + 1:
+        invalidate_shift_state(employee_id)
+        return state
+
+    state = dict(state, version=version)
+    cache.set(state_key, state, timeout=None)
+    return state
+
+
+def invalidate_shift_state(employee_id):
+    """Marca o estado como obsoleto (ex.: ajuste administrativo)"""
+    cache = _cache()
+    state_key, version_key = _keys(employee_id)
+    _next_version(cache, version_key)
+    cache.delete(state_key)
@@ -0,0 +1,152 @@
+# attendance/services/track_archive.py
+import os
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from attendance.models import TrackArchiveEntry, WorkShift, WorkShiftLocation, WorkShiftTrack
+
+
+# Jornadas movidas por lote: cada lote grava seus arquivos e depois remove as linhas
+# em uma transação curta, sem segurar locks longos sobre a tabela de pontos
+ARCHIVE_BATCH_SIZE = 200
+
+COORDINATE_SCALE = 1_000_000
+
+
+def get_archive_dir():
+    path = getattr(settings, "TRACK_ARCHIVE_DIR", settings.BASE_DIR / "var" / "track_archive")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def archive_cutoff(older_than_days=None):
+    days = older_than_days if older_than_days is not None else getattr(settings, "TRACK_ARCHIVE_AFTER_DAYS", 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_candidates(before):
+    """Jornadas encerradas antes de `before` que ainda têm trilha no banco, em ordem de id"""
+    with_track = WorkShiftTrack.objects.filter(work_shift__end_time__lt=before).values_list("work_shift_id", flat=True)
+    with_locations = WorkShiftLocation.objects.filter(work_shift__end_time__lt=before).values_list("work_shift_id", flat=True)
+    return (
+        WorkShift.objects.filter(Q(id__in=with_track) | Q(id__in=with_locations), archive_entry__isnull=True)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def _write_part(month, tracks):
+    """
+    Grava um arquivo colunar comprimido (.npz) com os pontos das jornadas do mês.
+    Colunas: shift_id, latitude/longitude em micrograus e horário em segundos epoch;
+    os pontos de cada jornada ficam contíguos. Retorna (caminho relativo, [(shift_id, offset, pontos)]).
+    """
+    shift_ids, latitudes, longitudes, seconds, entries = [], [], [], [], []
+    offset = 0
+    for shift_id, points in tracks:
+        entries.append((shift_id, offset, len(points)))
+        offset += len(points)
+        for latitude, longitude, moment in points:
+            shift_ids.append(shift_id)
+            latitudes.append(float(latitude))
+            longitudes.append(float(longitude))
+            seconds.append(moment.timestamp())
+
+    relative_path = os.path.join(month, f"part-{uuid.uuid4().hex}.npz")
+    path = os.path.join(get_archive_dir(), relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as part:
+        np.savez_compressed(
+            part,
+            shift_id=np.array(shift_ids, dtype=np.int64),
+            latitude=np.rint(np.array(latitudes) * COORDINATE_SCALE).astype(np.int32),
+            longitude=np.rint(np.array(longitudes) * COORDINATE_SCALE).astype(np.int32),
+            recorded_at=np.rint(np.array(seconds)).astype(np.int64),
+        )
+        part.flush()
+        os.fsync(part.fileno())
+    os.replace(tmp_path, path)
+    return relative_path, entries
+
+
+def archive_shifts(shift_ids):
+    """
+    Move as trilhas das jornadas para o arquivo frio: grava um arquivo por mês do lote,
+    registra o manifesto e remove WorkShiftLocation/WorkShiftTrack na mesma transação.
+    Retorna a quantidade de pontos arquivados.
+    """
+    from attendance.services.track_compression import iter_shift_tracks
+
+    months = dict(
+        (shift_id, timezone.localtime(start_time).strftime("%Y-%m"))
+        for shift_id, start_time in WorkShift.objects.filter(id__in=shift_ids).values_list("id", "start_time")
+    )
+    by_month = {}
+    for shift_id, points in iter_shift_tracks(list(months), include_archive=False):
+        if points:
+            by_month.setdefault(months[shift_id], []).append((shift_id, points))
+
+    written, manifest = [], []
+    try:
+        for month, tracks in sorted(by_month.items()):
+            relative_path, entries = _write_part(month, tracks)
+            written.append(relative_path)
+            manifest.extend(
+                TrackArchiveEntry(work_shift_id=shift_id, month=month, path=relative_path, offset=offset, points=count)
+                for shift_id, offset, count in entries
+            )
+
+        archived_ids = [entry.work_shift_id for entry in manifest]
+        with transaction.atomic():
+            TrackArchiveEntry.objects.bulk_create(manifest)
+            WorkShiftLocation.objects.filter(work_shift_id__in=archived_ids).delete()
+            WorkShiftTrack.objects.filter(work_shift_id__in=archived_ids).delete()
+    except Exception:
+        # Arquivos sem manifesto não seriam lidos: remove para não acumular órfãos
+        for relative_path in written:
+            os.remove(os.path.join(get_archive_dir(), relative_path))
+        raise
+
+    return sum(entry.points for entry in manifest)
+
+
+def archive_old_tracks(older_than_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Arquiva, em lotes, as trilhas das jornadas encerradas há mais de `older_than_days` dias"""
+    before = archive_cutoff(older_than_days)
+    last_id = 0
+    while True:
+        batch = list(archive_candidates(before).filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1]
+        yield len(batch), archive_shifts(batch)
+
+
+@lru_cache(maxsize=16)
+def _load_part(relative_path):
+    # Arquivos do arquivo frio nunca são reescritos: podem ficar em cache no processo
+    with np.load(os.path.join(get_archive_dir(), relative_path)) as part:
+        return {name: part[name] for name in part.files}
+
+
+def iter_archived_tracks(shift_ids):
+    """Trilhas arquivadas das jornadas: (shift_id, [(latitude, longitude, horário)])"""
+    entries = TrackArchiveEntry.objects.filter(work_shift_id__in=shift_ids).order_by("path", "offset")
+    for entry in entries.iterator():
+        part = _load_part(entry.path)
+        rows = slice(entry.offset, entry.offset + entry.points)
+        yield entry.work_shift_id, [
+            (latitude / COORDINATE_SCALE, longitude / COORDINATE_SCALE, datetime.fromtimestamp(moment, tz=dt_timezone.utc))
+            for latitude, longitude, moment in zip(
+                part["latitude"][rows].tolist(), part["longitude"][rows].tolist(), part["recorded_at"][rows].tolist()
+            )
+        ]
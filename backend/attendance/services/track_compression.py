@@ -0,0 +1,129 @@
+# attendance/services/track_compression.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from attendance.models import WorkShift, WorkShiftLocation, WorkShiftTrack
+from attendance.utils.track_codec import RAW_POINT_BYTES, compress_track, decode_track
+
+
+# Erro posicional máximo aceito na simplificação (metros)
+TRACK_TOLERANCE_M = 10
+
+
+def compression_cutoff(older_than_days=None):
+    days = older_than_days if older_than_days is not None else getattr(settings, "TRACK_COMPRESS_AFTER_DAYS", 30)
+    return timezone.now() - timedelta(days=days)
+
+
+def compression_candidates(before):
+    """
+    Jornadas encerradas antes de `before` que ainda guardam os pontos brutos, em ordem de id.
+    Jornadas recentes ficam de fora: a reavaliação de fraudes, o playback e a auditoria
+    precisam dos pontos brutos, que a simplificação descarta.
+    """
+    return (
+        WorkShift.objects.filter(end_time__lt=before, track__isnull=True, locations__isnull=False)
+        .distinct().order_by("id").values_list("id", flat=True)
+    )
+
+
+def _raw_points(shift_id):
+    return list(
+        WorkShiftLocation.objects.filter(work_shift_id=shift_id)
+        .annotate(moment=Coalesce("recorded_at", "created_at"))
+        .order_by("moment", "id")
+        .values_list("latitude", "longitude", "moment")
+    )
+
+
+def compress_shift_track(shift_id, tolerance_m=TRACK_TOLERANCE_M):
+    """
+    Comprime a trilha da jornada em um WorkShiftTrack e remove as linhas de WorkShiftLocation.
+    Retorna o WorkShiftTrack, ou None se a jornada não tiver pontos.
+    """
+    points = _raw_points(shift_id)
+    if not points:
+        return None
+
+    latitudes, longitudes, moments = zip(*points)
+    data, stats = compress_track(
+        [float(value) for value in latitudes],
+        [float(value) for value in longitudes],
+        [moment.timestamp() for moment in moments],
+        tolerance_m,
+    )
+    with transaction.atomic():
+        track, _ = WorkShiftTrack.objects.update_or_create(
+            work_shift_id=shift_id,
+            defaults={
+                "data": data,
+                "original_points": stats["original_points"],
+                "stored_points": stats["stored_points"],
+                "tolerance_m": tolerance_m,
+                "max_error_m": stats["max_error_m"],
+            },
+        )
+        WorkShiftLocation.objects.filter(work_shift_id=shift_id).delete()
+    return track
+
+
+def decode_shift_track(track):
+    """Pontos da trilha comprimida: [(latitude, longitude, horário)]"""
+    latitudes, longitudes, seconds = decode_track(track.data)
+    return [
+        (latitude, longitude, datetime.fromtimestamp(int(moment), tz=dt_timezone.utc))
+        for latitude, longitude, moment in zip(latitudes.tolist(), longitudes.tolist(), seconds.tolist())
+    ]
+
+
+def iter_shift_tracks(shift_ids, include_archive=True):
+    """
+    Trilhas das jornadas em ordem cronológica: (shift_id, [(latitude, longitude, horário)]).
+    Cada jornada é lida de onde estiver: pontos brutos (jornadas abertas ou ainda não
+    comprimidas), trilha comprimida ou arquivo frio. Jornadas sem pontos são omitidas.
+    """
+    pending = set(shift_ids)
+    rows = (
+        WorkShiftLocation.objects.filter(work_shift_id__in=pending)
+        .annotate(moment=Coalesce("recorded_at", "created_at"))
+        .order_by("work_shift_id", "moment", "id")
+        .values_list("work_shift_id", "latitude", "longitude", "moment")
+        .iterator(chunk_size=5000)
+    )
+    for shift_id, points in groupby(rows, key=lambda row: row[0]):
+        pending.discard(shift_id)
+        yield shift_id, [(float(lat), float(lon), moment) for _, lat, lon, moment in points]
+
+    compressed = WorkShiftTrack.objects.filter(work_shift_id__in=list(pending)).order_by("work_shift_id")
+    for track in compressed.iterator(chunk_size=500):
+        pending.discard(track.work_shift_id)
+        yield track.work_shift_id, decode_shift_track(track)
+
+    if include_archive and pending:
+        from attendance.services.track_archive import iter_archived_tracks
+
+        yield from iter_archived_tracks(pending)
+
+
+def get_shift_track(shift_id):
+    """Trilha da jornada em ordem cronológica, [(latitude, longitude, horário)]"""
+    for _, points in iter_shift_tracks([shift_id]):
+        return points
+    return []
+
+
+def track_stats(track):
+    size = len(track.data)
+    return {
+        "original_points": track.original_points,
+        "stored_points": track.stored_points,
+        "size_bytes": size,
+        "compression_ratio": round(track.original_points * RAW_POINT_BYTES / size, 2) if size else 1.0,
+        "tolerance_m": track.tolerance_m,
+        "max_error_m": round(track.max_error_m, 2),
+    }
@@ -0,0 +1,96 @@
+# attendance/services/track_playback.py
+from bisect import bisect_right
+
+from django.core.cache import caches
+
+from attendance.models import FraudAlert
+from attendance.services.track_compression import get_shift_track
+from attendance.utils.track_codec import downsample_track
+
+
+# Reprodução da trilha de uma jornada: no máximo max_points pontos escolhidos por LTTB
+# (utils.track_codec.downsample_track). A trilha reduzida de jornadas encerradas (saída registrada
+# ou ajuste administrativo) não muda mais e fica em cache por (jornada, encerramento efetivo,
+# horário do ajuste, max_points): ajustar ou reajustar o encerramento gera outra chave.
+PLAYBACK_CACHE_KEY = "shift_playback:{shift_id}:{end}:{adjusted}:{max_points}"
+PLAYBACK_CACHE_TIMEOUT = 7 * 24 * 3600
+DEFAULT_PLAYBACK_POINTS = 500
+MAX_PLAYBACK_POINTS = 5000
+
+
+def _cache():
+    return caches["shared"]
+
+
+def downsampled_track(shift, max_points):
+    """Trilha reduzida [(latitude, longitude, horário)] e quantidade de pontos da trilha completa"""
+    key = None
+    end_time = shift.get_effective_end_time()
+    if end_time is not None:
+        key = PLAYBACK_CACHE_KEY.format(
+            shift_id=shift.id,
+            end=int(end_time.timestamp()),
+            adjusted=int(shift.adjusted_at.timestamp()) if shift.adjusted_at else "-",
+            max_points=max_points,
+        )
+        cached = _cache().get(key)
+        if cached is not None:
+            return cached
+
+    points = get_shift_track(shift.id)
+    kept = downsample_track([point[0] for point in points], [point[1] for point in points], max_points)
+    result = ([points[index] for index in kept], len(points))
+    if key is not None:
+        _cache().set(key, result, timeout=PLAYBACK_CACHE_TIMEOUT)
+    return result
+
+
+def position_at(points, moment):
+    """Posição interpolada no horário sobre a trilha [(latitude, longitude, horário)]"""
+    if not points:
+        return None, None
+    index = bisect_right([point[2] for point in points], moment)
+    if index == 0:
+        return points[0][:2]
+    if index == len(points):
+        return points[-1][:2]
+    (lat_a, lon_a, time_a), (lat_b, lon_b, time_b) = points[index - 1], points[index]
+    span = (time_b - time_a).total_seconds()
+    ratio = (moment - time_a).total_seconds() / span if span > 0 else 0
+    return lat_a + (lat_b - lat_a) * ratio, lon_a + (lon_b - lon_a) * ratio
+
+
+def shift_playback(shift, max_points=DEFAULT_PLAYBACK_POINTS):
+    """
+    Trilha reduzida da jornada com deslocamento em segundos desde o início da jornada,
+    e os alertas de fraude da jornada posicionados sobre a trilha no horário em que ocorreram.
+    """
+    points, original_points = downsampled_track(shift, max_points)
+    origin = shift.start_time
+
+    alerts = []
+    rows = FraudAlert.objects.filter(work_shift=shift).order_by("created_at", "id").values(
+        "id", "fraud_type", "description", "created_at"
+    )
+    for alert in rows:
+        latitude, longitude = position_at(points, alert["created_at"])
+        alerts.append({
+            "id": alert["id"],
+            "fraud_type": alert["fraud_type"],
+            "description": alert["description"],
+            "offset_seconds": round((alert["created_at"] - origin).total_seconds()),
+            "latitude": latitude,
+            "longitude": longitude,
+        })
+
+    return {
+        "shift_id": shift.id,
+        "start_time": origin,
+        "end_time": shift.end_time,
+        "original_points": original_points,
+        "points": [
+            {"latitude": latitude, "longitude": longitude, "offset_seconds": round((moment - origin).total_seconds())}
+            for latitude, longitude, moment in points
+        ],
+        "alerts": alerts,
+    }
@@ -1,9 +1,15 @@
 # attendance/services/workshift_service.py
+from bisect import bisect_right
 from decimal import Decimal
+import numpy as np
 from datetime import timedelta
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, DurationField, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractHour, ExtractMinute, Greatest, Now
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.exceptions import PermissionDenied
 
 # Modelos
@@ -12,7 +18,14 @@ from accounts.models import Employee, UserDevice
 
 # Utils
 from attendance.utils.antifraud import distance_km, haversine
-
+from attendance.utils.trajectory import HAVERSINE, analyze_trajectory
+from attendance.utils.dates import date_range_q
+from attendance.services.event_broker import publish_fraud_alert, publish_position
+from attendance.services.position_index import position_index
+from attendance.services.position_feed import remove_position, save_position
+from attendance.services.shift_state import get_shift_state, save_shift_state, invalidate_shift_state
+from attendance.services.daily_summary import count_alert_in_summary, refresh_daily_summary, summary_totals
+from attendance.services.risk_score import register_alert
 
 
 def get_workshifts_for_user(user, start_date=None, end_date=None):
@@ -20,71 +33,33 @@ def get_workshifts_for_user(user, start_date=None, end_date=None):
     Retorna os workshifts do usuário logado com os totais de duração, atraso e hora extra.
     start_date e end_date podem ser usados para filtrar o período.
     Considera a jornada padrão do funcionário.
+    Uma jornada pertence ao dia (local) em que começa, o mesmo critério dos resumos
+    diários de onde vêm os totais.
     """
-    from attendance.models import WorkShift
-    from datetime import datetime
     employee = Employee.objects.get(user=user)
 
-    queryset = WorkShift.objects.filter(employee=employee)
-
-    if start_date:
-        queryset = queryset.filter(start_time__date__gte=start_date)
-    if end_date:
-        queryset = queryset.filter(
-            models.Q(end_time__date__lte=end_date) |
-            models.Q(end_time__isnull=True)
-        )
-
-    queryset = queryset.order_by("start_time")
+    queryset = WorkShift.objects.filter(date_range_q("start_time", start_date, end_date), employee=employee)
+    queryset = with_shift_metrics(queryset).order_by("start_time")
+    totals = report_totals(employee.pk, start_date, end_date)
 
     rows = []
-    total_duration = timedelta()
-    total_delay = timedelta()
-    total_extra = timedelta()
-
-    jornada_padrao = employee.jornada or datetime.strptime("08:00", "%H:%M").time()
-    jornada_padrao_minutos = jornada_padrao.hour * 60 + jornada_padrao.minute
-
     for shift in queryset:
-        if not shift.start_time:
-            continue
-
-        end_time = shift.end_time or timezone.now()
-        duration_td = end_time - shift.start_time
-        duration_minutes = int(duration_td.total_seconds() // 60)
-
-        delay_minutes = max(jornada_padrao_minutos - duration_minutes, 0)
-        extra_minutes = max(duration_minutes - jornada_padrao_minutos, 0)
-
-        effective_date = (
-            shift.end_time.date()
-            if shift.end_time
-            else shift.start_time.date()
-        )
+        metrics = calculate_shift_mietrics(shift)
+        end_time = shift.get_effective_end_time()
         rows.append({
-            "date": effective_date.strftime("%d-%m-%Y"),
-            "start_time": timezone.localtime(shift.start_time).strftime("%H:%M") if shift.start_time else "-",
-            "end_time": timezone.localtime(shift.end_time).strftime("%H:%M") if shift.end_time else "-",
-            "duration": f"{duration_minutes//60:02d}:{duration_minutes%60:02d}",
-            "delay": f"{delay_minutes//60:02d}:{delay_minutes%60:02d}" if delay_minutes else "00:00",
-            "extra": f"{extra_minutes//60:02d}:{extra_minutes%60:02d}" if extra_minutes else "00:00",
-            "adjusted": getattr(shift, 'adjusted', False),
+            "date": timezone.localtime(end_time or shift.start_time).strftime("%d-%m-%Y"),
+            "start_time": timezone.localtime(shift.start_time).strftime("%H:%M"),
+            "end_time": timezone.localtime(end_time).strftime("%H:%M") if end_time else "-",
+            "duration": minutes_to_hhmm(metrics["duration_minutes"]),
+            "delay": minutes_to_hhmm(metrics["delay_minutes"] or 0),
+            "extra": minutes_to_hhmm(metrics["extra_minutes"] or 0),
+            "adjusted": shift.was_adjusted(),
         })
 
-        total_duration += timedelta(minutes=duration_minutes)
-        total_delay += timedelta(minutes=delay_minutes)
-        total_extra += timedelta(minutes=extra_minutes)
-
-    def format_timedelta(td):
-        total_minutes = int(td.total_seconds() // 60)
-        hours = total_minutes // 60
-        minutes = total_minutes % 60
-        return f"{hours:02d}:{minutes:02d}"
-
     totals = {
-        "total_duration": format_timedelta(total_duration),
-        "total_delay": format_timedelta(total_delay),
-        "total_extra": format_timedelta(total_extra),
+        "total_duration": minutes_to_hhmm(totals["duration_minutes"]),
+        "total_delay": minutes_to_hhmm(totals["delay_minutes"]),
+        "total_extra": minutes_to_hhmm(totals["extra_minutes"]),
     }
 
     return rows, totals
@@ -99,7 +74,47 @@ def parse_coordinate(value):
         return None
 
 
-def validate_shift_location(lat1, lon1, lat2, lon2, max_distance_m=200):
+def parse_device_timestamp(value):
+    """Converte o horário enviado pelo dispositivo para datetime aware, ou None se inválido"""
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(str(value))
+    except ValueError:
+        return None
+    if parsed is None:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+# Reenvio offline: horário do dispositivo aceito até este atraso (início/fim de jornada)
+MAX_OFFLINE_REPLAY_AGE = timedelta(hours=24)
+
+
+def resolve_device_time(value, now, not_before=None):
+    """
+    Horário efetivo de um evento: o do dispositivo, se informado, ou o do servidor.
+    Retorna None se o horário for inválido ou estiver fora da janela aceita
+    (de not_before, ou MAX_OFFLINE_REPLAY_AGE atrás, até MAX_DEVICE_CLOCK_SKEW à frente).
+    """
+    if value in (None, ""):
+        return now
+    moment = parse_device_timestamp(value)
+    if moment is None:
+        return None
+    if moment < (not_before or now - MAX_OFFLINE_REPLAY_AGE) or moment > now + MAX_DEVICE_CLOCK_SKEW:
+        return None
+    return moment
+
+
+# Regras de início/fim de jornada
+MIN_SHIFT_DURATION = timedelta(minutes=5)
+MAX_SHIFT_END_DISTANCE_M = 200
+
+
+def validate_shift_location(lat1, lon1, lat2, lon2, max_distance_m=MAX_SHIFT_END_DISTANCE_M):
     """Valida se a distância entre dois pontos está dentro do limite"""
     distance = haversine(lat1, lon1, lat2, lon2) * 1000  # metros
     if distance > max_distance_m:
@@ -108,6 +123,12 @@ def validate_shift_location(lat1, lon1, lat2, lon2, max_distance_m=200):
 
 def validate_user_device(user, device_id):
     """Valida se o usuário está usando um dispositivo registrado"""
+    # Token com vínculo de dispositivo: validação sem acesso ao banco
+    if hasattr(user, "has_device"):
+        if not user.has_device(device_id):
+            raise PermissionDenied("Dispositivo não autorizado")
+        return
+
     try:
         device = UserDevice.objects.get(user=user)
     except UserDevice.DoesNotExist:
@@ -116,26 +137,95 @@ def validate_user_device(user, device_id):
         raise PermissionDenied("Dispositivo não autorizado")
 
 
-def create_fraud_alert(user, fraud_type, description, work_shift=None):
-    """Cria um alerta de fraude baseado no tipo e score"""
-    points = FraudAlert.FRAUD_POINTS.get(fraud_type, 10)
-    severity = (
+def fraud_severity(points):
+    return (
         "LOW" if points <= 15 else
         "MEDIUM" if points <= 30 else
         "HIGH"
     )
-    FraudAlert.objects.create(
-        user=user,
+
+
+def coalesce_fraud_alert(user, fraud_type, work_shift, points, now, occurrences=1):
+    """
+    Soma as ocorrências ao alerta em aberto do mesmo usuário, jornada e tipo visto dentro da
+    janela, com um único UPDATE (score e severidade ficam com o maior valor).
+    O resumo diário e o score de risco não mudam: o alerta agrupado conta uma vez
+    (ver FRAUD_ALERT_COALESCE_SECONDS).
+    Retorna False se não houver alerta a agrupar.
+    """
+    window = getattr(settings, "FRAUD_ALERT_COALESCE_SECONDS", 0)
+    if not window:
+        return False
+
+    latest = (
+        FraudAlert.objects.filter(
+            user_id=user.pk,
+            work_shift=work_shift,
+            fraud_type=fraud_type,
+            resolved=False,
+            last_seen_at__gte=now - timedelta(seconds=window),
+        )
+        .order_by("-last_seen_at")
+        .values("pk")[:1]
+    )
+    return FraudAlert.objects.filter(pk__in=models.Subquery(latest)).update(
+        occurrences=F("occurrences") + occurrences,
+        last_seen_at=now,
+        updated_at=now,
+        severity=Case(When(score__lt=points, then=Value(fraud_severity(points))), default=F("severity")),
+        score=Greatest("score", Value(points)),
+    ) > 0
+
+
+def create_fraud_alert(user, fraud_type, description, work_shift=None, occurrences=1):
+    """
+    Cria um alerta de fraude baseado no tipo e score.
+    Repetições dentro da janela de agrupamento apenas incrementam o alerta existente;
+    nesse caso retorna None.
+    """
+    points = FraudAlert.FRAUD_POINTS.get(fraud_type, 10)
+    now = timezone.now()
+    if coalesce_fraud_alert(user, fraud_type, work_shift, points, now, occurrences):
+        return None
+
+    alert = FraudAlert.objects.create(
+        user_id=user.pk,
         work_shift=work_shift,
         fraud_type=fraud_type,
-        severity=severity,
+        severity=fraud_severity(points),
         score=points,
-        description=description
+        description=description,
+        occurrences=occurrences,
+        last_seen_at=now,
     )
+    # Funcionário resolvido uma vez para o resumo diário e o score de risco
+    if work_shift is not None:
+        employee_id = work_shift.employee_id
+    else:
+        employee_id = Employee.objects.filter(user_id=user.pk).values_list("id", flat=True).first()
+    count_alert_in_summary(alert, user, employee_id)
+    register_alert(alert, employee_id)
+    transaction.on_commit(lambda: publish_fraud_alert(alert))
+    return alert
+
+
+def update_last_position(work_shift, latitude, longitude, recorded_at):
+    """
+    Grava a última posição conhecida da jornada (um upsert, na próxima sequência
+    do feed de posições) e atualiza o índice espacial após o commit.
+    """
+    save_position(work_shift, latitude, longitude, recorded_at)
+    transaction.on_commit(lambda: position_index.update(
+        work_shift.id, work_shift.employee_id, latitude, longitude, recorded_at
+    ))
 
 
-def start_shift(user, latitude, longitude):
-    """Inicia um turno para um funcionário"""
+def start_shift(user, latitude, longitude, timestamp=None, idempotency_key=None):
+    """
+    Inicia um turno para um funcionário.
+    timestamp é o horário do dispositivo (reenvio offline); idempotency_key identifica a
+    requisição: um reenvio com a mesma chave retorna a jornada já criada.
+    """
 
 
     try:
@@ -150,7 +240,13 @@ def start_shift(user, latitude, longitude):
     except Employee.DoesNotExist:
         raise PermissionDenied("Funcionário não encontrado")
 
-    if WorkShift.objects.filter(employee=employee, end_time__isnull=True).exists():
+    state = get_shift_state(employee.pk)
+    if state["shift_id"] is not None:
+        replayed = idempotency_key and WorkShift.objects.filter(
+            employee=employee, start_idempotency_key=idempotency_key
+        ).first()
+        if replayed:
+            return replayed
         create_fraud_alert(user, "MULTI_SHIFT", "Tentativa de abrir dois turnos simultâneos")
         raise PermissionDenied("Já existe um turno aberto")
 
@@ -159,9 +255,35 @@ def start_shift(user, latitude, longitude):
     if lat is None or lon is None:
         raise PermissionDenied("Latitude e Longitude válidas são obrigatórias")
 
-    last_shift = WorkShift.objects.filter(employee=employee, end_time__isnull=False).order_by("-end_time").first()
-    if last_shift:
-        dist = distance_km(last_shift.end_latitude, last_shift.end_longitude, lat, lon)
+    start_time = resolve_device_time(timestamp, timezone.now())
+    if start_time is None:
+        raise PermissionDenied("Timestamp inválido")
+
+    # Sem leitura prévia: um reenvio da mesma chave ou um segundo turno aberto esbarra nas constraints únicas.
+    # O estado em cache é só um atalho; a garantia de um turno aberto por funcionário é do banco
+    try:
+        with transaction.atomic():
+            shift = WorkShift.objects.create(
+                employee=employee,
+                start_latitude=lat,
+                start_longitude=lon,
+                start_time=start_time,
+                start_idempotency_key=idempotency_key or None,
+            )
+    except IntegrityError:
+        replayed = idempotency_key and WorkShift.objects.filter(
+            employee=employee, start_idempotency_key=idempotency_key
+        ).first()
+        if replayed:
+            return replayed
+        # Outro início concorrente abriu o turno antes (constraint de um turno aberto por funcionário)
+        invalidate_shift_state(employee.pk)
+        create_fraud_alert(user, "MULTI_SHIFT", "Tentativa de abrir dois turnos simultâneos")
+        raise PermissionDenied("Já existe um turno aberto")
+
+    last_end = state["last_end"]
+    if last_end and None not in last_end:
+        dist = distance_km(last_end[0], last_end[1], lat, lon)
         if dist > 1:
             create_fraud_alert(
                 user=user,
@@ -170,24 +292,30 @@ def start_shift(user, latitude, longitude):
                 description=f"Start a {dist:.2f}km do último End"
             )
 
-    shift = WorkShift.objects.create(
-        employee=employee,
-        start_latitude=lat,
-        start_longitude=lon,
-        start_time=timezone.now()
-    )
-
     WorkShiftLocation.objects.create(
         work_shift=shift,
         latitude=latitude,
         longitude=longitude,
-
+        recorded_at=shift.start_time
     )
+    update_last_position(shift, lat, lon, shift.start_time)
+    save_shift_state(employee.pk, dict(
+        state,
+        shift_id=shift.id,
+        start_time=shift.start_time,
+        start_latitude=lat,
+        start_longitude=lon,
+        last_fix=(lat, lon, shift.start_time),
+    ), expected_version=state["version"])
     return shift
 
 
-def end_shift(user, latitude, longitude):
-    """Encerra o turno ativo do funcionário"""
+def end_shift(user, latitude, longitude, timestamp=None, idempotency_key=None):
+    """
+    Encerra o turno ativo do funcionário.
+    timestamp é o horário do dispositivo (reenvio offline); um reenvio com a mesma
+    idempotency_key retorna a jornada já encerrada.
+    """
     try:
         employee = user.employee
     except Employee.DoesNotExist:
@@ -196,6 +324,11 @@ def end_shift(user, latitude, longitude):
     try:
         shift = WorkShift.objects.get(employee=employee, end_time__isnull=True)
     except WorkShift.DoesNotExist:
+        replayed = idempotency_key and WorkShift.objects.filter(
+            employee=employee, end_idempotency_key=idempotency_key
+        ).first()
+        if replayed:
+            return replayed
         raise PermissionDenied("Nenhum turno aberto encontrado")
 
     lat = parse_coordinate(latitude)
@@ -203,59 +336,365 @@ def end_shift(user, latitude, longitude):
     if lat is None or lon is None:
         raise PermissionDenied("Latitude e Longitude válidas são obrigatórias")
 
+    end_time = resolve_device_time(timestamp, timezone.now(), not_before=shift.start_time)
+    if end_time is None:
+        raise PermissionDenied("Timestamp inválido")
+
     # Tempo mínimo de turno (para teste, pode reduzir se quiser)
-    min_duration = timedelta(minutes=5)
-    if timezone.now() - shift.start_time < min_duration:
+    if end_time - shift.start_time < MIN_SHIFT_DURATION:
         create_fraud_alert(user, "TIME", "Tentativa de encerrar turno antes do tempo mínimo", shift)
         raise PermissionDenied("Tempo mínimo de turno não atingido")
 
     # Validar distância do início do turno
     validate_shift_location(float(shift.start_latitude), float(shift.start_longitude), float(lat), float(lon))
 
-    now = timezone.now()
-
     shift.end_latitude = lat
     shift.end_longitude = lon
-    shift.end_time = now
+    shift.end_time = end_time
     # Aqui entra a duração (regra de negócio)
-    shift.diration = now - shift.start_time
+    shift.diration = end_time - shift.start_time
+    shift.end_idempotency_key = idempotency_key or None
 
-    shift.save()
+    try:
+        with transaction.atomic():
+            shift.save()
+    except IntegrityError:
+        raise PermissionDenied("Chave de idempotência já utilizada em outra jornada")
+    # Estado gravado logo após o encerramento: nada abaixo pode deixar o cache com o turno aberto
+    save_shift_state(employee.pk, {
+        "shift_id": None,
+        "start_time": None,
+        "start_latitude": None,
+        "start_longitude": None,
+        "last_fix": None,
+        "last_end": (lat, lon),
+    }, expected_version=None)
+    remove_position(shift)
+    transaction.on_commit(lambda: position_index.remove(shift.id))
+    refresh_daily_summary(employee.pk, timezone.localdate(shift.start_time))
+    # Os pontos brutos ficam no banco: a compressão roda depois, em lote (compress_tracks)
     return shift
 
 
-def track_location(user, latitude, longitude):
-    """Registra a localização do usuário em tempo real"""
+# Regras de tracking
+MIN_TRACKING_INTERVAL = timedelta(seconds=60)
+MAX_TRACKING_SPEED_KMH = 150
+MAX_TRACKING_BATCH_SIZE = 500
+MAX_DEVICE_CLOCK_SKEW = timedelta(minutes=2)
+
+
+def check_tracking_segment(elapsed_seconds, distance):
+    """
+    Aplica as regras de envio excessivo e velocidade irreal a um trecho
+    (intervalo em segundos e distância em km desde o último ponto aceito).
+    Retorna None se o trecho for válido, ou (descrição do alerta, mensagem de erro).
+    """
+    if elapsed_seconds < MIN_TRACKING_INTERVAL.total_seconds():
+        return "Envio excessivo de localização", "Aguarde antes de enviar nova localização"
+
+    hours = elapsed_seconds / 3600
+    if hours > 0 and distance / hours > MAX_TRACKING_SPEED_KMH:
+        return f"Velocidade irreal detectada: {int(distance / hours)} km/h", "Movimentação irreal detectada"
+
+    return None
+
+
+def check_tracking_fix(previous, lat, lon, recorded_at):
+    """
+    Aplica as regras de tracking a um ponto.
+    previous é uma tupla (latitude, longitude, horário) do último ponto aceito, ou None.
+    """
+    if previous is None:
+        return None
+
+    prev_lat, prev_lon, prev_at = previous
+    distance = haversine(float(prev_lat), float(prev_lon), float(lat), float(lon))
+    return check_tracking_segment((recorded_at - prev_at).total_seconds(), distance)
+
+
+def find_tracking_violations(latitudes, longitudes, times, mode=HAVERSINE):
+    """
+    Reavalia uma trajetória já registrada (pontos em ordem cronológica) com as regras de tracking,
+    em uma única passada vetorizada.
+    Retorna [(índice do ponto, regra, descrição do alerta)] para os trechos que violam as regras;
+    regra é "EXCESSIVE_FIXES" ou "SPEED_IMPOSSIBLE".
+    """
+    metrics = analyze_trajectory(latitudes, longitudes, times, mode=mode)
+    elapsed = metrics["elapsed_s"]
+    too_soon = elapsed < MIN_TRACKING_INTERVAL.total_seconds()
+    too_fast = ~too_soon & (np.nan_to_num(metrics["speed_kmh"]) > MAX_TRACKING_SPEED_KMH)
+
+    violations = []
+    for segment in np.flatnonzero(too_soon | too_fast):
+        description, _ = check_tracking_segment(elapsed[segment], metrics["segment_km"][segment])
+        rule = "EXCESSIVE_FIXES" if too_soon[segment] else "SPEED_IMPOSSIBLE"
+        violations.append((int(segment) + 1, rule, description))
+    return violations
+
+
+def get_open_shift_state(user):
+    """
+    Retorna (funcionário, estado, jornada) do turno aberto, a partir do estado compartilhado.
+    A jornada é uma instância leve (id, funcionário, início), sem leitura do banco.
+    """
     try:
         employee = user.employee
-        work_shift = WorkShift.objects.get(employee=employee, end_time__isnull=True)
-    except (Employee.DoesNotExist, WorkShift.DoesNotExist):
+    except Employee.DoesNotExist:
+        raise PermissionDenied("Nenhum turno aberto")
+
+    state = get_shift_state(employee.pk)
+    if state["shift_id"] is None:
         raise PermissionDenied("Nenhum turno aberto")
 
+    work_shift = WorkShift(
+        pk=state["shift_id"],
+        employee_id=employee.pk,
+        start_time=state["start_time"],
+        start_latitude=state["start_latitude"],
+        start_longitude=state["start_longitude"],
+    )
+    return employee, state, work_shift
+
+
+def slot_late_fixes(work_shift, fixes):
+    """
+    Encaixa na trilha pontos que chegaram depois de pontos mais recentes (reenvio offline).
+    fixes: [(horário, índice, latitude, longitude, chave)] em ordem cronológica, nenhum posterior
+    ao último ponto aceito. Cada ponto é avaliado contra seus vizinhos reais: o ponto anterior
+    (gravado ou aceito antes dele) e o próximo ponto já gravado.
+    Retorna (pontos aceitos, {índice: None se aceito, "duplicate", ou (descrição do alerta, mensagem)}).
+    """
+    first = fixes[0][0]
+    fields = ("latitude", "longitude", "recorded_at", "idempotency_key")
+    locations = WorkShiftLocation.objects.filter(work_shift=work_shift)
+    before = locations.filter(recorded_at__lt=first).order_by("-recorded_at").values_list(*fields).first()
+    anchors = list(locations.filter(recorded_at__gte=first).order_by("recorded_at").values_list(*fields))
+    anchor_times = [anchor[2] for anchor in anchors]
+    known_keys = {anchor[3] for anchor in anchors if anchor[3]}
+
+    # Pontos gravados e novos em ordem cronológica; no empate, o gravado vem antes
+    timeline = sorted(
+        [(anchor[2], 0, anchor) for anchor in anchors] + [(fix[0], 1, fix) for fix in fixes],
+        key=lambda item: (item[0], item[1])
+    )
+    previous = before[:3] if before else None
+    accepted, outcomes = [], {}
+    for _, is_new, item in timeline:
+        if not is_new:
+            previous = item[:3]
+            continue
+
+        recorded_at, index, lat, lon, key = item
+        if key and key in known_keys:
+            outcomes[index] = "duplicate"
+            continue
+
+        rejection = check_tracking_fix(previous, lat, lon, recorded_at)
+        following = bisect_right(anchor_times, recorded_at)
+        if rejection is None and following < len(anchors):
+            next_lat, next_lon, next_at, _ = anchors[following]
+            rejection = check_tracking_segment(
+                (next_at - recorded_at).total_seconds(),
+                haversine(float(lat), float(lon), float(next_lat), float(next_lon))
+            )
+        if rejection:
+            outcomes[index] = rejection
+            continue
+
+        accepted.append(WorkShiftLocation(
+            work_shift=work_shift, latitude=lat, longitude=lon, recorded_at=recorded_at, idempotency_key=key
+        ))
+        if key:
+            known_keys.add(key)
+        previous = (lat, lon, recorded_at)
+        outcomes[index] = None
+
+    return accepted, outcomes
+
+
+def track_location(user, latitude, longitude, timestamp=None, idempotency_key=None):
+    """
+    Registra a localização do usuário em tempo real.
+    timestamp é o horário do dispositivo (reenvio offline; padrão: horário do servidor). Um ponto
+    anterior ao último aceito é encaixado na trilha e avaliado contra seus vizinhos reais.
+    Retorna "accepted", ou "duplicate" para um reenvio de idempotency_key já gravada.
+    """
+    employee, state, work_shift = get_open_shift_state(user)
+    key = idempotency_key or None
+
     lat = parse_coordinate(latitude)
     lon = parse_coordinate(longitude)
     if not lat or not lon:
         create_fraud_alert(user, "TRACKING", "GPS inválido (0,0)", work_shift)
         raise PermissionDenied("Localização inválida")
 
-    last_location = WorkShiftLocation.objects.filter(work_shift=work_shift).order_by("-created_at").first()
-    if last_location:
-        delta = timezone.now() - last_location.created_at
-        if delta < timedelta(seconds=60):
-            create_fraud_alert(user, "TRACKING", "Envio excessivo de localização", work_shift)
-            raise PermissionDenied("Aguarde antes de enviar nova localização")
-        distance = haversine(float(last_location.latitude), float(last_location.longitude), float(lat), float(lon))
-        hours = delta.total_seconds() / 3600
-        if hours > 0 and distance / hours > 150:
-            create_fraud_alert(user, "TRACKING", f"Velocidade irreal detectada: {int(distance / hours)} km/h", work_shift)
-            raise PermissionDenied("Movimentação irreal detectada")
-
-    WorkShiftLocation.objects.create(
+    recorded_at = resolve_device_time(timestamp, timezone.now(), not_before=work_shift.start_time)
+    if recorded_at is None:
+        raise PermissionDenied("Timestamp inválido")
+
+    previous = state["last_fix"]
+    if previous and recorded_at <= previous[2]:
+        accepted, outcomes = slot_late_fixes(work_shift, [(recorded_at, 0, lat, lon, key)])
+        if outcomes[0] == "duplicate":
+            return "duplicate"
+        if outcomes[0]:
+            description, message = outcomes[0]
+            create_fraud_alert(user, "TRACKING", description, work_shift)
+            raise PermissionDenied(message)
+        WorkShiftLocation.objects.bulk_create(accepted, ignore_conflicts=True)
+        return "accepted"
+
+    rejection = check_tracking_fix(previous, lat, lon, recorded_at)
+    if rejection:
+        # Só no caminho de rejeição: o reenvio de um ponto já gravado não gera alerta
+        if key and WorkShiftLocation.objects.filter(work_shift=work_shift, idempotency_key=key).exists():
+            return "duplicate"
+        description, message = rejection
+        create_fraud_alert(user, "TRACKING", description, work_shift)
+        raise PermissionDenied(message)
+
+    location = WorkShiftLocation(
         work_shift=work_shift,
         latitude=lat,
-        longitude=lon
+        longitude=lon,
+        recorded_at=recorded_at,
+        idempotency_key=key,
     )
-    return True
+    if key:
+        # Sem leitura prévia: o reenvio da mesma chave esbarra em location_shift_key_uniq
+        try:
+            with transaction.atomic():
+                location.save(force_insert=True)
+        except IntegrityError:
+            return "duplicate"
+    else:
+        location.save(force_insert=True)
+    update_last_position(work_shift, lat, lon, recorded_at)
+    save_shift_state(employee.pk, dict(state, last_fix=(lat, lon, recorded_at)), expected_version=state["version"])
+    transaction.on_commit(lambda: publish_position(user, work_shift, lat, lon, recorded_at))
+    return "accepted"
+
+
+def track_locations_batch(user, fixes):
+    """
+    Registra um lote de localizações enviadas pelo dispositivo.
+    Cada ponto deve trazer latitude, longitude e timestamp (horário do dispositivo) e pode trazer
+    idempotency_key: pontos com chave já gravada são descartados pela constraint única ("duplicate").
+    As regras de tracking são aplicadas ao lote inteiro em uma única passada, em ordem
+    cronológica, e os pontos aceitos são gravados com um único bulk insert. Pontos anteriores
+    ao último aceito (reenvio offline) são encaixados na trilha e avaliados contra seus vizinhos.
+    Retorna a lista de resultados na mesma ordem dos pontos recebidos.
+    """
+    employee, state, work_shift = get_open_shift_state(user)
+
+    if len(fixes) > MAX_TRACKING_BATCH_SIZE:
+        raise PermissionDenied(f"Lote excede o limite de {MAX_TRACKING_BATCH_SIZE} pontos")
+
+    now = timezone.now()
+    results = [None] * len(fixes)
+    pending = []
+    batch_keys = set()
+    invalid_gps = 0
+
+    for index, fix in enumerate(fixes):
+        fix = fix if isinstance(fix, dict) else {}
+        lat = parse_coordinate(fix.get("latitude"))
+        lon = parse_coordinate(fix.get("longitude"))
+        recorded_at = parse_device_timestamp(fix.get("timestamp"))
+        key = str(fix.get("idempotency_key") or "")[:64] or None
+
+        if not lat or not lon:
+            invalid_gps += 1
+            results[index] = {"index": index, "status": "rejected", "detail": "Localização inválida"}
+            continue
+        if recorded_at is None:
+            results[index] = {"index": index, "status": "rejected", "detail": "Timestamp inválido"}
+            continue
+        if recorded_at < work_shift.start_time or recorded_at > now + MAX_DEVICE_CLOCK_SKEW:
+            results[index] = {"index": index, "status": "rejected", "detail": "Timestamp fora da jornada"}
+            continue
+        if key and key in batch_keys:
+            results[index] = {"index": index, "status": "duplicate"}
+            continue
+        if key:
+            batch_keys.add(key)
+
+        pending.append((recorded_at, index, lat, lon, key))
+
+    previous = state["last_fix"]
+    pending.sort(key=lambda item: (item[0], item[1]))
+    late = [item for item in pending if previous and item[0] <= previous[2]]
+    pending = pending[len(late):]
+
+    # Trechos entre pontos consecutivos (a partir do último ponto aceito) calculados de uma vez.
+    # Enquanto o ponto anterior do lote foi aceito, o trecho pré-calculado vale;
+    # após uma rejeição, o trecho até o último aceito é calculado individualmente.
+    points = ([previous] if previous else []) + [(lat, lon, recorded_at) for recorded_at, _, lat, lon, _ in pending]
+    if len(points) > 1:
+        latitudes, longitudes, times = zip(*points)
+        segments = analyze_trajectory(latitudes, longitudes, times)
+    first_segment = 0 if previous else -1
+    chained = True
+
+    accepted = []
+    alerts = {"GPS inválido (0,0)": invalid_gps} if invalid_gps else {}
+    for position, (recorded_at, index, lat, lon, key) in enumerate(pending):
+        if previous is None:
+            rejection = None
+        elif chained:
+            segment = first_segment + position
+            rejection = check_tracking_segment(segments["elapsed_s"][segment], segments["segment_km"][segment])
+        else:
+            rejection = check_tracking_fix(previous, lat, lon, recorded_at)
+        if rejection:
+            description, message = rejection
+            alerts[description] = alerts.get(description, 0) + 1
+            results[index] = {"index": index, "status": "rejected", "detail": message}
+            chained = False
+            continue
+
+        accepted.append(WorkShiftLocation(
+            work_shift=work_shift,
+            latitude=lat,
+            longitude=lon,
+            recorded_at=recorded_at,
+            idempotency_key=key,
+        ))
+        previous = (lat, lon, recorded_at)
+        chained = True
+        results[index] = {"index": index, "status": "accepted"}
+
+    slotted = []
+    if late:
+        slotted, outcomes = slot_late_fixes(work_shift, late)
+        for index, outcome in outcomes.items():
+            if outcome == "duplicate":
+                results[index] = {"index": index, "status": "duplicate"}
+            elif outcome:
+                description, message = outcome
+                alerts[description] = alerts.get(description, 0) + 1
+                results[index] = {"index": index, "status": "rejected", "detail": message}
+            else:
+                results[index] = {"index": index, "status": "accepted"}
+
+    if accepted or slotted:
+        # Sem leitura prévia: chaves já gravadas são descartadas pela constraint única
+        WorkShiftLocation.objects.bulk_create(slotted + accepted, ignore_conflicts=True)
+    if accepted:
+        last = accepted[-1]
+        update_last_position(work_shift, last.latitude, last.longitude, last.recorded_at)
+        save_shift_state(employee.pk, dict(state, last_fix=previous), expected_version=state["version"])
+        transaction.on_commit(
+            lambda: publish_position(user, work_shift, last.latitude, last.longitude, last.recorded_at)
+        )
+
+    for description, count in alerts.items():
+        if count > 1:
+            description = f"{description} ({count} pontos no lote)"
+        create_fraud_alert(user, "TRACKING", description, work_shift, occurrences=count)
+
+    return results
+
 
 def adjust_shift_end(
         *,
@@ -300,11 +739,14 @@ def adjust_shift_end(
     shift.save(
         update_fields=[
             "adjusted_end_time",
-            "adjusted_reason",
+            "adjustment_reason",
             "adjusted_by",
-            "adjusted_at"
+            "adjusted_at",
+            "updated_at"
         ]
     )
+    invalidate_shift_state(shift.employee_id)
+    refresh_daily_summary(shift.employee_id, timezone.localdate(shift.start_time))
     return shift
 
 def minutes_to_hhmm(minutes):
@@ -321,42 +763,66 @@ def minutes_to_hhmm(minutes):
 
 STANDARD_SHIFT_MINUTES = 8 * 60 #480
 
-def calculate_shift_mietrics(shift):
+
+def with_shift_metrics(queryset):
     """
-    Retorna métricas da jornada:
-    - duração
-    - atrasos
-    - hora extra
+    Anota no banco as métricas da jornada:
+    - effective_end: ajuste administrativo, saída registrada ou agora (jornada aberta)
+    - worked_time: duração até o fim efetivo
+    - expected_time: jornada do funcionário (padrão de 8h quando não informada)
+    - delay_time / extra_time: atraso e hora extra (nulos para jornada aberta)
     """
+    jornada_minutes = Coalesce(
+        ExtractHour("employee__jornada") * 60 + ExtractMinute("employee__jornada"),
+        Value(STANDARD_SHIFT_MINUTES),
+    )
+    is_open = models.Q(end_time__isnull=True, adjusted_end_time__isnull=True)
+
+    return queryset.annotate(
+        effective_end=Coalesce("adjusted_end_time", "end_time", Now()),
+        worked_time=ExpressionWrapper(F("effective_end") - F("start_time"), output_field=DurationField()),
+        expected_time=ExpressionWrapper(jornada_minutes * Value(timedelta(minutes=1)), output_field=DurationField()),
+        delay_time=Case(
+            When(is_open, then=Value(None)),
+            default=Greatest(F("expected_time") - F("worked_time"), Value(timedelta(0))),
+            output_field=DurationField(),
+        ),
+        extra_time=Case(
+            When(is_open, then=Value(None)),
+            default=Greatest(F("worked_time") - F("expected_time"), Value(timedelta(0))),
+            output_field=DurationField(),
+        ),
+    )
 
-    duration_minutes = shift.get_duration_minutes()
-
-    #Jornada aberta
-    if duration_minutes is None:
-        return {
-            "duration_minutes": None,
-            "delay_minutes": None,
-            "extra_minutes": None,
-        }
 
-    diff = duration_minutes - STANDARD_SHIFT_MINUTES
+def _to_minutes(value):
+    if value is None:
+        return None
+    return int(value.total_seconds() // 60)
 
-    delay = abs(diff) if diff < 0 else 0
-    extra = diff if diff > 0 else 0
 
+def calculate_shift_mietrics(shift):
+    """
+    Retorna métricas da jornada (em minutos), a partir das anotações de with_shift_metrics:
+    - duração
+    - atrasos
+    - hora extra
+    """
     return {
-        "duration_minutes": duration_minutes,
-        "delay_minutes": delay,
-        "extra_minutes": extra,
+        "duration_minutes": _to_minutes(shift.worked_time),
+        "delay_minutes": _to_minutes(shift.delay_time),
+        "extra_minutes": _to_minutes(shift.extra_time),
     }
 
 def build_shift_report_row(shift):
     metrics = calculate_shift_mietrics(shift)
+    end_time = shift.get_effective_end_time()
+    start_time = timezone.localtime(shift.start_time)
     return {
         "employee": shift.employee.user.email,
-        "date": shift.start_time.date(),
-        "start_time": shift.start_time.time(),
-        "end_time": shift.get_effective_end_time().time() if shift.get_effective_end_time() else None,
+        "date": start_time.date(),
+        "start_time": start_time.time(),
+        "end_time": timezone.localtime(end_time).time() if end_time else None,
 
         # Minutos
 
@@ -373,21 +839,49 @@ def build_shift_report_row(shift):
         "adjusted": shift.was_adjusted(),
     }
 
-def totalize_report(rows):
-    total_duration = 0
-    total_delay = 0
-    total_extra = 0
-
-    for row in rows:
-        if row['duration_minutes']:
-            total_duration += row['duration_minutes']
-        if row['delay_minutes']:
-            total_delay += row['delay_minutes']
-        if row['extra_minutes']:
-            total_extra += row['extra_minutes']
-
+def format_report_totals(total_duration, total_delay, total_extra):
     return {
+        "duration_minutes": total_duration,
+        "delay_minutes": total_delay,
+        "extra_minutes": total_extra,
         "total_duration": minutes_to_hhmm(total_duration),
         "total_delay": minutes_to_hhmm(-total_delay) if total_delay else "00:00",
         "total_extra": minutes_to_hhmm(total_extra) if total_extra else "00:00",
-    }
\ No newline at end of file
+    }
+
+def shift_report_totals(queryset):
+    """
+    Totais calculados direto das jornadas, em uma única consulta
+    (queryset anotado por with_shift_metrics). Os minutos são truncados uma vez, sobre o total.
+    """
+    totals = queryset.aggregate(
+        worked=Sum("worked_time"),
+        delay=Sum("delay_time"),
+        extra=Sum("extra_time"),
+    )
+    return format_report_totals(
+        _to_minutes(totals["worked"]) or 0,
+        _to_minutes(totals["delay"]) or 0,
+        _to_minutes(totals["extra"]) or 0,
+    )
+
+def report_totals(employee_id, start_date=None, end_date=None):
+    """
+    Totais do relatório: jornadas encerradas a partir dos resumos diários,
+    mais o tempo decorrido da jornada aberta, se houver.
+    """
+    worked, delay, extra = summary_totals(employee_id, start_date, end_date)
+
+    open_shift = WorkShift.objects.filter(
+        date_range_q("start_time", start_date, end_date),
+        employee_id=employee_id,
+        end_time__isnull=True,
+        adjusted_end_time__isnull=True,
+    )
+    live = shift_report_totals(with_shift_metrics(open_shift))
+
+    return format_report_totals(
+        worked + live["duration_minutes"],
+        delay + live["delay_minutes"],
+        extra + live["extra_minutes"],
+    )
@@ -1,11 +1,53 @@
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Max, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.test import APITestCase, APIClient
 from accounts.models import User, Employee, UserDevice
-from .models import WorkShift, WorkShiftLocation, FraudAlert
+from .models import WorkShift, WorkShiftLocation, WorkShiftLastPosition, FraudAlert, DailyAttendanceSummary, \
+    EmployeeRiskScore, PositionTombstone, TrackArchiveEntry, WorkShiftTrack
+from asgiref.sync import iscoroutinefunction
 from decimal import Decimal
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time, timedelta
+from .utils.dates import date_range_q
+from .utils.load_harness import compare_with_baseline
+from .utils.query_budget import QueryBudgetExceeded, capture_view_queries, query_shape
+from .services.event_broker import ALERTS_CHANNEL, POSITIONS_CHANNEL, broker
+from .services.position_clusters import cluster_cache
+from .services.position_feed import prune_tombstones, remove_position
+from .services.position_index import PositionIndex, position_index
+from .services.risk_score import get_risk_score
+from .services.shift_state import get_shift_state, invalidate_shift_state, save_shift_state
+from .services.track_compression import compress_shift_track, get_shift_track
+from .services.report_pdf import JOB_KEY, report_cache_key
+from .services.track_playback import downsampled_track
+from .middleware import QueryBudgetMiddleware, is_async_view
+from .services.workshift_service import adjust_shift_end, create_fraud_alert, end_shift, find_tracking_violations, \
+    get_workshifts_for_user, start_shift, track_location, update_last_position
+from .utils.antifraud import haversine
+from .utils.track_codec import compress_track, decode_track, downsample_track, simplify_track
+from .utils.trajectory import analyze_trajectory, pairwise_distance_km
 
 
 class AttendanceAPITestCase(APITestCase):
@@ -228,6 +270,140 @@ class AttendanceAPITestCase(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_shift_tracking_dashboard_uses_last_position(self):
+        start_response = self.client.post(
+            reverse("shift-start"),
+            {"device_id": "DEVICE123", "latitude": 10.0, "longitude": 10.0},
+            format='json'
+        )
+        shift_id = start_response.data["id"]
+        WorkShift.objects.filter(pk=shift_id).update(start_time=timezone.now() - timedelta(minutes=30))
+        WorkShiftLocation.objects.filter(work_shift_id=shift_id).update(
+            recorded_at=timezone.now() - timedelta(minutes=30)
+        )
+        WorkShiftLastPosition.objects.filter(work_shift_id=shift_id).update(
+            recorded_at=timezone.now() - timedelta(minutes=30)
+        )
+        invalidate_shift_state(self.employee.id)
+        self.client.post(
+            reverse("shift-tracking"),
+            {"device_id": "DEVICE123", "latitude": 10.001, "longitude": 10.001},
+            format='json'
+        )
+
+        self.admin_client.force_login(self.admin_user)
+        with self.assertNumQueries(3):
+            response = self.admin_client.get(reverse("shift-tracking-dashboard"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["shift_id"], shift_id)
+        self.assertAlmostEqual(response.data[0]["latitude"], 10.001)
+
+        end_response = self.client.post(
+            reverse("shift-end"),
+            {"device_id": "DEVICE123", "latitude": 10.0, "longitude": 10.0},
+            format='json'
+        )
+        self.assertEqual(end_response.status_code, status.HTTP_200_OK)
+        self.assertFalse(WorkShiftLastPosition.objects.filter(work_shift_id=shift_id).exists())
+        response = self.admin_client.get(reverse("shift-tracking-dashboard"))
+        self.assertEqual(response.data, [])
+
+    # ----------------------
+    # Testes Shift Tracking em lote
+    # ----------------------
+    def test_shift_tracking_batch_reports_each_fix(self):
+        start = timezone.now() - timedelta(minutes=30)
+        shift = WorkShift.objects.create(
+            employee=self.employee,
+            start_latitude=10,
+            start_longitude=10,
+            start_time=start
+        )
+        url = reverse("shift-tracking-batch")
+        data = {
+            "device_id": "DEVICE123",
+            "fixes": [
+                {"latitude": 10.001, "longitude": 10.0, "timestamp": (start + timedelta(minutes=5)).isoformat()},
+                {"latitude": 10.002, "longitude": 10.0, "timestamp": (start + timedelta(minutes=5, seconds=20)).isoformat()},
+                {"latitude": 0, "longitude": 0, "timestamp": (start + timedelta(minutes=6)).isoformat()},
+                {"latitude": 15.0, "longitude": 15.0, "timestamp": (start + timedelta(minutes=7)).isoformat()},
+                {"latitude": 10.003, "longitude": 10.0, "timestamp": (start + timedelta(minutes=2)).isoformat()},
+            ]
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statuses = [result["status"] for result in response.data["results"]]
+        self.assertEqual(statuses, ["accepted", "rejected", "rejected", "rejected", "accepted"])
+        self.assertEqual(response.data["accepted"], 2)
+        self.assertEqual(WorkShiftLocation.objects.filter(work_shift=shift).count(), 2)
+        # Rejeições do lote (envio excessivo, GPS inválido, velocidade) agrupadas em um alerta
+        alert = FraudAlert.objects.get(work_shift=shift, fraud_type="TRACKING")
+        self.assertEqual(alert.occurrences, 3)
+
+    def test_shift_tracking_batch_without_open_shift(self):
+        url = reverse("shift-tracking-batch")
+        data = {
+            "device_id": "DEVICE123",
+            "fixes": [{"latitude": 10, "longitude": 10, "timestamp": timezone.now().isoformat()}]
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_offline_replay_is_idempotent_and_slotted(self):
+        start = timezone.now() - timedelta(hours=2)
+        at = lambda minutes: (start + timedelta(minutes=minutes)).isoformat()
+        start_data = {"device_id": "DEVICE123", "latitude": 10.0, "longitude": 10.0, "timestamp": at(0)}
+        first = self.client.post(reverse("shift-start"), start_data, format="json", HTTP_IDEMPOTENCY_KEY="start-1")
+        replay = self.client.post(reverse("shift-start"), start_data, format="json", HTTP_IDEMPOTENCY_KEY="start-1")
+        self.assertEqual((first.status_code, replay.data["id"]), (status.HTTP_201_CREATED, first.data["id"]))
+        shift = WorkShift.objects.get(employee=self.employee)
+        self.assertLess(abs((shift.start_time - start).total_seconds()), 1)
+
+        fix = lambda minutes, key: {"latitude": 10.0 + minutes / 10000, "longitude": 10.0, "timestamp": at(minutes), "idempotency_key": key}
+        url = reverse("shift-tracking-batch")
+        response = self.client.post(url, {"device_id": "DEVICE123", "fixes": [fix(10, "a"), fix(20, "b"), fix(30, "c")]}, format="json")
+        self.assertEqual(response.data["accepted"], 3)
+
+        # Reenvio da fila offline: duplicado, ponto atrasado entre vizinhos e ponto a 30 s de um vizinho
+        late = [fix(20, "b"), fix(15, "d"), {**fix(20, "e"), "timestamp": (start + timedelta(minutes=20, seconds=30)).isoformat()}]
+        response = self.client.post(url, {"device_id": "DEVICE123", "fixes": late}, format="json")
+        self.assertEqual([result["status"] for result in response.data["results"]], ["duplicate", "accepted", "rejected"])
+
+        track = {"device_id": "DEVICE123", "latitude": 10.0025, "longitude": 10.0, "timestamp": at(25)}
+        response = self.client.post(reverse("shift-tracking"), track, format="json", HTTP_IDEMPOTENCY_KEY="f")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse("shift-tracking"), track, format="json", HTTP_IDEMPOTENCY_KEY="f")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        recorded = WorkShiftLocation.objects.filter(work_shift=shift).order_by("recorded_at")
+        self.assertEqual([location.idempotency_key for location in recorded], [None, "a", "d", "b", "f", "c"])
+        self.assertEqual(WorkShiftLastPosition.objects.get(work_shift=shift).latitude, Decimal("10.003"))
+        # Reenvio sem horário do dispositivo: continua duplicado e não move a última posição
+        alerts = FraudAlert.objects.filter(user=self.user).count()
+        replay = {key: value for key, value in track.items() if key != "timestamp"}
+        response = self.client.post(reverse("shift-tracking"), replay, format="json", HTTP_IDEMPOTENCY_KEY="f")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(WorkShiftLastPosition.objects.get(work_shift=shift).latitude, Decimal("10.003"))
+        self.assertEqual(FraudAlert.objects.filter(user=self.user).count(), alerts)
+        # Ponto novo com chave: a duplicidade fica a cargo da constraint, sem leitura prévia da trilha
+        track = {"device_id": "DEVICE123", "latitude": 10.004, "longitude": 10.0, "timestamp": at(40)}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("shift-tracking"), track, format="json", HTTP_IDEMPOTENCY_KEY="g")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        location_reads = [
+            query["sql"] for query in queries.captured_queries
+            if query["sql"].startswith("SELECT") and "attendance_workshiftlocation" in query["sql"]
+        ]
+        self.assertEqual(location_reads, [])
+
+        end_data ={"device_id": "DEVICE123", "latitude": 10.0, "longitude": 10.0, "timestamp": at(60)}
+        for _ in range(2):
+            response = self.client.post(reverse("shift-end"), end_data, format="json", HTTP_IDEMPOTENCY_KEY="end-1")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        shift.refresh_from_db()
+        self.assertLess(abs((shift.end_time - start - timedelta(minutes=60)).total_seconds()), 1)
+        self.assertFalse(FraudAlert.objects.filter(user=self.user, fraud_type="MULTI_SHIFT").exists())
+
     # ----------------------
     # Testes Fraud Alerts
     # ----------------------
@@ -261,3 +437,1196 @@ class AttendanceAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         alert.refresh_from_db()
         self.assertTrue(alert.resolved)
+
+
+class EventBrokerTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="live@test.com", password="pass1234")
+        self.employee = Employee.objects.create(user=self.user, matricula="LIVE01")
+        self.shift = WorkShift.objects.create(
+            employee=self.employee,
+            start_latitude=10,
+            start_longitude=10,
+            start_time=timezone.now() - timedelta(minutes=10)
+        )
+
+    def test_subscriber_receives_position_from_track_location(self):
+        async def subscribe():
+            return broker.subscribe([POSITIONS_CHANNEL])
+
+        loop = asyncio.new_event_loop()
+        queue = loop.run_until_complete(subscribe())
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                track_location(self.user, Decimal("10.001"), Decimal("10.001"))
+            channel, data = loop.run_until_complete(asyncio.wait_for(queue.get(), timeout=2))
+        finally:
+            broker.unsubscribe(queue)
+            loop.close()
+
+        self.assertEqual(channel, POSITIONS_CHANNEL)
+        payload = json.loads(data)
+        self.assertEqual(payload["shift_id"], self.shift.id)
+        self.assertAlmostEqual(payload["latitude"], 10.001)
+
+    def test_publish_without_subscribers_is_noop(self):
+        self.assertFalse(broker.has_subscribers(ALERTS_CHANNEL))
+        broker.publish(ALERTS_CHANNEL, {"id": 1})
+
+
+@skipUnless(connection.vendor == "sqlite", "Planos de execução verificados no SQLite")
+class QueryPlanTestCase(TestCase):
+    """
+    Garante que as consultas quentes do módulo de presença usem índices.
+    Falha se o EXPLAIN de alguma delas indicar varredura completa da tabela
+    ou ordenação em árvore temporária.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.employees = []
+        for i in range(20):
+            user = User.objects.create_user(email=f"plan{i}@test.com")
+            employee = Employee.objects.create(user=user, matricula=f"PLAN{i:02d}")
+            cls.employees.append(employee)
+            shifts = WorkShift.objects.bulk_create([
+                WorkShift(
+                    employee=employee,
+                    start_latitude=10,
+                    start_longitude=10,
+                    start_time=now - timedelta(days=day, hours=9),
+                    end_time=None if day == 0 else now - timedelta(days=day),
+                )
+                for day in range(15)
+            ])
+            WorkShiftLocation.objects.bulk_create([
+                WorkShiftLocation(work_shift=shift, latitude=10, longitude=10, recorded_at=shift.start_time)
+                for shift in shifts
+                for _ in range(5)
+            ])
+            FraudAlert.objects.bulk_create([
+                FraudAlert(user=user, work_shift=shifts[n], fraud_type="TRACKING", description="plan", resolved=n % 2 == 0)
+                for n in range(10)
+            ])
+        cls.employee = cls.employees[0]
+        cls.shift = cls.employee.shifts.first()
+
+    def hot_queries(self):
+        today = timezone.localdate()
+        return {
+            "turno aberto": WorkShift.objects.filter(employee=self.employee, end_time__isnull=True),
+            "último turno encerrado": WorkShift.objects.filter(
+                employee=self.employee, end_time__isnull=False
+            ).order_by("-end_time")[:1],
+            "turnos por período": WorkShift.objects.filter(
+                date_range_q("start_time", today - timedelta(days=7), today),
+                employee=self.employee
+            ).order_by("start_time"),
+            "turnos do usuário": WorkShift.objects.filter(employee=self.employee).order_by("-start_time"),
+            "última localização": WorkShiftLocation.objects.filter(
+                work_shift=self.shift
+            ).order_by("-created_at")[:1],
+            "alertas em aberto": FraudAlert.objects.filter(resolved=False).order_by("-created_at")[:10],
+            "alertas do usuário": FraudAlert.objects.filter(user=self.employee.user).order_by("-created_at"),
+            "página de turnos (cursor)": self.keyset_page(WorkShift.objects.all(), "start_time"),
+            "página de alertas (cursor)": self.keyset_page(FraudAlert.objects.all(), "created_at"),
+        }
+
+    def keyset_page(self, queryset, field):
+        """Consulta de uma página profunda, como gerada por KeysetPagination"""
+        middle = queryset.order_by(f"-{field}", "-id")[queryset.count() // 2]
+        value = getattr(middle, field)
+        return (
+            queryset.filter(**{f"{field}__lte": value})
+            .exclude(**{field: value, "id__gte": middle.id})
+            .order_by(f"-{field}", "-id")[:51]
+        )
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                for line in plan.splitlines():
+                    full_scan = re.search(r"\bSCAN \w+$", line.strip())
+                    self.assertIsNone(full_scan, f"Varredura completa em '{name}':\n{plan}")
+                    self.assertNotIn("USE TEMP B-TREE", line, f"Ordenação sem índice em '{name}':\n{plan}")
+
+
+class ShiftStateTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="state@test.com")
+        self.employee = Employee.objects.create(user=self.user, matricula="STATE01")
+
+    def test_state_is_written_through_and_rebuilt_when_stale(self):
+        shift = start_shift(self.user, Decimal("10.0"), Decimal("10.0"))
+        with self.assertNumQueries(0):
+            state = get_shift_state(self.employee.id)
+        self.assertEqual(state["shift_id"], shift.id)
+
+        WorkShift.objects.filter(pk=shift.id).update(start_time=timezone.now() - timedelta(hours=1))
+        invalidate_shift_state(self.employee.id)
+        state = get_shift_state(self.employee.id)
+        self.assertEqual(state["start_time"], WorkShift.objects.get(pk=shift.id).start_time)
+
+        end_shift(self.user, Decimal("10.0"), Decimal("10.0"))
+        with self.assertNumQueries(0):
+            state = get_shift_state(self.employee.id)
+        self.assertIsNone(state["shift_id"])
+        self.assertEqual(state["last_end"], (Decimal("10.0"), Decimal("10.0")))
+
+    def test_concurrent_write_with_old_version_invalidates(self):
+        state = get_shift_state(self.employee.id)
+        save_shift_state(self.employee.id, dict(state, last_end=(1, 1)), expected_version=state["version"])
+        # Segundo worker ainda com a versão antiga
+        save_shift_state(self.employee.id, dict(state, last_end=(2, 2)), expected_version=state["version"])
+        with self.assertNumQueries(2):
+            rebuilt = get_shift_state(self.employee.id)
+        self.assertIsNone(rebuilt["last_end"])
+
+    def test_open_shift_guard_does_not_depend_on_cached_state(self):
+        self.assertIsNone(get_shift_state(self.employee.id)["shift_id"])
+        # Turno aberto por um início concorrente que ainda não atualizou o cache
+        WorkShift.objects.create(employee=self.employee, start_latitude=Decimal("10.0"), start_longitude=Decimal("10.0"))
+
+        with self.assertRaises(PermissionDenied):
+            start_shift(self.user, Decimal("10.0"), Decimal("10.0"))
+        self.assertEqual(WorkShift.objects.filter(employee=self.employee, end_time__isnull=True).count(), 1)
+        self.assertTrue(FraudAlert.objects.filter(user=self.user, fraud_type="MULTI_SHIFT").exists())
+
+
+class ReportPdfJobTestCase(APITestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(REPORT_PDF_WORKERS=0, REPORT_PDF_CACHE_DIR=self.tmp_dir)
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user(email="pdf@test.com", password="pass1234")
+        self.employee = Employee.objects.create(user=self.user, matricula="PDF01", signature="data:image/png;base64,AAA")
+        self.shift = WorkShift.objects.create(
+            employee=self.employee,
+            start_latitude=10,
+            start_longitude=10,
+            start_time=timezone.now() - timedelta(days=1, hours=9),
+            end_time=timezone.now() - timedelta(days=1)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def submit(self):
+        today = timezone.localdate()
+        return self.client.post(reverse("workshift-report-pdf-job-submit"), {
+            "start_date": (today - timedelta(days=7)).isoformat(),
+            "end_date": today.isoformat(),
+        }, format="json")
+
+    def test_submit_status_and_download(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "DONE")
+        job_id = response.data["job_id"]
+
+        response = self.client.get(reverse("workshift-report-pdf-job", args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("download_url", response.data)
+
+        response = self.client.get(reverse("workshift-report-pdf-job-download", args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+
+        other = User.objects.create_user(email="other@test.com")
+        self.client.force_authenticate(other)
+        response = self.client.get(reverse("workshift-report-pdf-job", args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_key_changes_when_shift_is_adjusted(self):
+        first = self.submit().data["job_id"]
+        self.assertEqual(self.submit().data["job_id"], first)
+
+        self.shift.adjustment_reason = "Ajuste"
+        self.shift.save()
+        self.assertNotEqual(self.submit().data["job_id"], first)
+
+    def test_download_of_a_missing_pdf_resets_the_job(self):
+        job_id = self.submit().data["job_id"]
+        os.remove(os.path.join(self.tmp_dir, f"{job_id}.pdf"))
+
+        response = self.client.get(reverse("workshift-report-pdf-job-download", args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("workshift-report-pdf-job", args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual(self.submit().data["status"], "DONE")
+        response = self.client.get(reverse("workshift-report-pdf-job-download", args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_writing_a_pdf_evicts_expired_files(self):
+        expired = os.path.join(self.tmp_dir, "expired.pdf")
+        recent = os.path.join(self.tmp_dir, "recent.pdf")
+        for path in (expired, recent):
+            Path(path).write_bytes(b"%PDF")
+        two_days_ago = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(expired, (two_days_ago, two_days_ago))
+
+        self.assertEqual(self.submit().data["status"], "DONE")
+        self.assertFalse(os.path.exists(expired))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_stale_running_job_is_resubmitted(self):
+        today = timezone.localdate()
+        job_id = report_cache_key(self.employee, today - timedelta(days=7), today, self.employee.signature)
+        caches["shared"].set(JOB_KEY.format(job_id=job_id), {
+            "job_id": job_id, "status": "RUNNING", "user_id": self.user.pk,
+            "created_at": timezone.now() - timedelta(minutes=1), "started_at": timezone.now() - timedelta(minutes=1),
+        })
+        self.assertEqual(self.submit().data["status"], "RUNNING")
+
+        caches["shared"].set(JOB_KEY.format(job_id=job_id), dict(
+            caches["shared"].get(JOB_KEY.format(job_id=job_id)), started_at=timezone.now() - timedelta(hours=1)
+        ))
+        response = self.submit()
+        self.assertEqual((response.data["job_id"], response.data["status"]), (job_id, "DONE"))
+
+    def test_cache_key_changes_with_standard_hours_and_daily_summaries(self):
+        call_command("rebuild_daily_summaries", stdout=io.StringIO())
+        first = self.submit().data["job_id"]
+
+        self.employee.jornada = time(6, 0)
+        self.employee.save()
+        second = self.submit().data["job_id"]
+        self.assertNotEqual(second, first)
+
+        summary = DailyAttendanceSummary.objects.filter(employee=self.employee).first()
+        summary.alert_count += 1
+        summary.save()
+        self.assertNotEqual(self.submit().data["job_id"], second)
+
+
+class WorkShiftExportTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="rh@test.com", password="pass1234", is_staff=True)
+        self.employees = []
+        for index in range(3):
+            user = User.objects.create_user(email=f"exp{index}@test.com", first_name=f"Exp{index}")
+            employee = Employee.objects.create(user=user, matricula=f"EXP0{index}")
+            WorkShift.objects.create(
+                employee=employee,
+                start_latitude=10,
+                start_longitude=10,
+                start_time=timezone.now() - timedelta(days=1, hours=9),
+                end_time=timezone.now() - timedelta(days=1)
+            )
+            self.employees.append(employee)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_csv_export_streams_filtered_rows(self):
+        url = reverse("workshift-export", args=["csv"])
+        response = self.client.get(url, {"employee": f"{self.employees[0].id},{self.employees[2].id}"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+
+        lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith("EXP00;Exp0;exp0@test.com;"))
+        # 9h de jornada: 1h extra
+        self.assertIn(";09:00;00:00;01:00;540;0;60;", lines[1])
+        self.assertTrue(lines[2].startswith("EXP02;"))
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        response = self.client.get(reverse("workshift-export", args=["xlsx"]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 4)
+        self.assertIn("EXP01", sheet)
+
+    def test_export_is_staff_only(self):
+        self.client.force_authenticate(self.employees[0].user)
+        response = self.client.get(reverse("workshift-export", args=["csv"]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ShiftReportMetricsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="metrics@test.com", password="pass1234")
+        self.employee = Employee.objects.create(user=self.user, matricula="MET01", jornada=time(6, 0))
+        base = timezone.now() - timedelta(days=3)
+        # 7h (1h extra), 5h (1h de atraso) e 4h ajustada para 6h30 (30min extra)
+        for day, hours in enumerate([7, 5, 4]):
+            start = base + timedelta(days=day)
+            WorkShift.objects.create(
+                employee=self.employee,
+                start_latitude=10,
+                start_longitude=10,
+                start_time=start,
+                end_time=start + timedelta(hours=hours),
+                adjusted_end_time=start + timedelta(hours=6, minutes=30) if hours == 4 else None,
+            )
+        # Jornadas criadas direto no banco: os totais vêm dos resumos diários
+        call_command("rebuild_daily_summaries", stdout=io.StringIO())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_rows_and_totals_use_employee_jornada_and_adjustments(self):
+        response = self.client.get(reverse("workshift-report"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row["duration"], row["delay"], row["extra"]) for row in response.data["rows"]],
+            [("07:00", "00:00", "01:00"), ("05:00", "-01:00", "00:00"), ("06:30", "00:00", "00:30")]
+        )
+        self.assertEqual(response.data["totals"]["total_duration"], "18:30")
+        self.assertEqual(response.data["totals"]["total_delay"], "-01:00")
+        self.assertEqual(response.data["totals"]["total_extra"], "01:30")
+
+    def test_rows_are_paginated_with_period_totals(self):
+        response = self.client.get(reverse("workshift-report"), {"page_size": 2})
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(len(response.data["rows"]), 2)
+        self.assertIsNotNone(response.data["next"])
+        self.assertEqual(response.data["totals"]["total_duration"], "18:30")
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["rows"]), 1)
+
+    def test_shift_crossing_end_date_is_listed_and_totalled_on_its_start_day(self):
+        day = timezone.localdate() - timedelta(days=10)
+        start = timezone.make_aware(datetime.combine(day, time(22, 0)))
+        WorkShift.objects.create(
+            employee=self.employee, start_latitude=10, start_longitude=10,
+            start_time=start, end_time=start + timedelta(hours=8),
+        )
+        call_command("rebuild_daily_summaries", stdout=io.StringIO())
+
+        rows, totals = get_workshifts_for_user(self.user, day, day)
+        self.assertEqual([row["duration"] for row in rows], ["08:00"])
+        self.assertEqual(totals["total_duration"], "08:00")
+        rows, totals = get_workshifts_for_user(self.user, day + timedelta(days=1), day + timedelta(days=1))
+        self.assertEqual((rows, totals["total_duration"]), ([], "00:00"))
+
+
+class DailyAttendanceSummaryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="daily@test.com", password="pass1234")
+        self.employee = Employee.objects.create(user=self.user, matricula="DAY01")
+        self.admin = User.objects.create_user(email="daily-admin@test.com", is_staff=True)
+
+    def create_shift(self, hours_ago):
+        return WorkShift.objects.create(
+            employee=self.employee,
+            start_latitude=10,
+            start_longitude=10,
+            start_time=timezone.now() - timedelta(hours=hours_ago)
+        )
+
+    def summary(self, moment):
+        return DailyAttendanceSummary.objects.get(employee=self.employee, day=timezone.localdate(moment))
+
+    def test_services_update_summary_incrementally(self):
+        shift = self.create_shift(9)
+        end_shift(self.user, 10, 10)
+        summary = self.summary(shift.start_time)
+        self.assertEqual((summary.worked_minutes, summary.extra_minutes, summary.shift_count), (540, 60, 1))
+        self.assertFalse(summary.adjusted)
+
+        forgotten = WorkShift.objects.create(
+            employee=self.employee,
+            start_latitude=10,
+            start_longitude=10,
+            start_time=shift.start_time - timedelta(days=1)
+        )
+        adjust_shift_end(
+            shift_id=forgotten.id,
+            adjusted_end_time=forgotten.start_time + timedelta(hours=7),
+            reason="Esqueceu de encerrar",
+            admin_user=self.admin,
+        )
+        summary = self.summary(forgotten.start_time)
+        self.assertEqual((summary.worked_minutes, summary.delay_minutes), (420, 60))
+        self.assertTrue(summary.adjusted)
+
+        alert = create_fraud_alert(self.user, "TIME", "Teste", shift)
+        create_fraud_alert(self.user, "LOCATION", "Teste", shift)
+        self.assertEqual(self.summary(alert.created_at).alert_count, 2)
+
+    def test_rebuild_command_regenerates_summaries(self):
+        shift = self.create_shift(9)
+        end_shift(self.user, 10, 10)
+        alert = create_fraud_alert(self.user, "TIME", "Teste", shift)
+        expected = sorted(DailyAttendanceSummary.objects.values_list(
+            "day", "worked_minutes", "delay_minutes", "extra_minutes", "shift_count", "alert_count"
+        ))
+
+        DailyAttendanceSummary.objects.all().delete()
+        call_command("rebuild_daily_summaries", stdout=io.StringIO())
+        self.assertEqual(sorted(DailyAttendanceSummary.objects.values_list(
+            "day", "worked_minutes", "delay_minutes", "extra_minutes", "shift_count", "alert_count"
+        )), expected)
+        self.assertEqual(self.summary(alert.created_at).alert_count, 1)
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="pages@test.com", password="pass1234")
+        self.employee = Employee.objects.create(user=self.user, matricula="PAG01")
+        start = timezone.now() - timedelta(days=10)
+        # Pares com o mesmo horário de início: o id desempata
+        self.shifts = WorkShift.objects.bulk_create([
+            WorkShift(employee=self.employee, start_latitude=10, start_longitude=10,
+                      start_time=start + timedelta(days=n // 2), end_time=start + timedelta(days=n // 2, hours=8))
+            for n in range(7)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_every_shift_once_in_order(self):
+        seen = []
+        url = reverse("shift-list-user") + "?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data), 2)
+            seen.extend(row["id"] for row in response.data)
+            url = response.headers.get("Link", "").partition("<")[2].partition(">")[0] or None
+
+        expected = list(
+            WorkShift.objects.filter(employee=self.employee).order_by("-start_time", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse("shift-list-user"), {"cursor": "invalido"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TrajectoryTestCase(SimpleTestCase):
+    def test_distance_modes(self):
+        # 1 grau de latitude no equador
+        self.assertAlmostEqual(float(pairwise_distance_km([0], [0], [1], [0], mode="haversine")[0]), 111.195, places=3)
+        self.assertAlmostEqual(float(pairwise_distance_km([0], [0], [1], [0], mode="geodesic")[0]), 110.574, places=3)
+        # Trechos curtos: aproximação plana coincide com haversine
+        short = [[-23.55], [-46.63], [-23.551], [-46.631]]
+        self.assertAlmostEqual(
+            float(pairwise_distance_km(*short, mode="equirectangular")[0]),
+            float(pairwise_distance_km(*short, mode="haversine")[0]),
+            places=6
+        )
+
+    def test_segments_speeds_and_cumulative_distance(self):
+        start = timezone.now()
+        metrics = analyze_trajectory(
+            [0, 0, 0, 0],
+            [0, 0.01, 0.02, 0.02],
+            [start, start + timedelta(minutes=1), start + timedelta(minutes=3), start + timedelta(minutes=4)],
+        )
+        segment = 111.195 * 0.01
+        self.assertEqual(list(metrics["elapsed_s"]), [60, 120, 60])
+        self.assertAlmostEqual(metrics["speed_kmh"][0], segment * 60, places=2)
+        self.assertAlmostEqual(metrics["speed_kmh"][1], segment * 30, places=2)
+        self.assertEqual(metrics["speed_kmh"][2], 0)
+        self.assertEqual(len(metrics["acceleration_ms2"]), 2)
+        self.assertAlmostEqual(metrics["total_km"], 2 * segment, places=3)
+
+    def test_find_tracking_violations(self):
+        # Ponto 1: 30s depois (envio excessivo); ponto 3: 11 km em 2 min (velocidade irreal)
+        violations = find_tracking_violations([0, 0, 0, 0.1], [0, 0, 0, 0], [0, 30, 120, 240])
+        self.assertEqual([(index, rule) for index, rule, _ in violations], [(1, "EXCESSIVE_FIXES"), (3, "SPEED_IMPOSSIBLE")])
+        self.assertIn("Velocidade irreal", violations[1][2])
+
+
+class RescanFraudsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="rescan@test.com")
+        self.employee = Employee.objects.create(user=self.user, matricula="RSC01")
+        start = timezone.now() - timedelta(days=2)
+        # Jornada de 2 min encerrada a ~1,1 km do início
+        self.shift = WorkShift.objects.create(
+            employee=self.employee, start_time=start, end_time=start + timedelta(minutes=2),
+            start_latitude=Decimal("0"), start_longitude=Decimal("0"),
+            end_latitude=Decimal("0.01"), end_longitude=Decimal("0"),
+        )
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.checkpoint = f"{self.tmpdir}/rescan.json"
+
+    def rescan(self, **options):
+        call_command("rescan_frauds", workers=0, checkpoint=self.checkpoint, stdout=io.StringIO(), **options)
+
+    def test_rescan_is_idempotent(self):
+        self.rescan()
+        self.rescan(restart=True)
+
+        alerts = FraudAlert.objects.filter(work_shift=self.shift)
+        self.assertEqual(
+            sorted(alerts.values_list("fingerprint", flat=True)),
+            [f"rescan:OUT_OF_RADIUS:{self.shift.id}", f"rescan:SHORT_SHIFT:{self.shift.id}"]
+        )
+        self.assertEqual(alerts.get(fraud_type="TIME").score, FraudAlert.FRAUD_POINTS["SHORT_SHIFT"])
+
+    def test_rescan_counts_alerts_on_the_shift_day(self):
+        self.rescan()
+        summary = DailyAttendanceSummary.objects.get(employee=self.employee, day=timezone.localdate(self.shift.start_time))
+        self.assertEqual(summary.alert_count, 2)
+        self.assertFalse(DailyAttendanceSummary.objects.filter(
+            employee=self.employee, day=timezone.localdate(), alert_count__gt=0
+        ).exists())
+
+        # O recálculo completo chega aos mesmos resumos
+        call_command("rebuild_daily_summaries", stdout=io.StringIO())
+        summary = DailyAttendanceSummary.objects.get(employee=self.employee, day=timezone.localdate(self.shift.start_time))
+        self.assertEqual(summary.alert_count, 2)
+
+    def test_rule_filter_and_checkpoint_mismatch(self):
+        self.rescan(rule=["SHORT_SHIFT"])
+        self.assertEqual(FraudAlert.objects.filter(work_shift=self.shift).count(), 1)
+
+        # Checkpoint interrompido com outros filtros não é retomado silenciosamente
+        with open(self.checkpoint, "w") as checkpoint:
+            checkpoint.write('{"filters": {}, "last_shift_id": 1, "finished": false}')
+        with self.assertRaises(CommandError):
+            self.rescan()
+
+
+class RescanFraudsPoolTestCase(TransactionTestCase):
+    def test_rescan_in_worker_processes(self):
+        user = User.objects.create_user(email="rescan-pool@test.com")
+        employee = Employee.objects.create(user=user, matricula="RSC02")
+        start = timezone.now() - timedelta(days=2)
+        shifts = [
+            WorkShift.objects.create(
+                employee=employee, start_time=start + timedelta(hours=index), end_time=start + timedelta(hours=index, minutes=2),
+                start_latitude=Decimal("0"), start_longitude=Decimal("0"),
+            )
+            for index in range(5)
+        ]
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+
+        call_command(
+            "rescan_frauds", workers=2, chunk_size=2, rule=["SHORT_SHIFT"],
+            checkpoint=f"{tmpdir}/rescan.json", stdout=io.StringIO(),
+        )
+        self.assertEqual(FraudAlert.objects.filter(work_shift__in=shifts, fraud_type="TIME").count(), 5)
+        summaries = DailyAttendanceSummary.objects.filter(employee=employee)
+        self.assertEqual(summaries.aggregate(alerts=Sum("alert_count"))["alerts"], 5)
+        self.assertEqual(
+            set(summaries.filter(alert_count__gt=0).values_list("day", flat=True)),
+            {timezone.localdate(shift.start_time) for shift in shifts}
+        )
+
+
+class PositionIndexTestCase(SimpleTestCase):
+    def test_nearest_matches_brute_force_and_skips_stale(self):
+        rng = random.Random(14)
+        now = timezone.now()
+        index = PositionIndex()
+        positions = []
+        for shift_id in range(1, 2001):
+            position = (shift_id, -23.5 + rng.uniform(-0.5, 0.5), -46.6 + rng.uniform(-0.5, 0.5))
+            age = timedelta(hours=1) if shift_id % 10 == 0 else timedelta(seconds=rng.randint(0, 300))
+            index.update(shift_id, shift_id, position[1], position[2], now - age)
+            if shift_id % 10:
+                positions.append(position)
+
+        for lat, lon in [(-23.5, -46.6), (-23.95, -46.15), (-25.0, -48.0)]:
+            expected = sorted(positions, key=lambda p: haversine(lat, lon, p[1], p[2]))[:5]
+            nearest = index.nearest(lat, lon, k=5, now=now)
+            self.assertEqual([item["shift_id"] for item in nearest], [p[0] for p in expected])
+            self.assertTrue(all(item["fix_age_seconds"] <= 300 for item in nearest))
+
+        index.remove(expected[0][0])
+        self.assertNotIn(expected[0][0], [item["shift_id"] for item in index.nearest(-25.0, -48.0, k=5, now=now)])
+
+
+class ShiftTrackingNearestTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="dispatch@test.com", password="pass1234", is_staff=True)
+        now = timezone.now()
+        for index, (lat, lon, age) in enumerate([("-23.55", "-46.63", 60), ("-23.60", "-46.70", 30), ("-23.551", "-46.631", 7200)]):
+            user = User.objects.create_user(email=f"near{index}@test.com", first_name=f"Near{index}")
+            employee = Employee.objects.create(user=user, matricula=f"NEAR{index}")
+            shift = WorkShift.objects.create(
+                employee=employee, start_time=now - timedelta(hours=3),
+                start_latitude=Decimal(lat), start_longitude=Decimal(lon),
+            )
+            WorkShiftLastPosition.objects.create(
+                work_shift=shift, latitude=Decimal(lat), longitude=Decimal(lon),
+                recorded_at=now - timedelta(seconds=age),
+            )
+        position_index.invalidate()
+        self.addCleanup(position_index.invalidate)
+
+    def test_nearest_inspectors(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("shift-tracking-nearest"), {"latitude": "-23.55", "longitude": "-46.632", "k": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # A posição de 2h atrás é descartada
+        self.assertEqual([item["name"] for item in response.data], ["Near0", "Near1"])
+        self.assertLess(response.data[0]["distance_km"], response.data[1]["distance_km"])
+        self.assertGreaterEqual(response.data[0]["fix_age_seconds"], 60)
+
+        response = self.client.get(reverse("shift-tracking-nearest"), {"latitude": "abc", "longitude": "-46.6"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_nearest_requires_admin(self):
+        self.client.force_login(User.objects.get(email="near0@test.com"))
+        response = self.client.get(reverse("shift-tracking-nearest"), {"latitude": "-23.55", "longitude": "-46.63"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(POSITION_FEED_SETTLE_SECONDS=0)
+class ShiftTrackingFeedTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="feed-dispatch@test.com", is_staff=True)
+        self.shifts = []
+        for index in range(3):
+            user = User.objects.create_user(email=f"moving{index}@test.com", first_name=f"Moving{index}")
+            employee = Employee.objects.create(user=user, matricula=f"MOV{index}")
+            shift = WorkShift.objects.create(employee=employee, start_latitude=Decimal("-23.55"), start_longitude=Decimal("-46.63"))
+            update_last_position(shift, Decimal("-23.55"), Decimal("-46.63"), timezone.now())
+            self.shifts.append(shift)
+        self.addCleanup(position_index.invalidate)
+        self.client.force_login(self.admin)
+
+    def test_feed_returns_only_moved_and_ended_shifts(self):
+        response = self.client.get(reverse("shift-tracking-feed"))
+        self.assertTrue(response.data["reset"])
+        self.assertEqual([item["name"] for item in response.data["positions"]], ["Moving0", "Moving1", "Moving2"])
+        since = response.data["seq"]
+
+        update_last_position(self.shifts[1], Decimal("-23.56"), Decimal("-46.64"), timezone.now())
+        self.shifts[2].end_time = timezone.now()
+        self.shifts[2].save()
+        remove_position(self.shifts[2])
+
+        with self.assertNumQueries(5):  # sessão, usuário, sequência, posições e remoções
+            response = self.client.get(reverse("shift-tracking-feed"), {"since": since})
+        self.assertFalse(response.data["reset"])
+        self.assertEqual(response.data["seq"], since + 2)
+        self.assertEqual(response.data["positions"], [{
+            "shift_id": self.shifts[1].id, "latitude": -23.56, "longitude": -46.64,
+            "last_update": response.data["positions"][0]["last_update"],
+        }])
+        self.assertEqual(response.data["removed"], [self.shifts[2].id])
+
+        response = self.client.get(reverse("shift-tracking-feed"), {"since": response.data["seq"]})
+        self.assertEqual((response.data["positions"], response.data["removed"]), ([], []))
+
+    def test_pruned_tombstones_force_a_reset(self):
+        response = self.client.get(reverse("shift-tracking-feed"))
+        since = response.data["seq"]
+        self.shifts[0].end_time = timezone.now()
+        self.shifts[0].save()
+        remove_position(self.shifts[0])
+        PositionTombstone.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(prune_tombstones(), 1)
+
+        response = self.client.get(reverse("shift-tracking-feed"), {"since": since})
+        self.assertTrue(response.data["reset"])
+        self.assertEqual([item["name"] for item in response.data["positions"]], ["Moving1", "Moving2"])
+
+    @override_settings(POSITION_FEED_SETTLE_SECONDS=60)
+    def test_cursor_stays_behind_writes_that_may_not_be_committed(self):
+        WorkShiftLastPosition.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.get(reverse("shift-tracking-feed"))
+        since = response.data["seq"]
+        self.assertEqual(since, WorkShiftLastPosition.objects.aggregate(seq=Max("seq"))["seq"])
+
+        update_last_position(self.shifts[0], Decimal("-23.56"), Decimal("-46.64"), timezone.now())
+        for _ in range(2):
+            response = self.client.get(reverse("shift-tracking-feed"), {"since": since})
+            self.assertEqual(response.data["seq"], since)
+            self.assertEqual([item["shift_id"] for item in response.data["positions"]], [self.shifts[0].id])
+
+        # Gravações com sequência vinda do autoincremento: nenhuma linha de contador é atualizada
+        with CaptureQueriesContext(connection) as queries:
+            update_last_position(self.shifts[1], Decimal("-23.57"), Decimal("-46.65"), timezone.now())
+        self.assertFalse([query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")])
+
+
+class ShiftTrackingClustersTestCase(APITestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.user = User.objects.create_user(email="cluster@test.com")
+        position_index.load([
+            {"shift_id": 1, "employee_id": 1, "latitude": -23.5501, "longitude": -46.6331, "recorded_at": now},
+            {"shift_id": 2, "employee_id": 2, "latitude": -23.5503, "longitude": -46.6333, "recorded_at": now},
+            {"shift_id": 3, "employee_id": 3, "latitude": -22.9068, "longitude": -43.1729, "recorded_at": now},
+            # Posição parada há mais que DEFAULT_MAX_FIX_AGE_SECONDS: fora dos grupos
+            {"shift_id": 4, "employee_id": 4, "latitude": -23.5502, "longitude": -46.6332,
+             "recorded_at": now - timedelta(hours=1)},
+        ])
+        cluster_cache.clear()
+        self.addCleanup(cluster_cache.clear)
+        self.addCleanup(position_index.invalidate)
+        self.client.force_login(self.user)
+
+    def test_clusters_by_zoom_and_bbox(self):
+        response = self.client.get(reverse("shift-tracking-clusters"), {"zoom": 10, "bbox": "-25,-48,-22,-43"})
+        clusters = sorted(response.data["clusters"], key=lambda cluster: -cluster["count"])
+        self.assertEqual([(cluster["count"], cluster["shift_ids"]) for cluster in clusters], [(2, [1, 2]), (1, [3])])
+        self.assertAlmostEqual(clusters[0]["latitude"], -23.5502, places=6)
+
+        # Só São Paulo na caixa; com zoom baixo, tudo num grupo só
+        response = self.client.get(reverse("shift-tracking-clusters"), {"zoom": 10, "bbox": "-24,-47,-23,-46"})
+        self.assertEqual([cluster["count"] for cluster in response.data["clusters"]], [2])
+        response = self.client.get(reverse("shift-tracking-clusters"), {"zoom": 0})
+        self.assertEqual([cluster["count"] for cluster in response.data["clusters"]], [3])
+
+        response = self.client.get(reverse("shift-tracking-clusters"), {"zoom": 10, "bbox": "-24,-47"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Mundo inteiro em zoom alto: uma célula por vistoriador, sem limite
+        response = self.client.get(reverse("shift-tracking-clusters"), {"zoom": 10})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_clusters_are_recomputed_after_the_refresh_interval(self):
+        self.assertEqual(len(cluster_cache.clusters(10)), 2)
+        position_index.update(3, 3, -23.5502, -46.6332, timezone.now())
+        # Dentro do intervalo o agregado anterior é reaproveitado, mesmo com o índice alterado
+        self.assertEqual(len(cluster_cache.clusters(10)), 2)
+        with mock.patch("attendance.services.position_clusters.CLUSTER_REFRESH_SECONDS", 0):
+            self.assertEqual([cluster["count"] for cluster in cluster_cache.clusters(10)], [3])
+
+
+class TrackCodecTestCase(SimpleTestCase):
+    def test_compression_ratio_and_error_bound(self):
+        rng = random.Random(15)
+        # 10 h a 1 ponto/min: parado 3 h (ruído de GPS ~2 m), reta de 4 h, 3 h em zigue-zague
+        latitudes, longitudes = [], []
+        for minute in range(600):
+            if minute < 180:
+                lat, lon = -23.55, -46.63
+            elif minute < 420:
+                lat, lon = -23.55 + (minute - 180) * 0.0005, -46.63 + (minute - 180) * 0.0003
+            else:
+                lat, lon = latitudes[419] + (minute - 420) * 0.0002, longitudes[419] + 0.002 * (minute % 2)
+            latitudes.append(lat + rng.uniform(-0.00002, 0.00002))
+            longitudes.append(lon + rng.uniform(-0.00002, 0.00002))
+        seconds = [1_700_000_000 + minute * 60 for minute in range(600)]
+
+        data, stats = compress_track(latitudes, longitudes, seconds, tolerance_m=10)
+        self.assertEqual(stats["original_points"], 600)
+        self.assertLess(stats["stored_points"], 250)
+        self.assertGreater(stats["compression_ratio"], 10)
+        self.assertLessEqual(stats["max_error_m"], 10.5)
+
+        decoded_lat, decoded_lon, decoded_seconds = decode_track(data)
+        kept = simplify_track(latitudes, longitudes, seconds, 10)
+        self.assertEqual(decoded_seconds.tolist(), [seconds[index] for index in kept])
+        self.assertTrue(all(abs(decoded_lat[i] - latitudes[index]) < 1e-6 for i, index in enumerate(kept)))
+
+    def test_decode_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            decode_track(b"\x07\x00")
+
+    def test_downsample_keeps_extremes_and_detours(self):
+        # Reta com um desvio de ~1 km no meio
+        latitudes = [-23.55 + index * 0.0001 for index in range(1000)]
+        longitudes = [-46.63 + (0.01 if index == 500 else 0) for index in range(1000)]
+        kept = downsample_track(latitudes, longitudes, 50)
+        self.assertEqual(len(kept), 50)
+        self.assertEqual((kept[0], kept[-1]), (0, 999))
+        self.assertIn(500, kept)
+        self.assertEqual(kept, sorted(kept))
+        self.assertEqual(downsample_track(latitudes[:10], longitudes[:10], 50), list(range(10)))
+
+
+class ShiftTrackCompressionTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="track@test.com", password="pass1234")
+        self.employee = Employee.objects.create(user=self.user, matricula="TRK01")
+        start = timezone.now() - timedelta(hours=2)
+        self.shift = WorkShift.objects.create(
+            employee=self.employee, start_time=start, end_time=start + timedelta(hours=2),
+            start_latitude=Decimal("-23.55"), start_longitude=Decimal("-46.63"),
+        )
+        # Reta a velocidade constante: só os extremos são necessários
+        WorkShiftLocation.objects.bulk_create([
+            WorkShiftLocation(
+                work_shift=self.shift,
+                latitude=Decimal("-23.55") + Decimal("0.0001") * minute,
+                longitude=Decimal("-46.63"),
+                recorded_at=start + timedelta(minutes=minute),
+            )
+            for minute in range(120)
+        ])
+
+    def test_closed_track_is_compressed_and_decoded(self):
+        track = compress_shift_track(self.shift.id)
+        self.assertEqual((track.original_points, track.stored_points), (120, 2))
+        self.assertFalse(WorkShiftLocation.objects.filter(work_shift=self.shift).exists())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("shift-track", args=[self.shift.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["points"]), 2)
+        self.assertAlmostEqual(response.data["points"][-1]["latitude"], -23.5381, places=6)
+        self.assertEqual(response.data["compression"]["original_points"], 120)
+
+        other = User.objects.create_user(email="track-other@test.com")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse("shift-track", args=[self.shift.id])).status_code, 404)
+
+    def test_end_shift_keeps_raw_points_until_batch_compression(self):
+        WorkShift.objects.filter(pk=self.shift.pk).update(end_time=None)
+        self.assertEqual(get_shift_state(self.employee.id)["shift_id"], self.shift.id)
+
+        end_shift(self.user, Decimal("-23.55"), Decimal("-46.63"))
+        self.assertIsNone(get_shift_state(self.employee.id)["shift_id"])
+        self.assertEqual(WorkShiftLocation.objects.filter(work_shift=self.shift).count(), 120)
+        self.assertFalse(WorkShiftTrack.objects.filter(work_shift=self.shift).exists())
+
+        # Jornada recente: fora da janela de compressão
+        call_command("compress_tracks", stdout=io.StringIO())
+        self.assertEqual(WorkShiftLocation.objects.filter(work_shift=self.shift).count(), 120)
+
+        call_command("compress_tracks", older_than_days=0, stdout=io.StringIO())
+        self.assertFalse(WorkShiftLocation.objects.filter(work_shift=self.shift).exists())
+        self.assertEqual(WorkShiftTrack.objects.get(work_shift=self.shift).original_points, 120)
+
+
+class ShiftPlaybackTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="playback@test.com")
+        self.employee = Employee.objects.create(user=self.user, matricula="PLAY01")
+        self.start = timezone.now() - timedelta(hours=5)
+        self.shift = WorkShift.objects.create(
+            employee=self.employee, start_time=self.start, end_time=self.start + timedelta(hours=4),
+            start_latitude=Decimal("-23.55"), start_longitude=Decimal("-46.63"),
+        )
+        WorkShiftLocation.objects.bulk_create([
+            WorkShiftLocation(
+                work_shift=self.shift,
+                latitude=Decimal("-23.55") + Decimal("0.0001") * minute,
+                longitude=Decimal("-46.63") + Decimal("0.001") * (minute % 7),
+                recorded_at=self.start + timedelta(minutes=minute),
+            )
+            for minute in range(240)
+        ])
+        alert = FraudAlert.objects.create(
+            user=self.user, work_shift=self.shift, fraud_type="TRACKING", description="Velocidade irreal",
+        )
+        FraudAlert.objects.filter(pk=alert.pk).update(created_at=self.start + timedelta(minutes=90))
+        self.client.force_login(self.user)
+
+    def test_playback_is_downsampled_with_alerts_and_cached(self):
+        url = reverse("shift-playback", args=[self.shift.id])
+        response = self.client.get(url, {"max_points": 40})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["original_points"], 240)
+        self.assertEqual(len(response.data["points"]), 40)
+        self.assertEqual(response.data["points"][0]["offset_seconds"], 0)
+        self.assertEqual(response.data["points"][-1]["offset_seconds"], 239 * 60)
+        alert = response.data["alerts"][0]
+        self.assertEqual(alert["offset_seconds"], 90 * 60)
+        self.assertAlmostEqual(alert["latitude"], -23.541, delta=0.001)
+
+        # Jornada encerrada: a trilha reduzida vem do cache, sem ler os pontos
+        with self.assertNumQueries(4):  # sessão, usuário, jornada e alertas
+            cached = self.client.get(url, {"max_points": 40})
+        self.assertEqual(cached.data["points"], response.data["points"])
+
+        self.assertEqual(self.client.get(url, {"max_points": 1}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_login(User.objects.create_user(email="playback-other@test.com"))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_adjusted_end_is_part_of_the_cache_key(self):
+        caches["shared"].clear()
+        self.addCleanup(caches["shared"].clear)
+        # Jornada esquecida, encerrada só pelo ajuste administrativo
+        WorkShift.objects.filter(pk=self.shift.pk).update(
+            end_time=None, adjusted_end_time=self.start + timedelta(hours=3), adjusted_at=timezone.now()
+        )
+        self.shift.refresh_from_db()
+        points, _ = downsampled_track(self.shift, 40)
+        with self.assertNumQueries(0):
+            self.assertEqual(downsampled_track(self.shift, 40)[0], points)
+
+        # Novo ajuste: outra chave, a trilha é lida de novo
+        WorkShift.objects.filter(pk=self.shift.pk).update(
+            adjusted_end_time=self.start + timedelta(hours=2), adjusted_at=timezone.now() + timedelta(seconds=1)
+        )
+        self.shift.refresh_from_db()
+        with CaptureQueriesContext(connection) as queries:
+            downsampled_track(self.shift, 40)
+        self.assertTrue(queries.captured_queries)
+
+
+class TrackArchiveTestCase(APITestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        override = override_settings(TRACK_ARCHIVE_DIR=self.tmpdir, TRACK_ARCHIVE_AFTER_DAYS=90)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(email="archive@test.com", password="pass1234")
+        self.employee = Employee.objects.create(user=self.user, matricula="ARC01")
+        self.shifts = {}
+        for name, days_ago in (("old_raw", 200), ("old_compressed", 150), ("recent", 10)):
+            start = timezone.now() - timedelta(days=days_ago)
+            shift = WorkShift.objects.create(
+                employee=self.employee, start_time=start, end_time=start + timedelta(hours=1),
+                start_latitude=Decimal("-23.55"), start_longitude=Decimal("-46.63"),
+            )
+            WorkShiftLocation.objects.bulk_create([
+                WorkShiftLocation(
+                    work_shift=shift, latitude=Decimal("-23.55") + Decimal("0.001") * (minute % 7),
+                    longitude=Decimal("-46.63"), recorded_at=start + timedelta(minutes=minute),
+                )
+                for minute in range(0, 60, 5)
+            ])
+            self.shifts[name] = shift
+        compress_shift_track(self.shifts["old_compressed"].id)
+
+    def test_old_tracks_are_archived_and_read_back(self):
+        before = {name: get_shift_track(shift.id) for name, shift in self.shifts.items()}
+
+        call_command("archive_tracks", batch_size=1, stdout=io.StringIO())
+
+        archived = set(TrackArchiveEntry.objects.values_list("work_shift_id", flat=True))
+        self.assertEqual(archived, {self.shifts["old_raw"].id, self.shifts["old_compressed"].id})
+        self.assertFalse(WorkShiftLocation.objects.filter(work_shift=self.shifts["old_raw"]).exists())
+        self.assertFalse(WorkShiftTrack.objects.filter(work_shift=self.shifts["old_compressed"]).exists())
+        self.assertTrue(WorkShiftLocation.objects.filter(work_shift=self.shifts["recent"]).exists())
+
+        for name, shift in self.shifts.items():
+            after = get_shift_track(shift.id)
+            # Arquivo guarda horários em segundos e coordenadas em micrograus
+            self.assertEqual(len(after), len(before[name]))
+            self.assertTrue(all(abs((a[2] - b[2]).total_seconds()) <= 0.5 for a, b in zip(after, before[name])))
+            self.assertTrue(all(abs(a[0] - b[0]) < 1e-6 for a, b in zip(after, before[name])))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("shift-track", args=[self.shifts["old_raw"].id]))
+        self.assertEqual(len(response.data["points"]), 12)
+
+        # Nova execução não encontra mais nada a arquivar
+        call_command("archive_tracks", stdout=io.StringIO())
+        self.assertEqual(TrackArchiveEntry.objects.count(), 2)
+
+
+class FraudAlertCoalescingTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="coalesce@test.com")
+        self.employee = Employee.objects.create(user=self.user, matricula="COA01")
+        self.shift = WorkShift.objects.create(employee=self.employee, start_latitude=10, start_longitude=10)
+
+    def test_repeated_alerts_are_merged(self):
+        first = create_fraud_alert(self.user, "TRACKING", "Envio excessivo de localização", self.shift)
+        with self.assertNumQueries(1):
+            self.assertIsNone(create_fraud_alert(self.user, "TRACKING", "Envio excessivo de localização", self.shift))
+        create_fraud_alert(self.user, "TRACKING", "GPS inválido (0,0)", self.shift, occurrences=3)
+        create_fraud_alert(self.user, "MULTI_SHIFT", "Outro tipo", self.shift)
+
+        first.refresh_from_db()
+        self.assertEqual(first.occurrences, 5)
+        self.assertGreaterEqual(first.last_seen_at, first.created_at)
+        self.assertEqual(FraudAlert.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(DailyAttendanceSummary.objects.get(employee=self.employee).alert_count, 2)
+
+    def test_merged_occurrences_count_once_in_summary_and_risk_score(self):
+        create_fraud_alert(self.user, "TRACKING", "Envio excessivo de localização", self.shift)
+        weight = EmployeeRiskScore.objects.get(employee=self.employee).weight
+        for _ in range(3):
+            create_fraud_alert(self.user, "TRACKING", "Envio excessivo de localização", self.shift)
+
+        self.assertEqual(FraudAlert.objects.get(user=self.user).occurrences, 4)
+        self.assertEqual(DailyAttendanceSummary.objects.get(employee=self.employee).alert_count, 1)
+        self.assertEqual(EmployeeRiskScore.objects.get(employee=self.employee).weight, weight)
+
+        # Mesma regra nos recálculos completos
+        call_command("rebuild_daily_summaries", stdout=io.StringIO())
+        call_command("rebuild_risk_scores", stdout=io.StringIO())
+        self.assertEqual(DailyAttendanceSummary.objects.get(employee=self.employee).alert_count, 1)
+        self.assertAlmostEqual(EmployeeRiskScore.objects.get(employee=self.employee).weight / weight, 1, places=9)
+
+    def test_resolved_or_expired_alerts_start_a_new_record(self):
+        first = create_fraud_alert(self.user, "TIME", "Teste", self.shift)
+        FraudAlert.objects.filter(pk=first.pk).update(resolved=True)
+        self.assertIsNotNone(create_fraud_alert(self.user, "TIME", "Teste", self.shift))
+
+        FraudAlert.objects.update(last_seen_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNotNone(create_fraud_alert(self.user, "TIME", "Teste", self.shift))
+
+        with override_settings(FRAUD_ALERT_COALESCE_SECONDS=0):
+            self.assertIsNotNone(create_fraud_alert(self.user, "TIME", "Teste", self.shift))
+        self.assertEqual(FraudAlert.objects.filter(fraud_type="TIME").count(), 4)
+
+
+class RiskScoreTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="risk-admin@test.com", is_staff=True)
+        self.users = []
+        for index in range(3):
+            user = User.objects.create_user(email=f"risk{index}@test.com", first_name=f"Risk{index}")
+            Employee.objects.create(user=user, matricula=f"RISK{index}")
+            self.users.append(user)
+
+    def test_score_decays_and_tracks_created_and_resolved_alerts(self):
+        points = FraudAlert.FRAUD_POINTS["MULTI_SHIFT"]
+        alert = create_fraud_alert(self.users[0], "MULTI_SHIFT", "Teste")
+        create_fraud_alert(self.users[0], "LOCATION", "Teste")
+        self.assertAlmostEqual(get_risk_score(self.users[0].pk), points + 10, places=3)
+        # Uma meia-vida depois, metade do peso
+        later = timezone.now() + timedelta(days=settings.RISK_SCORE_HALF_LIFE_DAYS)
+        self.assertAlmostEqual(get_risk_score(self.users[0].pk, now=later), (points + 10) / 2, places=3)
+
+        self.client.force_login(self.admin)
+        self.client.post(reverse("fraud-resolve", args=[alert.pk]))
+        self.assertAlmostEqual(get_risk_score(self.users[0].pk), 10, places=3)
+
+        # Score incremental igual ao recalculado a partir dos alertas
+        incremental = EmployeeRiskScore.objects.get(employee__user=self.users[0]).weight
+        call_command("rebuild_risk_scores", stdout=io.StringIO())
+        self.assertAlmostEqual(EmployeeRiskScore.objects.get(employee__user=self.users[0]).weight / incremental, 1, places=9)
+
+    def test_top_risky_and_score_endpoints(self):
+        create_fraud_alert(self.users[1], "MULTI_SHIFT", "Teste")
+        create_fraud_alert(self.users[1], "LOCATION", "Teste")
+        create_fraud_alert(self.users[2], "LOCATION", "Teste")
+        create_fraud_alert(self.users[2], "TIME", "Teste")
+        create_fraud_alert(self.users[2], "DEVICE", "Teste")
+
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(3):  # sessão, usuário e ranking
+            response = self.client.get(reverse("fraud-score-top"), {"limit": 5})
+        self.assertEqual([item["name"] for item in response.data], ["Risk1", "Risk2"])
+        self.assertEqual(response.data[0]["risk_score"], FraudAlert.FRAUD_POINTS["MULTI_SHIFT"] + 10)
+
+        self.client.force_login(self.users[2])
+        response = self.client.get(reverse("fraud-score", args=[self.users[2].pk]))
+        self.assertEqual(response.data["risk_score"], 30)
+        self.assertEqual(self.client.get(reverse("fraud-score", args=[self.users[1].pk])).status_code, 403)
+        self.assertEqual(self.client.get(reverse("fraud-score-top")).status_code, 403)
+
+
+@mock.patch("attendance.services.alert_feed.FEED_SETTLE_SECONDS", 0)
+class FraudAlertFeedTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="feed-admin@test.com", is_staff=True)
+        self.user = User.objects.create_user(email="feed@test.com")
+        self.alert = create_fraud_alert(self.user, "MULTI_SHIFT", "Teste")
+        self.client.force_login(self.admin)
+
+    def test_conditional_get_returns_304_until_an_alert_changes(self):
+        url = reverse("fraud-admin-json")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        with self.assertNumQueries(3):  # sessão, usuário e marca d'água
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(reverse("fraud-resolve", args=[self.alert.pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()[0]["resolved"])
+
+    def test_since_returns_only_changed_alerts(self):
+        for url in (reverse("fraud-admin-json"), reverse("dashboard:fraud-alerts-json")):
+            old = FraudAlert.objects.create(user=self.user, fraud_type="LOCATION", description="Antigo")
+            since = self.client.get(url)["X-Since-Cursor"]
+            self.assertEqual(self.client.get(url, {"since": since}).json(), [])
+
+            new = FraudAlert.objects.create(user=self.user, fraud_type="TIME", description="Novo")
+            FraudAlert.objects.filter(pk=old.pk).update(resolved=True, updated_at=timezone.now())
+            response = self.client.get(url, {"since": since})
+            self.assertEqual([item["id"] for item in response.json()], [new.pk, old.pk])
+            self.assertEqual(response["X-Has-More"], "false")
+            # O cursor retornado avança: nada mais a sincronizar
+            self.assertEqual(self.client.get(url, {"since": response["X-Since-Cursor"]}).json(), [])
+            self.assertEqual(self.client.get(url, {"since": "inválido"}).status_code, 400)
+
+
+class LoadHarnessTestCase(TestCase):
+    def test_in_process_run_reports_endpoints_and_regressions(self):
+        report_path = Path(tempfile.mkdtemp()) / "baseline.json"
+        self.addCleanup(shutil.rmtree, report_path.parent)
+        out = io.StringIO()
+        call_command("load_test", inspectors=3, supervisors=1, fixes=5, save=str(report_path), stdout=out)
+
+        report = json.loads(report_path.read_text())
+        endpoints = report["endpoints"]
+        self.assertEqual(endpoints["shift-tracking"]["requests"], 15)
+        self.assertEqual(
+            sum(stats["errors"] for stats in endpoints.values()), 0,
+            out.getvalue()
+        )
+        self.assertGreater(endpoints["shift-tracking-dashboard"]["queries_avg"], 0)
+        # Usuários sintéticos removidos ao final
+        self.assertFalse(User.objects.filter(email__endswith="@loadtest.invalid").exists())
+
+        # Referência com menos consultas no tracking: a execução atual é uma regressão
+        baseline = json.loads(json.dumps(report))
+        baseline["endpoints"]["shift-tracking"]["queries_avg"] = 1
+        regressions = compare_with_baseline(report, baseline, 0.2)
+        self.assertEqual([(name, metric) for name, metric, _, _ in regressions], [("shift-tracking", "queries_avg")])
+        self.assertEqual(compare_with_baseline(report, report, 0.2), [])
+
+
+class QueryBudgetTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email="budget-admin@test.com", password="123456")
+        for index in range(4):
+            user = User.objects.create_user(email=f"budget{index}@test.com", first_name=f"Budget{index}")
+            employee = Employee.objects.create(user=user, matricula=f"BUD{index}")
+            shift = WorkShift.objects.create(employee=employee, start_latitude=Decimal("-23.55"), start_longitude=Decimal("-46.63"))
+            update_last_position(shift, Decimal("-23.55"), Decimal("-46.63"), timezone.now())
+            FraudAlert.objects.create(user=user, work_shift=shift, fraud_type="TRACKING", score=10, description="teste")
+        self.addCleanup(position_index.invalidate)
+        self.client.force_login(self.admin)
+
+    def test_list_views_have_no_repeated_queries(self):
+        urls = [
+            reverse("shift-tracking-dashboard"),
+            reverse("fraud-alerts-all"),
+            reverse("fraud-admin-json"),
+            reverse("dashboard:fraud-alerts-json"),
+            reverse("dashboard:dashboard-home"),
+            reverse("admin:attendance_workshift_changelist"),
+            reverse("admin:attendance_fraudalert_changelist"),
+        ]
+        with capture_view_queries() as reports:
+            for url in urls:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK, url)
+        self.assertEqual([report["duplicates"] for report in reports], [0] * len(urls), reports)
+        self.assertEqual(reports[0]["view"], "shift-tracking-dashboard")
+
+    def test_budget_violation_fails_in_tests_and_logs_in_production(self):
+        budgets = {"shift-tracking-dashboard": {"queries": 1}}
+        with override_settings(QUERY_BUDGETS=budgets):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "shift-tracking-dashboard: queries"):
+                self.client.get(reverse("shift-tracking-dashboard"))
+        with override_settings(QUERY_BUDGETS=budgets, QUERY_BUDGET_RAISE=False, QUERY_BUDGET_HEADERS=True):
+            with self.assertLogs("attendance.query_budget", "WARNING"):
+                response = self.client.get(reverse("shift-tracking-dashboard"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Query-Count"], "3")
+
+    async def test_async_stack_measures_sync_views_and_skips_async_views(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(QueryBudgetMiddleware(get_response)))
+        self.assertTrue(is_async_view(RequestFactory().get(reverse("dashboard:event-stream"))))
+        self.assertFalse(is_async_view(RequestFactory().get(reverse("shift-tracking-dashboard"))))
+
+        await self.async_client.aforce_login(self.admin)
+        with override_settings(QUERY_BUDGET_HEADERS=True), capture_view_queries() as reports:
+            response = await self.async_client.get(reverse("shift-tracking-dashboard"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([report["view"] for report in reports], ["shift-tracking-dashboard"])
+        self.assertEqual(response["X-Query-Count"], str(reports[0]["queries"]))
+        self.assertGreater(reports[0]["queries"], 0)
+
+    def test_query_shape_collapses_in_lists(self):
+        self.assertEqual(
+            query_shape('SELECT *  FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s)'),
+        )
+        self.assertIsNone(query_shape('SAVEPOINT "s1"'))
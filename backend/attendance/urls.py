@@ -17,15 +17,27 @@ urlpatterns = [
     path('reports/workshift/', views.ShiftReportView.as_view(), name='workshift-report'),
     path('reports/workshift/pdf/', views.workshift_report_pdf_view, name='workshift-report-pdf'),
     path('api/reports/workshift/pdf/', views.workshift_report_pdf_api, name='workshift-report-pdf-api'),
+    path('api/reports/workshift/pdf/jobs/', views.workshift_report_pdf_job_submit, name='workshift-report-pdf-job-submit'),
+    path('api/reports/workshift/pdf/jobs/<str:job_id>/', views.workshift_report_pdf_job_status, name='workshift-report-pdf-job'),
+    path('api/reports/workshift/pdf/jobs/<str:job_id>/download/', views.workshift_report_pdf_job_download, name='workshift-report-pdf-job-download'),
+    path('api/reports/workshift/export/<str:file_format>/', views.workshift_export, name='workshift-export'),
     path('save-signature/', save_signature_api, name='save_signature_api'),
 
     path('tracking/', views.ShiftTrackingView.as_view(), name='shift-tracking'),
-    path('tracking/dashboard/', views.ShiftTrackingDashboardView.as_view()),
+    path('tracking/batch/', views.ShiftTrackingBatchView.as_view(), name='shift-tracking-batch'),
+    path('tracking/dashboard/', views.ShiftTrackingDashboardView.as_view(), name='shift-tracking-dashboard'),
+    path('tracking/feed/', views.ShiftTrackingFeedView.as_view(), name='shift-tracking-feed'),
+    path('tracking/clusters/', views.ShiftTrackingClustersView.as_view(), name='shift-tracking-clusters'),
+    path('tracking/nearest/', views.ShiftTrackingNearestView.as_view(), name='shift-tracking-nearest'),
+    path('workshift/<int:pk>/track/', views.ShiftTrackView.as_view(), name='shift-track'),
+    path('workshift/<int:pk>/playback/', views.ShiftPlaybackView.as_view(), name='shift-playback'),
 
     # 🔔 Fraud alerts
     path('fraud-alerts/', views.FraudAlertListView.as_view(), name='fraud-alerts'),
     path('fraud-alerts/all/', views.FraudAlertAdminListView.as_view(), name='fraud-alerts-all'),
     path('fraud-alerts/<int:pk>/resolve/', views.FraudAlertResolveView.as_view(), name='fraud-resolve'),
+    path('fraud-score/top/', views.TopRiskyEmployeesView.as_view(), name='fraud-score-top'),
+    path('fraud-score/<int:user_id>/', views.FraudScoreView.as_view(), name='fraud-score'),
     path('fraud-admin-json/', views.frauds_admin_list, name='fraud-admin-json'),
 
 
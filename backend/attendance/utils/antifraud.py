@@ -1,4 +1,3 @@
-from geopy.distance import geodesic
 from attendance.models import FraudAlert
 from math import radians, cos, sin, asin, sqrt
 
@@ -11,7 +10,9 @@ def create_fraud_alert(user, work_shift, fraud_type, description):
     )
 
 def distance_km(lat1, lon1, lat2, lon2):
-    return geodesic((lat1, lon1), (lat2, lon2)).km
+    # Haversine: diferença para o geodésico (< 0,5%) é irrelevante no limite de 1 km.
+    # Para muitos pontos de uma vez, ver utils.trajectory.
+    return haversine(float(lat1), float(lon1), float(lat2), float(lon2))
 
 
 
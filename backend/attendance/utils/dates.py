@@ -0,0 +1,29 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def start_of_day(day):
+    """Retorna o início do dia (00:00) no fuso local, como datetime aware"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_range_q(field, start_date=None, end_date=None):
+    """
+    Filtro por período sobre um DateTimeField, equivalente a field__date__gte / field__date__lte,
+    mas expresso como intervalo [início, fim) para que os índices sobre o campo sejam usados.
+    Aceita date ou string ISO (AAAA-MM-DD).
+    """
+    if isinstance(start_date, str):
+        start_date = parse_date(start_date)
+    if isinstance(end_date, str):
+        end_date = parse_date(end_date)
+
+    q = Q()
+    if start_date:
+        q &= Q(**{f"{field}__gte": start_of_day(start_date)})
+    if end_date:
+        q &= Q(**{f"{field}__lt": start_of_day(end_date + timedelta(days=1))})
+    return q
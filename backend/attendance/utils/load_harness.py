@@ -0,0 +1,383 @@
+import heapq
+import http.cookiejar
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+
+# Carga sintética de campo: N vistoriadores (login, início de jornada, pontos na cadência
+# informada, fim de jornada) e M supervisores consultando os endpoints do painel.
+# O tempo é simulado: os horários dos eventos vão como horário do dispositivo, então a cadência
+# real (ex.: 1 ponto/min) é respeitada pelas regras de tracking sem esperar em tempo real.
+
+LOADTEST_DOMAIN = "loadtest.invalid"
+LOADTEST_PASSWORD = "loadtest-pass"
+# Centro das rotas sintéticas (São Paulo) e raio do circuito de cada vistoriador
+ROUTE_CENTER = (-23.55, -46.63)
+ROUTE_SPREAD_DEG = 0.2
+ROUTE_RADIUS_M = 80
+METERS_PER_DEGREE = 111_195
+
+SUPERVISOR_ENDPOINTS = (
+    "shift-tracking-dashboard",
+    "shift-tracking-feed",
+    "shift-tracking-clusters",
+    "fraud-admin-json",
+)
+
+
+class EndpointStats:
+    """Latências (s), consultas SQL e erros das requisições de um endpoint"""
+
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, ok, queries=None):
+        with self._lock:
+            self.latencies.append(elapsed)
+            if queries is not None:
+                self.queries.append(queries)
+            if not ok:
+                self.errors += 1
+
+    def summary(self, wall_seconds):
+        latencies = np.asarray(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "queries_avg": round(float(np.mean(self.queries)), 2) if self.queries else None,
+            "queries_max": int(max(self.queries)) if self.queries else None,
+        }
+
+
+class InProcessTransport:
+    """Requisições pelo cliente de testes do Django no próprio processo, com contagem de consultas"""
+
+    measures_queries = True
+
+    def __init__(self):
+        from rest_framework.test import APIClient
+
+        self._client_class = APIClient
+
+    def session(self):
+        return self._client_class(SERVER_NAME="localhost")
+
+    def login_inspector(self, session, email, device_id):
+        # LoginView diretamente: a rota /login/ é atendida antes pelo TokenObtainPairView
+        from accounts.views import LoginView
+        from rest_framework.test import APIRequestFactory
+
+        request = APIRequestFactory(SERVER_NAME="localhost").post(
+            "/api/auth/login/",
+            {"email": email, "password": LOADTEST_PASSWORD, "device_id": device_id},
+            format="json",
+        )
+        response = LoginView.as_view()(request)
+        if response.status_code == 200:
+            session.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.status_code
+
+    def login_supervisor(self, session, user):
+        session.force_login(user)
+        return 200
+
+    def send(self, session, method, path, data=None, headers=None):
+        extra = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in (headers or {}).items()}
+        if method == "GET":
+            response = session.get(path, data or {}, **extra)
+        else:
+            response = session.post(path, data or {}, format="json", **extra)
+        body = response.json() if response.get("Content-Type", "").startswith("application/json") else None
+        return response.status_code, body
+
+
+class HttpTransport:
+    """Requisições HTTP para um servidor em execução (runserver, gunicorn/uvicorn), sem contagem de consultas"""
+
+    measures_queries = False
+
+    def __init__(self, base_url, login_path="/api/auth/login/"):
+        self.base_url = base_url.rstrip("/")
+        self.login_path = login_path
+
+    def session(self):
+        jar = http.cookiejar.CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+        return {"opener": opener, "jar": jar, "headers": {}}
+
+    def _open(self, session, request):
+        try:
+            with session["opener"].open(request, timeout=30) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as error:
+            return error.code, error.read(), error.headers
+
+    def send(self, session, method, path, data=None, headers=None, form=False):
+        url = self.base_url + path
+        headers = dict(session["headers"], **(headers or {}))
+        body = None
+        if method == "GET" and data:
+            url += "?" + urllib.parse.urlencode(data)
+        elif method != "GET":
+            if form:
+                body = urllib.parse.urlencode(data or {}).encode()
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            else:
+                body = json.dumps(data or {}).encode()
+                headers["Content-Type"] = "application/json"
+        status, content, response_headers = self._open(
+            session, urllib.request.Request(url, data=body, headers=headers, method=method)
+        )
+        parsed = None
+        if response_headers.get("Content-Type", "").startswith("application/json"):
+            parsed = json.loads(content or b"null")
+        return status, parsed
+
+    def login_inspector(self, session, email, device_id):
+        status, body = self.send(
+            session, "POST", self.login_path,
+            {"email": email, "password": LOADTEST_PASSWORD, "device_id": device_id},
+        )
+        if status == 200:
+            session["headers"]["Authorization"] = f"Bearer {body['access']}"
+        return status
+
+    def login_supervisor(self, session, user):
+        # Sessão pelo login do admin (os endpoints do painel usam SessionAuthentication)
+        login_path = "/admin/login/"
+        self.send(session, "GET", login_path)
+        csrf = next((cookie.value for cookie in session["jar"] if cookie.name == "csrftoken"), "")
+        status, _ = self.send(
+            session, "POST", login_path,
+            {"username": user.email, "password": LOADTEST_PASSWORD, "csrfmiddlewaretoken": csrf, "next": "/admin/"},
+            headers={"Referer": self.base_url + login_path}, form=True,
+        )
+        return status
+
+
+def create_actors(inspectors, supervisors):
+    """Cria os usuários sintéticos (um hash de senha para todos). Retorna (vistoriadores, supervisores)"""
+    from accounts.models import Employee, User, UserDevice
+
+    password = make_password(LOADTEST_PASSWORD)
+    users = User.objects.bulk_create([
+        User(email=f"inspector{index}@{LOADTEST_DOMAIN}", first_name=f"Carga {index}", password=password)
+        for index in range(inspectors)
+    ])
+    Employee.objects.bulk_create([
+        Employee(user=user, matricula=f"LOAD{index:05d}") for index, user in enumerate(users)
+    ])
+    UserDevice.objects.bulk_create([
+        UserDevice(user=user, device_id=f"LOADDEVICE{index:05d}") for index, user in enumerate(users)
+    ])
+    staff = User.objects.bulk_create([
+        User(email=f"supervisor{index}@{LOADTEST_DOMAIN}", password=password, is_staff=True)
+        for index in range(supervisors)
+    ])
+    return list(User.objects.filter(pk__in=[user.pk for user in users]).select_related("employee")), staff
+
+
+def delete_actors():
+    """Remove os usuários sintéticos (e, em cascata, jornadas, pontos e alertas)"""
+    from accounts.models import Employee, User
+    from attendance.services.shift_state import invalidate_shift_state
+
+    employee_ids = list(
+        Employee.objects.filter(user__email__endswith=f"@{LOADTEST_DOMAIN}").values_list("pk", flat=True)
+    )
+    deleted, _ = User.objects.filter(email__endswith=f"@{LOADTEST_DOMAIN}").delete()
+    for employee_id in employee_ids:
+        invalidate_shift_state(employee_id)
+    return deleted
+
+
+def route(rng, fixes):
+    """Circuito fechado de raio ROUTE_RADIUS_M: termina no ponto de início (regra de 200 m no fim)"""
+    center_lat = ROUTE_CENTER[0] + rng.uniform(-ROUTE_SPREAD_DEG, ROUTE_SPREAD_DEG)
+    center_lon = ROUTE_CENTER[1] + rng.uniform(-ROUTE_SPREAD_DEG, ROUTE_SPREAD_DEG)
+    radius_deg = ROUTE_RADIUS_M / METERS_PER_DEGREE
+    points = []
+    for step in range(fixes + 2):
+        angle = 2 * math.pi * step / (fixes + 1)
+        points.append((
+            round(center_lat + radius_deg * math.sin(angle), 6),
+            round(center_lon + radius_deg * (1 - math.cos(angle)) / math.cos(math.radians(center_lat)), 6),
+        ))
+    return points
+
+
+def inspector_steps(user, index, fixes, cadence, rng, origin):
+    """Requisições de um vistoriador em ordem: (segundos simulados, endpoint, método, rota, dados, cabeçalhos)"""
+    device_id = f"LOADDEVICE{index:05d}"
+    offset = rng.uniform(0, cadence)
+    points = route(rng, fixes)
+    at = lambda step: (origin + timedelta(seconds=offset + step * cadence)).isoformat()
+    key = lambda: {"Idempotency-Key": uuid.uuid4().hex}
+
+    yield offset, "login", None, None, {"email": user.email, "device_id": device_id}, None
+    lat, lon = points[0]
+    yield offset, "shift-start", "POST", reverse("shift-start"), \
+        {"device_id": device_id, "latitude": lat, "longitude": lon, "timestamp": at(0)}, key()
+    for step in range(1, fixes + 1):
+        lat, lon = points[step]
+        yield offset + step * cadence, "shift-tracking", "POST", reverse("shift-tracking"), \
+            {"device_id": device_id, "latitude": lat, "longitude": lon, "timestamp": at(step)}, key()
+    lat, lon = points[-1]
+    yield offset + (fixes + 1) * cadence, "shift-end", "POST", reverse("shift-end"), \
+        {"device_id": device_id, "latitude": lat, "longitude": lon, "timestamp": at(fixes + 1)}, key()
+
+
+def supervisor_steps(user, duration, poll_interval, rng):
+    """Consultas de um supervisor: o painel inteiro a cada poll_interval segundos simulados"""
+    yield 0, "login-supervisor", None, None, user, None
+    since, moment = 0, rng.uniform(0, poll_interval)
+    while moment <= duration:
+        for name in SUPERVISOR_ENDPOINTS:
+            params = {}
+            if name == "shift-tracking-feed":
+                params = {"since": since}
+            elif name == "shift-tracking-clusters":
+                # Mapa enquadrado na região das rotas sintéticas
+                lat, lon = ROUTE_CENTER
+                params = {"zoom": 12, "bbox": ",".join(str(value) for value in (
+                    lat - ROUTE_SPREAD_DEG, lon - ROUTE_SPREAD_DEG, lat + ROUTE_SPREAD_DEG, lon + ROUTE_SPREAD_DEG
+                ))}
+            body = yield moment, name, "GET", reverse(name), params, None
+            if name == "shift-tracking-feed" and isinstance(body, dict):
+                since = body.get("seq", since)
+        moment += poll_interval
+
+
+class LoadRun:
+    """
+    Executa os passos de todos os atores em ordem de tempo simulado. Cada ator só envia a próxima
+    requisição depois da resposta da anterior; com concurrency > 1 (apenas HTTP), atores diferentes
+    rodam em paralelo.
+    """
+
+    def __init__(self, transport, actors, concurrency=1):
+        self.transport = transport
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._queue = []
+        self._active = 0
+        self._counter = 0
+        for steps in actors:
+            self._schedule(steps, None, self.transport.session())
+        self.concurrency = concurrency
+
+    def _schedule(self, steps, previous_body, session):
+        try:
+            step = steps.send(previous_body) if previous_body is not None else next(steps)
+        except StopIteration:
+            return
+        self._counter += 1
+        heapq.heappush(self._queue, (step[0], self._counter, step, steps, session))
+
+    def _execute(self, step, session):
+        _, name, method, path, data, headers = step
+        started = time.perf_counter()
+        body, queries = None, None
+        capture = CaptureQueriesContext(connection) if self.transport.measures_queries else nullcontext()
+        with capture:
+            if name == "login":
+                status = self.transport.login_inspector(session, data["email"], data["device_id"])
+            elif name == "login-supervisor":
+                status = self.transport.login_supervisor(session, data)
+            else:
+                status, body = self.transport.send(session, method, path, data, headers)
+        elapsed = time.perf_counter() - started
+        if self.transport.measures_queries:
+            queries = len(capture.captured_queries)
+        self.stats.setdefault(name, EndpointStats()).record(elapsed, 200 <= status < 400, queries)
+        return body if body is not None else {}
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    if not self._active:
+                        return
+                    item = None
+                else:
+                    item = heapq.heappop(self._queue)
+                    self._active += 1
+            if item is None:
+                time.sleep(0.001)
+                continue
+            _, _, step, steps, session = item
+            body = self._execute(step, session)
+            with self._lock:
+                self._schedule(steps, body, session)
+                self._active -= 1
+
+    def run(self):
+        started = time.perf_counter()
+        if self.concurrency <= 1:
+            self._worker()
+        else:
+            threads = [threading.Thread(target=self._worker) for _ in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        wall = time.perf_counter() - started
+        return {
+            "wall_seconds": round(wall, 3),
+            "endpoints": {name: stats.summary(wall) for name, stats in sorted(self.stats.items())},
+        }
+
+
+def build_actors(inspectors, staff, fixes, cadence, supervisors_poll, seed):
+    rng = random.Random(seed)
+    duration = (fixes + 2) * cadence
+    origin = timezone.now() - timedelta(seconds=duration + cadence)
+    actors = [
+        inspector_steps(user, index, fixes, cadence, random.Random(rng.random()), origin)
+        for index, user in enumerate(inspectors)
+    ]
+    actors += [supervisor_steps(user, duration, supervisors_poll, random.Random(rng.random())) for user in staff]
+    return actors
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """
+    Regressões em relação a uma execução anterior: p95 ou consultas médias acima de
+    (1 + tolerance) vezes o valor de referência. Retorna [(endpoint, métrica, referência, atual)].
+    """
+    regressions = []
+    for name, current in report["endpoints"].items():
+        reference = baseline.get("endpoints", {}).get(name)
+        if not reference:
+            continue
+        for metric in ("p95_ms", "queries_avg"):
+            before, after = reference.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + tolerance) and after - before > (0.5 if metric == "queries_avg" else 1.0):
+                regressions.append((name, metric, before, after))
+    return regressions
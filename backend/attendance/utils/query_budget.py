@@ -0,0 +1,135 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+# Orçamento de consultas SQL por view: cada requisição registra o total de consultas, o tempo
+# gasto no banco e as "formas" repetidas (mesmo SQL parametrizado executado mais de uma vez,
+# o sinal típico de N+1). Os limites ficam em settings.QUERY_BUDGETS, pelo nome da rota
+# (com namespace, ex.: "dashboard:fraud-alerts-json" ou "admin:attendance_workshift_changelist").
+# Em produção uma violação só gera um aviso no log; com QUERY_BUDGET_RAISE (suíte de testes) a
+# requisição falha com QueryBudgetExceeded.
+
+logger = logging.getLogger("attendance.query_budget")
+
+# IN (%s, %s, ...) de tamanho variável conta como a mesma forma
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+# Controle de transação não é consulta de dados: entra na contagem, mas não nas formas repetidas
+_TRANSACTION_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT", "BEGIN", "COMMIT", "ROLLBACK")
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_shape(sql):
+    """SQL parametrizado normalizado (listas IN colapsadas); None para controle de transação"""
+    shape = _WHITESPACE.sub(" ", _IN_LIST.sub("(%s...)", sql)).strip()
+    if shape.upper().startswith(_TRANSACTION_STATEMENTS):
+        return None
+    return shape
+
+
+class QueryRecorder:
+    """execute_wrapper que conta as consultas, soma o tempo e agrupa por forma"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            shape = query_shape(sql)
+            if shape is not None:
+                self.shapes[shape] += 1
+
+    @contextmanager
+    def installed(self):
+        # As conexões são por thread: só as consultas desta requisição passam pelo wrapper
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def report(self, view_name):
+        duplicated = {shape: count for shape, count in self.shapes.most_common() if count > 1}
+        return {
+            "view": view_name,
+            "queries": self.count,
+            "sql_ms": round(self.seconds * 1000, 2),
+            "duplicates": sum(count - 1 for count in duplicated.values()),
+            "duplicated_shapes": duplicated,
+        }
+
+
+def view_budget(view_name):
+    return getattr(settings, "QUERY_BUDGETS", {}).get(view_name)
+
+
+def budget_violations(report, budget):
+    """Descrições das violações do orçamento {"queries": n, "duplicates": n} (chaves opcionais)"""
+    violations = []
+    for metric in ("queries", "duplicates"):
+        limit = budget.get(metric)
+        if limit is not None and report[metric] > limit:
+            violations.append(f"{metric} {report[metric]} > {limit}")
+    return violations
+
+
+def enforce_budget(report):
+    """Registra (ou, com QUERY_BUDGET_RAISE, levanta) as violações do orçamento da view"""
+    budget = view_budget(report["view"])
+    if budget is None:
+        return []
+    violations = budget_violations(report, budget)
+    if violations:
+        shapes = "".join(f"\n  {count}x {shape}" for shape, count in list(report["duplicated_shapes"].items())[:5])
+        message = (
+            f"Orçamento de consultas excedido em {report['view']}: {', '.join(violations)} "
+            f"({report['sql_ms']} ms em SQL){shapes}"
+        )
+        if getattr(settings, "QUERY_BUDGET_RAISE", False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return violations
+
+
+def publish(report):
+    with _listeners_lock:
+        for listener in _listeners:
+            listener.append(report)
+
+
+@contextmanager
+def capture_view_queries():
+    """
+    Auxiliar de testes: coleta os relatórios das requisições feitas no bloco.
+
+        with capture_view_queries() as reports:
+            self.client.get(url)
+        self.assertEqual(reports[0]["duplicates"], 0)
+    """
+    reports = []
+    with _listeners_lock:
+        _listeners.append(reports)
+    try:
+        yield reports
+    finally:
+        with _listeners_lock:
+            _listeners.remove(reports)
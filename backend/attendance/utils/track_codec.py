@@ -0,0 +1,212 @@
+import numpy as np
+
+from attendance.utils.trajectory import EARTH_RADIUS_KM, to_seconds
+
+
+# Compressão de trajetórias de jornadas encerradas:
+# 1. simplificação Douglas-Peucker com distância sincronizada no tempo (SED): o erro de um
+#    ponto descartado é medido contra a posição interpolada no mesmo instante no trecho
+#    simplificado, então a trilha reconstruída fica dentro da tolerância em qualquer horário;
+# 2. codificação delta dos pontos mantidos (micrograus e segundos) em varints zigzag.
+
+FORMAT_VERSION = 1
+COORDINATE_SCALE = 1_000_000  # micrograus, mesma precisão do DecimalField(decimal_places=6)
+
+# Tamanho de referência de um ponto sem compressão (latitude, longitude e horário em 8 bytes cada)
+RAW_POINT_BYTES = 24
+
+
+def _local_xy_m(latitudes, longitudes):
+    """Projeção plana local (equiretangular) em metros, centrada na latitude média"""
+    scale = EARTH_RADIUS_KM * 1000 * np.pi / 180
+    x = longitudes * np.cos(np.radians(latitudes.mean())) * scale
+    y = latitudes * scale
+    return x, y
+
+
+def synchronized_errors_m(x, y, seconds, kept):
+    """
+    Distância de cada ponto original até a posição interpolada no mesmo instante
+    sobre a trilha formada apenas pelos índices `kept` (ordenados, incluindo extremos).
+    """
+    kept = np.asarray(kept)
+    segment = np.clip(np.searchsorted(seconds[kept], seconds, side="right") - 1, 0, max(len(kept) - 2, 0))
+    start, end = kept[segment], kept[np.minimum(segment + 1, len(kept) - 1)]
+    span = seconds[end] - seconds[start]
+    ratio = np.zeros(len(seconds))
+    np.divide(seconds - seconds[start], span, out=ratio, where=span > 0)
+    ratio = np.clip(ratio, 0, 1)
+    expected_x = x[start] + (x[end] - x[start]) * ratio
+    expected_y = y[start] + (y[end] - y[start]) * ratio
+    return np.hypot(x - expected_x, y - expected_y)
+
+
+def simplify_track(latitudes, longitudes, times, tolerance_m):
+    """
+    Índices dos pontos mantidos pela simplificação Douglas-Peucker (SED) com a tolerância
+    em metros. O primeiro e o último ponto são sempre mantidos.
+    """
+    lat = np.asarray(latitudes, dtype=float)
+    lon = np.asarray(longitudes, dtype=float)
+    seconds = to_seconds(times)
+    count = len(lat)
+    if count <= 2:
+        return list(range(count))
+
+    x, y = _local_xy_m(lat, lon)
+    keep = np.zeros(count, dtype=bool)
+    keep[[0, -1]] = True
+
+    # Pilha em vez de recursão: trilhas longas não estouram o limite de recursão
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        inner = np.arange(first + 1, last)
+        errors = synchronized_errors_m(x[first:last + 1], y[first:last + 1], seconds[first:last + 1], [0, last - first])
+        errors = errors[1:-1]
+        worst = int(np.argmax(errors))
+        if errors[worst] > tolerance_m:
+            split = int(inner[worst])
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return np.flatnonzero(keep).tolist()
+
+
+def downsample_track(latitudes, longitudes, max_points):
+    """
+    Índices de no máximo max_points pontos escolhidos por LTTB (Largest-Triangle-Three-Buckets)
+    sobre a projeção plana: os pontos intermediários são divididos em max_points - 2 faixas e de
+    cada uma fica o ponto que forma o maior triângulo com o último ponto escolhido e a média da
+    faixa seguinte (curvas e desvios são preservados). O primeiro e o último ponto são sempre mantidos.
+    """
+    lat = np.asarray(latitudes, dtype=float)
+    lon = np.asarray(longitudes, dtype=float)
+    count = len(lat)
+    if count <= max_points or count <= 2:
+        return list(range(count))
+    if max_points < 3:
+        return [0, count - 1][:max(max_points, 0)]
+
+    x, y = _local_xy_m(lat, lon)
+    edges = np.linspace(1, count - 1, max_points - 1).astype(int)
+    kept = [0]
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        previous = kept[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        kept.append(int(start) + int(np.argmax(areas)))
+    kept.append(count - 1)
+    return kept
+
+
+def _write_varint(buffer, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            buffer.append(byte | 0x80)
+        else:
+            buffer.append(byte)
+            return
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def encode_track(latitudes, longitudes, epoch_seconds):
+    """
+    Codifica a trilha em um blob binário:
+    versão, quantidade de pontos e, para cada ponto, deltas (latitude, longitude em micrograus,
+    horário em segundos) em relação ao anterior; o primeiro ponto usa deltas a partir de zero.
+    """
+    lat = np.rint(np.asarray(latitudes, dtype=float) * COORDINATE_SCALE).astype(np.int64)
+    lon = np.rint(np.asarray(longitudes, dtype=float) * COORDINATE_SCALE).astype(np.int64)
+    seconds = np.rint(np.asarray(epoch_seconds, dtype=float)).astype(np.int64)
+
+    buffer = bytearray([FORMAT_VERSION])
+    _write_varint(buffer, len(lat))
+    for column in (lat, lon, seconds):
+        for delta in np.diff(column, prepend=0).tolist():
+            _write_varint(buffer, _zigzag(delta))
+    return bytes(buffer)
+
+
+def decode_track(data):
+    """Reconstrói (latitudes, longitudes, horários em segundos epoch) a partir do blob"""
+    data = bytes(data)
+    if not data or data[0] != FORMAT_VERSION:
+        raise ValueError("Formato de trilha desconhecido")
+    count, offset = _read_varint(data, 1)
+
+    columns = []
+    for _ in range(3):
+        deltas = []
+        for _ in range(count):
+            value, offset = _read_varint(data, offset)
+            deltas.append(_unzigzag(value))
+        columns.append(np.cumsum(np.array(deltas, dtype=np.int64)))
+
+    lat, lon, seconds = columns
+    return lat / COORDINATE_SCALE, lon / COORDINATE_SCALE, seconds
+
+
+def compress_track(latitudes, longitudes, epoch_seconds, tolerance_m):
+    """
+    Simplifica e codifica a trilha. Retorna (blob, estatísticas), com o erro máximo medido
+    sobre a trilha decodificada (inclui o arredondamento para micrograus e segundos).
+    """
+    lat = np.asarray(latitudes, dtype=float)
+    lon = np.asarray(longitudes, dtype=float)
+    seconds = np.asarray(epoch_seconds, dtype=float)
+
+    kept = simplify_track(lat, lon, seconds, tolerance_m)
+    data = encode_track(lat[kept], lon[kept], seconds[kept])
+
+    max_error_m = 0.0
+    if len(lat):
+        decoded_lat, decoded_lon, decoded_seconds = decode_track(data)
+        x, y = _local_xy_m(np.concatenate((lat, decoded_lat)), np.concatenate((lon, decoded_lon)))
+        original, decoded = slice(0, len(lat)), slice(len(lat), None)
+        errors = synchronized_errors_m(
+            np.concatenate((x[original], x[decoded])),
+            np.concatenate((y[original], y[decoded])),
+            np.concatenate((seconds, decoded_seconds.astype(float))),
+            np.arange(len(lat), len(lat) + len(kept)),
+        )
+        max_error_m = float(errors[:len(lat)].max())
+
+    return data, {
+        "original_points": len(lat),
+        "stored_points": len(kept),
+        "size_bytes": len(data),
+        "compression_ratio": (len(lat) * RAW_POINT_BYTES / len(data)) if len(lat) else 1.0,
+        "max_error_m": max_error_m,
+    }
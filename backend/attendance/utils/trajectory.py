@@ -0,0 +1,153 @@
+import numpy as np
+
+
+# Métricas de trajetória em uma única passada vetorizada (NumPy) sobre os pontos da jornada.
+# Modos de precisão:
+# - haversine: esfera de raio médio (mesma fórmula de antifraud.haversine)
+# - equirectangular: aproximação plana, suficiente para distâncias de poucos km
+# - geodesic: elipsoide WGS-84 (Vincenty), equivalente ao geodesic do geopy
+
+HAVERSINE = "haversine"
+EQUIRECTANGULAR = "equirectangular"
+GEODESIC = "geodesic"
+MODES = (HAVERSINE, EQUIRECTANGULAR, GEODESIC)
+
+EARTH_RADIUS_KM = 6371
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _equirectangular_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    x = (lon2 - lon1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.hypot(x, y)
+
+
+def _vincenty_km(lat1, lon1, lat2, lon2):
+    """
+    Fórmula inversa de Vincenty no elipsoide WGS-84, iterada para todos os pares ao mesmo tempo.
+    Pares quase antipodais que não convergem usam a distância haversine.
+    """
+    a, f = WGS84_A_KM, WGS84_F
+    b = (1 - f) * a
+
+    L = np.radians(lon2 - lon1)
+    u1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Linha equatorial: cos2_alpha = 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            previous = lam
+            lam = L + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            converged = np.abs(lam - previous) < VINCENTY_TOLERANCE
+            if converged.all():
+                break
+
+        u_sq = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (
+            cos_2sigma_m + big_b / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+        distance = b * big_a * (sigma - delta_sigma)
+
+    return np.where(converged, distance, _haversine_km(lat1, lon1, lat2, lon2))
+
+
+_DISTANCE_FUNCTIONS = {
+    HAVERSINE: _haversine_km,
+    EQUIRECTANGULAR: _equirectangular_km,
+    GEODESIC: _vincenty_km,
+}
+
+
+def pairwise_distance_km(lat1, lon1, lat2, lon2, mode=HAVERSINE):
+    """Distância em km entre pares de pontos (arrays de mesmo tamanho)"""
+    if mode not in _DISTANCE_FUNCTIONS:
+        raise ValueError(f"Modo de distância inválido: {mode}")
+    arrays = [np.asarray(values, dtype=float) for values in (lat1, lon1, lat2, lon2)]
+    return _DISTANCE_FUNCTIONS[mode](*arrays)
+
+
+def to_seconds(times):
+    """
+    Converte os horários dos pontos em segundos relativos ao primeiro ponto.
+    Aceita datetimes, datetime64 ou números (segundos).
+    """
+    if len(times) == 0:
+        return np.zeros(0)
+    first = times[0]
+    if hasattr(first, "timestamp"):
+        return np.array([(moment - first).total_seconds() for moment in times], dtype=float)
+
+    values = np.asarray(times)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return (values - values[0]) / np.timedelta64(1, "s")
+    values = values.astype(float)
+    return values - values[0]
+
+
+def analyze_trajectory(latitudes, longitudes, times, mode=HAVERSINE):
+    """
+    Calcula, para os pontos de uma jornada em ordem cronológica:
+    - segment_km: distância de cada trecho (ponto i-1 -> i), tamanho n-1
+    - elapsed_s: intervalo de cada trecho em segundos
+    - speed_kmh: velocidade de cada trecho (nan quando o intervalo é zero ou negativo)
+    - acceleration_ms2: variação de velocidade entre trechos consecutivos, tamanho n-2
+    - cumulative_km: distância acumulada até cada ponto, tamanho n
+    - total_km: distância total
+    """
+    lat = np.asarray(latitudes, dtype=float)
+    lon = np.asarray(longitudes, dtype=float)
+    seconds = to_seconds(times)
+
+    segment_km = pairwise_distance_km(lat[:-1], lon[:-1], lat[1:], lon[1:], mode=mode)
+    elapsed_s = np.diff(seconds)
+
+    speed_kmh = np.full(elapsed_s.shape, np.nan)
+    np.divide(segment_km * 3600, elapsed_s, out=speed_kmh, where=elapsed_s > 0)
+
+    # Aceleração entre trechos, no ponto central (m/s²)
+    speed_ms = speed_kmh / 3.6
+    middle_s = (elapsed_s[:-1] + elapsed_s[1:]) / 2
+    acceleration_ms2 = np.full(middle_s.shape, np.nan)
+    np.divide(np.diff(speed_ms), middle_s, out=acceleration_ms2, where=middle_s > 0)
+
+    cumulative_km = np.concatenate(([0.0], np.cumsum(segment_km)))
+
+    return {
+        "segment_km": segment_km,
+        "elapsed_s": elapsed_s,
+        "speed_kmh": speed_kmh,
+        "acceleration_ms2": acceleration_ms2,
+        "cumulative_km": cumulative_km,
+        "total_km": float(cumulative_km[-1]) if len(cumulative_km) else 0.0,
+    }
@@ -1,25 +1,38 @@
 from django.contrib.auth.decorators import login_required
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.authentication import SessionAuthentication
-from django.http import JsonResponse, HttpResponse
-from rest_framework.exceptions import PermissionDenied
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.urls import reverse
+from rest_framework.exceptions import NotFound, PermissionDenied
 from decimal import Decimal
+from django.conf import settings
 from django.utils import timezone
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from accounts.models import Employee, UserDevice
-from .models import WorkShift, WorkShiftLocation, FraudAlert
+from rest_framework.pagination import PageNumberPagination
+from accounts.models import Employee
+from accounts.authentication import DeviceBoundJWTAuthentication
+from .models import WorkShift, WorkShiftLastPosition, FraudAlert
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
-from django.utils.dateparse import parse_date
-from math import radians, cos, sin, asin, sqrt
 from attendance.services.workshift_service import end_shift, start_shift, validate_user_device, track_location, \
-    adjust_shift_end, build_shift_report_row, totalize_report, get_workshifts_for_user
-from .utils.antifraud import haversine
-from .serializers import WorkShiftSerializer, WorkShiftLocationSerializer, FraudAlertSerializer
-from drf_spectacular.utils import (extend_schema, OpenApiExample, OpenApiResponse)
-from django.template.loader import render_to_string
-from weasyprint import HTML
+    adjust_shift_end, build_shift_report_row, report_totals, with_shift_metrics, track_locations_batch
+from .utils.dates import date_range_q
+from .pagination import ShiftKeysetPagination, FraudAlertKeysetPagination
+from .services.report_pdf import get_or_render_report_pdf, submit_report_pdf_job, cached_pdf_path, JOB_DONE, \
+    JOB_FAILED, discard_job as discard_report_pdf_job, get_job as get_report_pdf_job
+from .services.report_export import export_queryset, stream_export_csv, stream_export_xlsx
+from .services.position_clusters import CELLS_PER_TILE, CLUSTER_REFRESH_SECONDS, MAX_BBOX_CELLS, MAX_CLUSTER_MEMBERS, \
+    MAX_CLUSTER_ZOOM, bbox_cells, cell_size_deg, cluster_cache
+from .services.position_feed import position_changes
+from .services.position_index import DEFAULT_MAX_FIX_AGE_SECONDS, position_index
+from .services.track_compression import decode_shift_track, get_shift_track, track_stats
+from .services.track_playback import DEFAULT_PLAYBACK_POINTS, MAX_PLAYBACK_POINTS, shift_playback
+from .services.risk_score import get_risk_score, resolve_alerts, top_risky_employees
+from .services.alert_feed import alert_feed_condition, alert_feed_response
+from .serializers import WorkShiftSerializer, WorkShiftLocationSerializer, FraudAlertSerializer, \
+    WorkShiftLocationBatchSerializer
+from drf_spectacular.utils import (extend_schema, OpenApiExample, OpenApiParameter, OpenApiResponse)
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from datetime import datetime
@@ -71,26 +84,9 @@ def workshift_report_pdf_api(request):
     except ValueError:
         start_date = end_date = None
 
-    # Pega os workshifts e totais
+    # PDF do cache (mesmo período, assinatura e dados), ou renderizado agora
 
-    rows, totals = get_workshifts_for_user(user, start_date, end_date)
-
-    html_string = render_to_string(
-        "attendance/workshift_report_pdf.html",
-        {
-            "user": user,
-            "employee": employee,
-            "rows": rows,
-            "totals": totals,
-            "start_date": start_date,
-            "end_date": end_date,
-            "signature_base64": employee.signature,
-            "signature_rotated": True,
-            "signed_at": timezone.now(),
-        }
-    )
-
-    pdf_file = HTML(string=html_string).write_pdf()
+    pdf_file = get_or_render_report_pdf(user, start_date, end_date, employee.signature)
 
 
     # Retorna PDF como resposta
@@ -108,22 +104,7 @@ def workshift_report_pdf_view(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
 
-    # Pega os workshifts e totais
-    rows, totals = get_workshifts_for_user(user, start_date, end_date)
-
-    html_string = render_to_string(
-        "attendance/workshift_report_pdf.html",
-        {
-            "user": user,
-            "rows": rows,
-            "totals": totals,
-            "start_date": start_date,
-            "end_date": end_date,
-            "signature_base64": request.GET.get("signature")  # Base64 do mobile
-        }
-    )
-
-    pdf_file = HTML(string=html_string).write_pdf()
+    pdf_file = get_or_render_report_pdf(user, start_date, end_date, request.GET.get("signature"))
 
     response = HttpResponse(pdf_file, content_type="application/pdf")
     response['Content-Disposition'] = f'attachment; filename="relatorio_jornadas_{user.username}.pdf"'
@@ -131,31 +112,137 @@ def workshift_report_pdf_view(request):
 
 
 
-def haversine(lat1, lon1, lat2, lon2):
-    """
-    Retorna distancia em km entre dois pontos GPS
-    """
-    R = 6371
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 -lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    return R * c
+def _report_pdf_job_response(request, job):
+    job_id = job["job_id"]
+    data = {
+        "job_id": job_id,
+        "status": job["status"],
+        "status_url": request.build_absolute_uri(reverse("workshift-report-pdf-job", args=[job_id])),
+    }
+    if job["status"] == JOB_DONE:
+        data["download_url"] = request.build_absolute_uri(reverse("workshift-report-pdf-job-download", args=[job_id]))
+    if job["status"] == JOB_FAILED:
+        data["error"] = job.get("error")
+    return data
+
+
+def _get_own_report_pdf_job(request, job_id):
+    job = get_report_pdf_job(job_id)
+    if not job or (job.get("user_id") != request.user.pk and not request.user.is_staff):
+        return None
+    return job
+
+
+@extend_schema(
+    tags=["Reports"],
+    summary="Solicitar PDF do espelho de ponto",
+    description=(
+        "Agenda a geração do PDF em segundo plano e retorna o job. "
+        "PDFs idênticos (mesmo período, assinatura e dados) são servidos do cache."
+    ),
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def workshift_report_pdf_job_submit(request):
+    try:
+        employee = request.user.employee
+    except Employee.DoesNotExist:
+        return Response({"error": "Funcionário não encontrado"}, status=status.HTTP_400_BAD_REQUEST)
+
+    start_date = request.data.get("start_date")
+    end_date = request.data.get("end_date")
+    try:
+        if start_date:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        if end_date:
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except ValueError:
+        return Response({"error": "Formato de data inválido (AAAA-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = submit_report_pdf_job(request.user, start_date, end_date, employee.signature)
+    return Response(_report_pdf_job_response(request, job), status=status.HTTP_202_ACCEPTED)
+
+
+@extend_schema(tags=["Reports"], summary="Situação do job de PDF")
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def workshift_report_pdf_job_status(request, job_id):
+    job = _get_own_report_pdf_job(request, job_id)
+    if not job:
+        return Response({"error": "Job não encontrado"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(_report_pdf_job_response(request, job))
+
+
+@extend_schema(tags=["Reports"], summary="Download do PDF gerado")
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def workshift_report_pdf_job_download(request, job_id):
+    job = _get_own_report_pdf_job(request, job_id)
+    if not job:
+        return Response({"error": "Job não encontrado"}, status=status.HTTP_404_NOT_FOUND)
+    if job["status"] != JOB_DONE:
+        return Response(_report_pdf_job_response(request, job), status=status.HTTP_409_CONFLICT)
+
+    try:
+        pdf_file = open(cached_pdf_path(job_id), "rb")
+    except FileNotFoundError:
+        # PDF removido do cache ou gerado em outro servidor: o job é descartado e o cliente o solicita de novo
+        discard_report_pdf_job(job_id)
+        return Response({"error": "PDF não disponível, solicite o relatório novamente"},
+                        status=status.HTTP_404_NOT_FOUND)
+
+    return FileResponse(
+        pdf_file,
+        as_attachment=True,
+        filename=f"relatorio_jornadas_{job_id[:12]}.pdf",
+        content_type="application/pdf",
+    )
+
 
-def validate_shift_location(lat1, lon1, lat2, lon2, max_distance_m=200):
-    distance_km = haversine(lat1, lon1, lat2, lon2)
-    distance_m = distance_km * 1000
-    if distance_m > max_distance_m:
-        raise PermissionDenied(f'Fora do raio permitido ({int(distance_m)}m)')
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
 
 
-def validate_user_device(user, device_id):
+@extend_schema(
+    tags=["Reports"],
+    summary="Exportar jornadas (CSV/XLSX)",
+    description=(
+        "Exporta as jornadas de todos os funcionários, ou dos informados em `employee` "
+        "(ids separados por vírgula), no período `start_date`/`end_date`. "
+        "O arquivo é gerado em streaming."
+    ),
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def workshift_export(request, file_format):
+    if file_format not in EXPORT_CONTENT_TYPES:
+        return Response({"error": "Formato não suportado (csv ou xlsx)"}, status=status.HTTP_404_NOT_FOUND)
+
+    start_date = request.query_params.get("start_date")
+    end_date = request.query_params.get("end_date")
     try:
-        device = UserDevice.objects.get(user=user)
-    except UserDevice.DoesNotExist:
-        raise PermissionDenied('Dispositivo não registrado')
-    if device.device_id != device_id:
-        raise PermissionDenied('Dispositivo não autorizado')
+        if start_date:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        if end_date:
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        employee_ids = [
+            int(value) for value in request.query_params.get("employee", "").split(",") if value.strip()
+        ]
+    except ValueError:
+        return Response({"error": "Parâmetros inválidos"}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = export_queryset(employee_ids, start_date, end_date)
+    content = stream_export_xlsx(queryset) if file_format == "xlsx" else stream_export_csv(queryset)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[file_format])
+    response["Content-Disposition"] = (
+        f'attachment; filename="jornadas_{timezone.localdate():%Y%m%d}.{file_format}"'
+    )
+    return response
+
+
 
 def parse_coordinate(value):
     """Tenta converter para float, retorna None se invalido"""
@@ -182,7 +269,27 @@ def create_fraud_alert(user, fraud_type, description, work_shift=None):
 
 
 
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_IDEMPOTENCY_KEY_LENGTH = 64
+
+IDEMPOTENCY_PARAMETER = OpenApiParameter(
+    IDEMPOTENCY_HEADER, str, location=OpenApiParameter.HEADER,
+    description=(
+        "Chave gerada pelo aplicativo para a requisição (ex.: UUID). Reenvios com a mesma chave "
+        "(fila offline) não duplicam o registro."
+    ),
+)
+
+
+def get_idempotency_key(request):
+    key = request.headers.get(IDEMPOTENCY_HEADER, "").strip()
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise PermissionDenied(f"{IDEMPOTENCY_HEADER} excede {MAX_IDEMPOTENCY_KEY_LENGTH} caracteres")
+    return key or None
+
+
 class StartShiftView(APIView):
+    authentication_classes = [DeviceBoundJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     @extend_schema(
         tags=["Attendance"],
@@ -190,7 +297,9 @@ class StartShiftView(APIView):
         description=(
             'Inicia uma nova jornada de trabalho para o colaborador autenticado. '
             'É obrigatorio informar o dispositivo e a localização inicial. '
+            'timestamp (opcional) é o horário do dispositivo, para inícios reenviados após perda de sinal. '
         ),
+        parameters=[IDEMPOTENCY_PARAMETER],
         request={
             "application/json":{
                 "type": "object",
@@ -206,6 +315,10 @@ class StartShiftView(APIView):
                     "longitude": {
                         "type": "number",
                         "example": -46.6333
+                    },
+                    "timestamp": {
+                        "type": "string",
+                        "example": "2025-01-01T08:00:00-03:00"
                     }
                 },
                 "required": ["device_id", "latitude", "longitude"]
@@ -252,7 +365,9 @@ class StartShiftView(APIView):
             shift = start_shift(
                 user,
                 request.data.get("latitude"),
-                request.data.get("longitude")
+                request.data.get("longitude"),
+                timestamp=request.data.get("timestamp"),
+                idempotency_key=get_idempotency_key(request),
             )
 
         except PermissionDenied as e:
@@ -266,14 +381,17 @@ class StartShiftView(APIView):
 
 
 class EndShiftView(APIView):
+    authentication_classes = [DeviceBoundJWTAuthentication]
     permission_classes = [IsAuthenticated]
     @extend_schema(
         tags=['Attendance'],
         summary="Encerrar jornada de trabalho",
         description=(
             "Encerra a jornada ativa do colaborador autenticado. "
-            "É obrigatório informar a localização final."
+            "É obrigatório informar a localização final. "
+            "timestamp (opcional) é o horário do dispositivo, para encerramentos reenviados após perda de sinal."
         ),
+        parameters=[IDEMPOTENCY_PARAMETER],
         request={
             "application/json": {
                 "type": "object",
@@ -285,6 +403,10 @@ class EndShiftView(APIView):
                     "longitude": {
                         "type": "number",
                         "example": -46.6340
+                    },
+                    "timestamp": {
+                        "type": "string",
+                        "example": "2025-01-01T17:00:00-03:00"
                     }
                 },
                 "required": ["latitude", "longitude"]
@@ -327,9 +449,15 @@ class EndShiftView(APIView):
                 {'error': 'device_id é obrigatorio'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        validate_user_device(request.user, device_id)
+        validate_user_device(user, device_id)
         try:
-            shift = end_shift(user, request.data.get("latitude"), request.data.get("longitude"))
+            shift = end_shift(
+                user,
+                request.data.get("latitude"),
+                request.data.get("longitude"),
+                timestamp=request.data.get("timestamp"),
+                idempotency_key=get_idempotency_key(request),
+            )
         except PermissionDenied as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -345,6 +473,7 @@ class ShiftListView(generics.ListAPIView):
     """
     serializer_class = WorkShiftSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ShiftKeysetPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -406,12 +535,14 @@ class ShiftListAllView(generics.ListAPIView):
     queryset = WorkShift.objects.all()
     serializer_class = WorkShiftSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = ShiftKeysetPagination
 
 
 
 class ShiftFilteredView(generics.ListAPIView):
     serializer_class = WorkShiftSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ShiftKeysetPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -422,9 +553,9 @@ class ShiftFilteredView(generics.ListAPIView):
         status = self.request.query_params.get('status')
 
         if start_date:
-            queryset = queryset.filter(start_time__date__gte=parse_date(start_date))
+            queryset = queryset.filter(date_range_q("start_time", start_date=start_date))
         if end_date:
-            queryset = queryset.filter(end_time__date__lte=parse_date(end_date))
+            queryset = queryset.filter(date_range_q("end_time", end_date=end_date))
         if status:
             if status.lower() == "open":
                 queryset = queryset.filter(end_time__isnull=True)
@@ -434,6 +565,12 @@ class ShiftFilteredView(generics.ListAPIView):
 
 
 
+class ShiftReportPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
 class ShiftReportView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
@@ -442,7 +579,8 @@ class ShiftReportView(APIView):
         tags=['Attendance'],
         summary="Relatorio de jornadas",
         description=("Retorna relatorios de entrada e saida com duração, "
-                     "atrasos, horas extras e totalização"
+                     "atrasos, horas extras e totalização. "
+                     "As linhas são paginadas (page, page_size); os totais cobrem todo o período."
                      )
     )
     def get(self, request):
@@ -455,25 +593,24 @@ class ShiftReportView(APIView):
             queryset = WorkShift.objects.filter(employee=employee)
         except Employee.DoesNotExist:
             return Response(
-                {"rows": [], "totals": {}},
+                {"count": 0, "next": None, "previous": None, "rows": [], "totals": {}},
                 status=status.HTTP_200_OK
             )
 
-        if start_date:
-            queryset = queryset.filter(start_time__date__gte=parse_date(start_date))
-        if end_date:
-            queryset = queryset.filter(start_time__date__lte=parse_date(end_date))
+        queryset = queryset.filter(date_range_q("start_time", start_date, end_date))
 
-        queryset = queryset.order_by("start_time")
+        queryset = with_shift_metrics(queryset.select_related("employee__user")).order_by("start_time", "id")
 
-        rows = []
-        for shift in queryset:
-            row = build_shift_report_row(shift)
-            rows.append(row)
+        totals = report_totals(employee.pk, start_date, end_date)
 
-        totals = totalize_report(rows)
+        paginator = ShiftReportPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        rows = [build_shift_report_row(shift) for shift in page]
 
         return Response({
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
             "rows": rows,
             "totals": totals
         }, status=status.HTTP_200_OK)
@@ -481,6 +618,7 @@ class ShiftReportView(APIView):
 
 
 class ShiftTrackingView(APIView):
+    authentication_classes = [DeviceBoundJWTAuthentication]
     permission_classes = [IsAuthenticated]
     @extend_schema(
         tags=["Tracking"],
@@ -490,6 +628,7 @@ class ShiftTrackingView(APIView):
             "que estão com jornada ativa no momento. "
             "Endpoint utilizado pelo painel da logística."
         ),
+        parameters=[IDEMPOTENCY_PARAMETER],
         responses={
             200: OpenApiResponse(
                 description="Lista de colaboradores ativos com localização",
@@ -526,13 +665,101 @@ class ShiftTrackingView(APIView):
         serializer.is_valid(raise_exception=True)
 
         try:
-            track_location(user, serializer.validated_data["latitude"], serializer.validated_data["longitude"])
+            outcome = track_location(
+                user,
+                serializer.validated_data["latitude"],
+                serializer.validated_data["longitude"],
+                timestamp=request.data.get("timestamp"),
+                idempotency_key=get_idempotency_key(request),
+            )
         except PermissionDenied as e:
             return Response({"detail": str(e)}, status=400)
 
+        if outcome == "duplicate":
+            return Response({"detail": "Localização já registrada"}, status=200)
         return Response({"detail": "Localização registrada com sucesso"}, status=201)
 
 
+class ShiftTrackingBatchView(APIView):
+    authentication_classes = [DeviceBoundJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    @extend_schema(
+        tags=["Tracking"],
+        summary="Envio de localizações em lote",
+        description=(
+            "Recebe um lote de localizações com o horário do dispositivo. "
+            "As regras de intervalo mínimo e velocidade são aplicadas ao lote inteiro "
+            "e o resultado é informado ponto a ponto. Pontos anteriores ao último registrado "
+            "(fila offline) são encaixados na trilha e avaliados contra os pontos vizinhos; "
+            "pontos com idempotency_key já registrada retornam \"duplicate\"."
+        ),
+        request={
+            "application/json": {
+                "type": "object",
+                "properties": {
+                    "device_id": {"type": "string", "example": "DEVICE123"},
+                    "fixes": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "latitude": {"type": "number", "example": -23.5505},
+                                "longitude": {"type": "number", "example": -46.6333},
+                                "timestamp": {"type": "string", "example": "2025-01-01T10:45:00-03:00"},
+                                "idempotency_key": {"type": "string", "example": "3f1c9a4e-5b7d-4e8a-9c2f-1a2b3c4d5e6f"},
+                            },
+                            "required": ["latitude", "longitude", "timestamp"]
+                        }
+                    }
+                },
+                "required": ["device_id", "fixes"]
+            }
+        },
+        responses={
+            201: OpenApiResponse(
+                description="Lote processado",
+                examples=[
+                    OpenApiExample(
+                        "Lote",
+                        value={
+                            "accepted": 1,
+                            "rejected": 1,
+                            "duplicates": 0,
+                            "results": [
+                                {"index": 0, "status": "accepted"},
+                                {"index": 1, "status": "rejected", "detail": "Aguarde antes de enviar nova localização"}
+                            ]
+                        }
+                    )
+                ]
+            ),
+            400: OpenApiResponse(description="Lote inválido ou nenhum turno aberto"),
+            401: OpenApiResponse(description="Usuário não autenticado")
+        }
+    )
+
+    def post(self, request):
+        user = request.user
+        serializer = WorkShiftLocationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        validate_user_device(user, serializer.validated_data["device_id"])
+
+        try:
+            results = track_locations_batch(user, serializer.validated_data["fixes"])
+        except PermissionDenied as e:
+            return Response({"detail": str(e)}, status=400)
+
+        counts = {outcome: sum(1 for result in results if result["status"] == outcome)
+                  for outcome in ("accepted", "rejected", "duplicate")}
+        return Response({
+            "accepted": counts["accepted"],
+            "rejected": counts["rejected"],
+            "duplicates": counts["duplicate"],
+            "results": results
+        }, status=201)
+
+
 class ShiftTrackingDashboardView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
@@ -543,28 +770,349 @@ class ShiftTrackingDashboardView(APIView):
         description="Retorna a última localização dos colaboradores com turno ativo",
     )
     def get(self, request):
-        active_shifts = WorkShift.objects.filter(
-            end_time__isnull=True
-        ).select_related("employee", "employee__user")
+        positions = WorkShiftLastPosition.objects.filter(
+            work_shift__end_time__isnull=True
+        ).select_related("work_shift__employee__user")
+
+        return Response([tracking_entry(position) for position in positions])
+
+
+def tracking_entry(position, with_inspector=True):
+    shift = position.work_shift
+    entry = {
+        "shift_id": shift.id,
+        "latitude": float(position.latitude),
+        "longitude": float(position.longitude),
+        "last_update": position.recorded_at,
+    }
+    if with_inspector:
+        entry.update({
+            "inspector_id": shift.employee.id,
+            "name": shift.employee.user.get_full_name() or shift.employee.user.username,
+            "phone": shift.employee.user.phone,
+        })
+    return entry
 
-        result = []
 
-        for shift in active_shifts:
-            last_location = WorkShiftLocation.objects.filter(
-                work_shift=shift
-            ).order_by("-created_at").first()
+class ShiftTrackingFeedView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
 
-            if not last_location:
-                continue
+    @extend_schema(
+        tags=["Tracking"],
+        summary="Feed incremental do tracking",
+        description=(
+            "Alterações das últimas posições desde a sequência `since` (a `seq` da resposta anterior): "
+            "apenas as jornadas que se moveram e as jornadas encerradas (`removed`). Nome e telefone só "
+            "vêm nas jornadas que o cliente ainda não conhece. Com `reset` verdadeiro (since ausente ou "
+            "antigo demais), `positions` traz todas as jornadas abertas e o cliente deve descartar o que tinha. "
+            "Gravações dos últimos segundos podem vir de novo na resposta seguinte."
+        ),
+        parameters=[
+            OpenApiParameter("since", int, description="Última sequência recebida (0 ou ausente = lista completa)"),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description="Alterações",
+                examples=[
+                    OpenApiExample(
+                        "Alterações",
+                        value={
+                            "seq": 1843,
+                            "reset": False,
+                            "positions": [
+                                {"shift_id": 12, "latitude": -23.5505, "longitude": -46.6333,
+                                 "last_update": "2025-01-01T08:10:00Z"},
+                                {"shift_id": 15, "latitude": -23.56, "longitude": -46.64,
+                                 "last_update": "2025-01-01T08:11:00Z", "inspector_id": 4,
+                                 "name": "João Silva", "phone": "11999999999"},
+                            ],
+                            "removed": [9],
+                        }
+                    )
+                ]
+            ),
+            400: OpenApiResponse(description="Parâmetro inválido"),
+        }
+    )
+    def get(self, request):
+        try:
+            since = int(request.query_params.get("since", 0))
+        except ValueError:
+            return Response({"error": "Sequência inválida"}, status=status.HTTP_400_BAD_REQUEST)
+
+        seq, reset, positions, removed = position_changes(since)
+        return Response({
+            "seq": seq,
+            "reset": reset,
+            "positions": [
+                tracking_entry(position, with_inspector=reset or position.first_seq > since)
+                for position in positions
+            ],
+            "removed": removed,
+        })
 
+
+class ShiftTrackingClustersView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        tags=["Tracking"],
+        summary="Vistoriadores agrupados para o mapa",
+        description=(
+            "Agrupa as últimas posições das jornadas abertas em uma grade do nível de zoom do mapa "
+            f"({CELLS_PER_TILE}x{CELLS_PER_TILE} células por tile) e retorna os grupos dentro da caixa "
+            "`bbox` (sul,oeste,norte,leste), com centróide, quantidade e ids das jornadas "
+            f"(até {MAX_CLUSTER_MEMBERS} por grupo). Os agregados de cada zoom ficam em cache por "
+            f"{CLUSTER_REFRESH_SECONDS} s e ignoram posições com mais de {DEFAULT_MAX_FIX_AGE_SECONDS // 60} min. "
+            f"A caixa pode cobrir até {MAX_BBOX_CELLS} células do zoom; em zoom alto ela é obrigatória."
+        ),
+        parameters=[
+            OpenApiParameter("zoom", int, required=True, description=f"Nível de zoom (0 a {MAX_CLUSTER_ZOOM})"),
+            OpenApiParameter("bbox", str, description="sul,oeste,norte,leste (padrão: mundo inteiro, só em zoom baixo)"),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description="Grupos",
+                examples=[
+                    OpenApiExample(
+                        "Grupos",
+                        value={
+                            "zoom": 12,
+                            "cell_size_deg": 0.021973,
+                            "clusters": [
+                                {"latitude": -23.5505, "longitude": -46.6333, "count": 3, "shift_ids": [12, 15, 18]}
+                            ],
+                        }
+                    )
+                ]
+            ),
+            400: OpenApiResponse(description="Parâmetros inválidos"),
+        }
+    )
+    def get(self, request):
+        try:
+            zoom = int(request.query_params["zoom"])
+            bbox = request.query_params.get("bbox")
+            bbox = tuple(float(value) for value in bbox.split(",")) if bbox else None
+        except (KeyError, ValueError):
+            return Response({"error": "zoom e bbox válidos são obrigatórios"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= zoom <= MAX_CLUSTER_ZOOM or (bbox is not None and len(bbox) != 4):
+            return Response({"error": "zoom e bbox válidos são obrigatórios"}, status=status.HTTP_400_BAD_REQUEST)
+        if bbox_cells(zoom, bbox) > MAX_BBOX_CELLS:
+            return Response(
+                {"error": f"Área grande demais para o zoom (máximo de {MAX_BBOX_CELLS} células): informe um bbox menor"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response({
+            "zoom": zoom,
+            "cell_size_deg": round(cell_size_deg(zoom), 6),
+            "clusters": cluster_cache.clusters(zoom, bbox),
+        })
+
+
+class ShiftTrackView(APIView):
+    authentication_classes = [SessionAuthentication, DeviceBoundJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        tags=["Tracking"],
+        summary="Trilha da jornada",
+        description=(
+            "Retorna a trilha da jornada em ordem cronológica. Jornadas encerradas são lidas "
+            "da trilha comprimida (simplificada com erro máximo de tolerance_m metros); "
+            "compression traz a taxa de compressão e o erro medido. "
+            "Disponível para o próprio colaborador e para administradores."
+        ),
+        responses={
+            200: OpenApiResponse(
+                description="Pontos da trilha",
+                examples=[
+                    OpenApiExample(
+                        "Trilha",
+                        value={
+                            "shift_id": 12,
+                            "points": [
+                                {"latitude": -23.5505, "longitude": -46.6333, "recorded_at": "2025-01-01T08:00:00Z"}
+                            ],
+                            "compression": {
+                                "original_points": 600,
+                                "stored_points": 41,
+                                "size_bytes": 250,
+                                "compression_ratio": 57.6,
+                                "tolerance_m": 10,
+                                "max_error_m": 8.7
+                            }
+                        }
+                    )
+                ]
+            ),
+            404: OpenApiResponse(description="Jornada não encontrada"),
+        }
+    )
+    def get(self, request, pk):
+        shifts = WorkShift.objects.select_related("track")
+        if not request.user.is_staff:
+            shifts = shifts.filter(employee__user=request.user)
+        shift = shifts.filter(pk=pk).first()
+        if shift is None:
+            raise NotFound("Jornada não encontrada")
+
+        track = getattr(shift, "track", None)
+        points = decode_shift_track(track) if track else get_shift_track(shift.id)
+        return Response({
+            "shift_id": shift.id,
+            "points": [
+                {"latitude": latitude, "longitude": longitude, "recorded_at": moment}
+                for latitude, longitude, moment in points
+            ],
+            "compression": track_stats(track) if track else None,
+        })
+
+
+class ShiftPlaybackView(APIView):
+    authentication_classes = [SessionAuthentication, DeviceBoundJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        tags=["Tracking"],
+        summary="Reprodução da trilha da jornada",
+        description=(
+            "Trilha da jornada reduzida a no máximo `max_points` pontos (LTTB, preserva curvas e desvios), "
+            "com o deslocamento em segundos desde o início da jornada, e os alertas de fraude da jornada "
+            "posicionados sobre a trilha. Jornadas encerradas ficam em cache por quantidade de pontos. "
+            "Disponível para o próprio colaborador e para administradores."
+        ),
+        parameters=[
+            OpenApiParameter(
+                "max_points", int,
+                description=f"Máximo de pontos (padrão {DEFAULT_PLAYBACK_POINTS}, de 2 a {MAX_PLAYBACK_POINTS})"
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description="Trilha reduzida",
+                examples=[
+                    OpenApiExample(
+                        "Reprodução",
+                        value={
+                            "shift_id": 12,
+                            "start_time": "2025-01-01T08:00:00Z",
+                            "end_time": "2025-01-01T17:00:00Z",
+                            "original_points": 3200,
+                            "points": [
+                                {"latitude": -23.5505, "longitude": -46.6333, "offset_seconds": 0},
+                                {"latitude": -23.5611, "longitude": -46.6402, "offset_seconds": 540},
+                            ],
+                            "alerts": [
+                                {"id": 7, "fraud_type": "TRACKING", "description": "Velocidade irreal detectada: 180 km/h",
+                                 "offset_seconds": 300, "latitude": -23.556, "longitude": -46.6366}
+                            ],
+                        }
+                    )
+                ]
+            ),
+            400: OpenApiResponse(description="Parâmetro inválido"),
+            404: OpenApiResponse(description="Jornada não encontrada"),
+        }
+    )
+    def get(self, request, pk):
+        try:
+            max_points = int(request.query_params.get("max_points", DEFAULT_PLAYBACK_POINTS))
+        except ValueError:
+            max_points = 0
+        if not 2 <= max_points <= MAX_PLAYBACK_POINTS:
+            return Response(
+                {"error": f"max_points deve estar entre 2 e {MAX_PLAYBACK_POINTS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        shifts = WorkShift.objects.all()
+        if not request.user.is_staff:
+            shifts = shifts.filter(employee__user=request.user)
+        shift = shifts.filter(pk=pk).first()
+        if shift is None:
+            raise NotFound("Jornada não encontrada")
+
+        return Response(shift_playback(shift, max_points))
+
+
+MAX_NEAREST_RESULTS = 50
+
+
+class ShiftTrackingNearestView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        tags=["Tracking"],
+        summary="Vistoriadores mais próximos de um ponto",
+        description=(
+            "Retorna os k vistoriadores com jornada ativa mais próximos do ponto informado, "
+            "a partir do índice espacial em memória das últimas posições. "
+            "Posições mais antigas que max_age (segundos) são ignoradas."
+        ),
+        parameters=[
+            OpenApiParameter("latitude", float, required=True),
+            OpenApiParameter("longitude", float, required=True),
+            OpenApiParameter("k", int, description=f"Quantidade (padrão 5, máximo {MAX_NEAREST_RESULTS})"),
+            OpenApiParameter("max_age", int, description=f"Idade máxima da posição em segundos (padrão {DEFAULT_MAX_FIX_AGE_SECONDS})"),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description="Vistoriadores ordenados pela distância",
+                examples=[
+                    OpenApiExample(
+                        "Mais próximos",
+                        value=[
+                            {
+                                "inspector_id": 3,
+                                "name": "João Silva",
+                                "phone": "11999999999",
+                                "latitude": -23.5505,
+                                "longitude": -46.6333,
+                                "distance_km": 1.27,
+                                "last_update": "2025-01-01T10:45:00Z",
+                                "fix_age_seconds": 42,
+                                "shift_id": 12
+                            }
+                        ]
+                    )
+                ]
+            ),
+            400: OpenApiResponse(description="Parâmetros inválidos"),
+        }
+    )
+    def get(self, request):
+        try:
+            latitude = float(request.query_params["latitude"])
+            longitude = float(request.query_params["longitude"])
+            k = int(request.query_params.get("k", 5))
+            max_age = int(request.query_params.get("max_age", DEFAULT_MAX_FIX_AGE_SECONDS))
+        except (KeyError, ValueError):
+            return Response({"detail": "latitude e longitude válidas são obrigatórias"}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return Response({"detail": "Coordenadas fora do intervalo"}, status=status.HTTP_400_BAD_REQUEST)
+
+        position_index.refresh_if_stale()
+        nearest = position_index.nearest(latitude, longitude, k=min(max(k, 1), MAX_NEAREST_RESULTS), max_age_seconds=max_age)
+
+        employees = Employee.objects.select_related("user").in_bulk([item["employee_id"] for item in nearest])
+        result = []
+        for item in nearest:
+            user = employees[item["employee_id"]].user
             result.append({
-                "inspector_id": shift.employee.id,
-                "name": shift.employee.user.get_full_name() or shift.employee.user.username,
-                "phone": shift.employee.user.phone,
-                "latitude": float(last_location.latitude),
-                "longitude": float(last_location.longitude),
-                "last_update": last_location.created_at,
-                "shift_id": shift.id,
+                "inspector_id": item["employee_id"],
+                "name": user.get_full_name() or user.username,
+                "phone": user.phone,
+                "latitude": item["latitude"],
+                "longitude": item["longitude"],
+                "distance_km": round(item["distance_km"], 3),
+                "last_update": item["recorded_at"],
+                "fix_age_seconds": int(item["fix_age_seconds"]),
+                "shift_id": item["shift_id"],
             })
         return Response(result)
 
@@ -574,6 +1122,7 @@ class FraudAlertListView(generics.ListAPIView):
     serializer_class = FraudAlertSerializer
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = FraudAlertKeysetPagination
     @extend_schema(
         tags=["Fraud"],
         summary="Listar alertas de fraude do usuário",
@@ -605,6 +1154,7 @@ class FraudAlertListView(generics.ListAPIView):
 
     def get_queryset(self):
         return FraudAlert.objects.select_related(
+            "user",
             "work_shift",
             "work_shift__employee",
             "work_shift__employee__user"
@@ -616,6 +1166,7 @@ class FraudAlertAdminListView(generics.ListAPIView):
     serializer_class = FraudAlertSerializer
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = FraudAlertKeysetPagination
 
     @extend_schema(
         tags=["Fraud"],
@@ -649,7 +1200,7 @@ class FraudAlertAdminListView(generics.ListAPIView):
     )
 
     def get_queryset(self):
-        qs = (FraudAlert.objects.select_related("work_shift__employee__user").order_by('-created_at')
+        qs = (FraudAlert.objects.select_related("user", "work_shift__employee__user").order_by('-created_at')
         )
         severity = self.request.query_params.get("severity")
         resolved = self.request.query_params.get("resolved")
@@ -708,8 +1259,7 @@ class FraudAlertResolveView(APIView):
                 {'detail': "Este alerta já está resolvido"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        alert.resolved = True
-        alert.save(update_fields=['resolved'])
+        resolve_alerts(FraudAlert.objects.filter(pk=alert.pk))
 
         return Response({"id": alert.id,
                          "resolved": True,
@@ -720,46 +1270,126 @@ class FraudScoreView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
 
-    def get(selfself, request, user_id):
-        total = FraudAlert.objects.filter(user_id=user_id).aggregate(
-            total=models.Sum('score')
-        )["total"] or 0
+    @extend_schema(
+        tags=["Fraud"],
+        summary="Score de risco do colaborador",
+        description=(
+            "Retorna o score de risco atual do usuário: soma dos scores dos alertas em aberto, "
+            "com decaimento exponencial pela idade do alerta. "
+            "Disponível para o próprio colaborador e para administradores."
+        ),
+        responses={
+            200: OpenApiResponse(
+                description="Score de risco",
+                examples=[OpenApiExample("Score", value={"user_id": 3, "risk_score": 42.5, "half_life_days": 14})]
+            ),
+            403: OpenApiResponse(description="Permissão negada"),
+        }
+    )
+    def get(self, request, user_id):
+        if not request.user.is_staff and request.user.pk != user_id:
+            raise PermissionDenied("Permissão negada")
         return Response({
             "user_id": user_id,
-            "risk_score": total
+            "risk_score": round(get_risk_score(user_id), 2),
+            "half_life_days": settings.RISK_SCORE_HALF_LIFE_DAYS,
         })
 
 
+MAX_TOP_RISKY = 100
+
+
+class TopRiskyEmployeesView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        tags=["Fraud"],
+        summary="Colaboradores com maior risco",
+        description=(
+            "Ranking dos colaboradores pelo score de risco atual (alertas em aberto, com decaimento "
+            "exponencial), lido do score mantido a cada alerta criado ou resolvido."
+        ),
+        parameters=[
+            OpenApiParameter("limit", int, description=f"Quantidade (padrão 10, máximo {MAX_TOP_RISKY})"),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description="Ranking",
+                examples=[
+                    OpenApiExample(
+                        "Ranking",
+                        value=[
+                            {
+                                "employee_id": 3,
+                                "user_id": 5,
+                                "name": "João Silva",
+                                "matricula": "EMP01",
+                                "risk_score": 42.5,
+                                "last_alert_at": "2025-01-01T10:30:00Z"
+                            }
+                        ]
+                    )
+                ]
+            ),
+        }
+    )
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), MAX_TOP_RISKY)
+        except ValueError:
+            return Response({"detail": "limit inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response([
+            {
+                "employee_id": entry.employee_id,
+                "user_id": entry.employee.user_id,
+                "name": entry.employee.get_display_name(),
+                "matricula": entry.employee.matricula,
+                "risk_score": round(score, 2),
+                "last_alert_at": entry.last_alert_at,
+            }
+            for entry, score in top_risky_employees(limit)
+        ])
+
+
+def _fraud_admin_row(alert):
+    employee_name = "N/A"
+    matricula = "N/A"
+
+    if alert.work_shift and alert.work_shift.employee:
+        user = getattr(alert.work_shift.employee, "user", None)
+        employee_name = user.get_full_name() if user else "N/A"
+        matricula = getattr(alert.work_shift.employee, "id", "N/A")
+
+    return {
+        "id": alert.id,
+        "employee_name": employee_name,
+        "matricula": matricula,
+        "fraud_type": alert.fraud_type,
+        "description": alert.description,
+        "occurrences": alert.occurrences,
+        "created_at": alert.created_at.isoformat(),
+        "last_seen_at": (alert.last_seen_at or alert.created_at).isoformat(),
+        "resolved": alert.resolved
+    }
+
+
 @login_required
+@alert_feed_condition
 def frauds_admin_list(request):
     """
-    Retorna todos os alertas de fraude ordenados por criação
+    Retorna os alertas de fraude ordenados por criação, paginados por cursor
+    (cabeçalhos Link / X-Next-Cursor).
+    Com ?since=<X-Since-Cursor> retorna apenas os alertas criados ou alterados desde a última carga.
+    Responde 304 a If-None-Match/If-Modified-Since quando nada mudou.
     Acesso igual ao dashboard, sem necessidade de JWT.
     """
     alerts = FraudAlert.objects.select_related(
         "work_shift__employee__user"
     ).order_by("-created_at")
 
-    data = []
-    for alert in alerts:
-        employee_name = "N/A"
-        matricula = "N/A"
-
-        if alert.work_shift and alert.work_shift.employee:
-            user = getattr(alert.work_shift.employee, "user", None)
-            employee_name = user.get_full_name() if user else "N/A"
-            matricula = getattr(alert.work_shift.employee, "id", "N/A")
-
-        data.append({
-            "id": alert.id,
-            "employee_name": employee_name,
-            "matricula": matricula,
-            "fraud_type": alert.fraud_type,
-            "description": alert.description,
-            "created_at": alert.created_at.isoformat(),
-            "resolved": alert.resolved
-        })
-    return JsonResponse(data, safe=False)
+    return alert_feed_response(request, alerts, FraudAlertKeysetPagination(), _fraud_admin_row)
 
 
 
@@ -28,7 +28,8 @@ document.addEventListener('DOMContentLoaded', function () {
         totalDelay.textContent = '00:00';
         totalExtra.textContent = '00:00';
 
-        fetch(url)
+        // As linhas vêm paginadas; os totais já cobrem todo o período
+        const loadPage = (pageUrl) => fetch(pageUrl)
             .then(response => response.json())
             .then(data => {
                 console.log('Dados recebidos:', data);
@@ -59,7 +60,13 @@ document.addEventListener('DOMContentLoaded', function () {
                 totalDuration.textContent = data.totals.total_duration || '00:00';
                 totalDelay.textContent = data.totals.total_delay || '00:00';
                 totalExtra.textContent = data.totals.total_extra || '00:00';
-            })
+
+                if (data.next) {
+                    return loadPage(data.next);
+                }
+            });
+
+        loadPage(url)
             .catch(error => {
                 console.error(error);
                 alert('Erro ao carregar relatório');
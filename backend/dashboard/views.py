@@ -1,7 +1,15 @@
+import asyncio
+
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from attendance.models import WorkShift, FraudAlert
+from attendance.pagination import FraudAlertKeysetPagination
+from attendance.services.alert_feed import alert_feed_condition, alert_feed_response
+from attendance.services.event_broker import broker, format_sse, CHANNELS, ALERTS_CHANNEL
+
+# Intervalo de keepalive do stream de eventos (segundos)
+EVENT_STREAM_KEEPALIVE = 15
 
 def is_admin(user):
     return user.is_staff or user.is_superuser
@@ -42,31 +50,33 @@ def dashboard_home(request):
 
     return render(request, "dashboard/home.html", context)
 
+def _fraud_alert_row(f):
+    return {
+        "id": f.id,
+        "employee_name": f.work_shift.employee.user.get_full_name() if f.work_shift and f.work_shift.employee else "N/A",
+        "employee_email": f.work_shift.employee.user.email if f.work_shift and f.work_shift.employee else "N/A",
+        "matricula": f.work_shift.employee.matricula if f.work_shift and f.work_shift.employee else "N/A",
+        "fraud_type": f.fraud_type,
+        "severity": f.severity,
+        "score": f.score,
+        "description": f.description,
+        "occurrences": f.occurrences,
+        "created_at": f.created_at.isoformat(),
+        "last_seen_at": (f.last_seen_at or f.created_at).isoformat(),
+        "resolved": f.resolved,
+    }
+
+
 @login_required
-@login_required
+@alert_feed_condition
 def fraud_alerts_admin_json(request):
     try:
         print("Usuário:", request.user)
         if not request.user.is_staff and not request.user.is_superuser:
             return JsonResponse({"error": "Acesso negado"}, status=403)
 
-        frauds = FraudAlert.objects.select_related("work_shift", "work_shift__employee", "work_shift__employee__user").all()
-        data = []
-
-        for f in frauds:
-            data.append({
-                "id": f.id,
-                "employee_name": f.work_shift.employee.user.get_full_name() if f.work_shift and f.work_shift.employee else "N/A",
-                "employee_email": f.work_shift.employee.user.email if f.work_shift and f.work_shift.employee else "N/A",
-                "matricula": f.work_shift.employee.matricula if f.work_shift and f.work_shift.employee else "N/A",
-                "fraud_type": f.fraud_type,
-                "severity": f.severity,
-                "score": f.score,
-                "description": f.description,
-                "created_at": f.created_at.isoformat(),
-                "resolved": f.resolved,
-            })
-        return JsonResponse(data, safe=False)
+        frauds = FraudAlert.objects.select_related("work_shift", "work_shift__employee", "work_shift__employee__user")
+        return alert_feed_response(request, frauds, FraudAlertKeysetPagination(), _fraud_alert_row)
     except Exception as e:
         import traceback
         print("ERRO na view de fraudes:", e)
@@ -74,6 +84,44 @@ def fraud_alerts_admin_json(request):
         return JsonResponse({"error": "Erro interno no servidor"}, status=500)
 
 
+async def event_stream(request):
+    """
+    Stream de eventos (Server-Sent Events) para o painel: posições dos vistoriadores
+    e novos alertas de fraude. Substitui o polling periódico; exige servidor ASGI.
+    Parâmetro opcional ?channels=positions,alerts
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Não autenticado"}, status=401)
+
+    requested = request.GET.get("channels")
+    channels = [c for c in requested.split(",") if c in CHANNELS] if requested else list(CHANNELS)
+    if ALERTS_CHANNEL in channels and not is_admin(user):
+        channels.remove(ALERTS_CHANNEL)
+    if not channels:
+        return JsonResponse({"error": "Nenhum canal disponível"}, status=403)
+
+    queue = broker.subscribe(channels)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    channel, data = await asyncio.wait_for(queue.get(), timeout=EVENT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(channel, data)
+        finally:
+            broker.unsubscribe(queue)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @login_required
 def workshift_report_view(request):
     return render(request, "attendance/workshift_report.html")
\ No newline at end of file
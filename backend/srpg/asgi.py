@@ -3,6 +3,11 @@ ASGI config for srpg project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The dashboard event stream (/dashboard/events/) is a long-lived async view and
+must be served by this application under an ASGI server, e.g.:
+
+    uvicorn srpg.asgi:application --host 0.0.0.0 --port 8000
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
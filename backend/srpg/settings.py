@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 from datetime import timedelta
@@ -64,6 +65,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "attendance.middleware.QueryBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -102,6 +104,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Banco de testes em arquivo: processos de pool (rescan_frauds) precisam enxergá-lo
+        "TEST": {"NAME": BASE_DIR / "var" / "test_db.sqlite3"},
     }
 }
 
@@ -174,4 +178,86 @@ API_BASE_URL = "http://127.0.0.1:8000/api"
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
-}
\ No newline at end of file
+    # Refresh tokens revogados (claim "gen" antigo) não emitem novos access tokens
+    "TOKEN_REFRESH_SERIALIZER": "accounts.views.GenerationTokenRefreshSerializer",
+}
+
+# Cache
+# "shared" deve ser visível a todos os processos/workers (revogação de tokens,
+# estado de jornada). Em produção, SHARED_CACHE_URL aponta para o Redis (incr atômico);
+# sem ela, cache em arquivo para desenvolvimento.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "var" / "cache",
+    },
+}
+if os.environ.get("SHARED_CACHE_URL"):
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["SHARED_CACHE_URL"],
+    }
+
+TEST_RUNNER = "srpg.test_runner.TestRunner"
+
+# Relatórios em PDF (espelho de ponto)
+# Workers do pool de geração (0 = gerar na própria requisição), prazo de um job em
+# andamento (segundos) e cache dos PDFs gerados, com a idade máxima de cada arquivo (segundos)
+REPORT_PDF_WORKERS = 2
+REPORT_PDF_RENDER_DEADLINE = 60 * 5
+REPORT_PDF_CACHE_DIR = BASE_DIR / "var" / "reports"
+REPORT_PDF_CACHE_TTL = 60 * 60 * 24
+
+# Arquivo frio das trilhas (pontos de localização) de jornadas antigas:
+# arquivos colunares comprimidos por mês, gerados pelo comando archive_tracks
+TRACK_ARCHIVE_DIR = BASE_DIR / "var" / "track_archive"
+TRACK_ARCHIVE_AFTER_DAYS = 180
+
+# Compressão (simplificação com perda) das trilhas de jornadas encerradas, feita em lote pelo
+# comando compress_tracks; até lá a reavaliação de fraudes e o playback usam os pontos brutos
+TRACK_COMPRESS_AFTER_DAYS = 30
+
+# Alertas de fraude repetidos (mesmo usuário, jornada e tipo) dentro da janela são
+# agrupados em um único registro com contador de ocorrências (0 = desativado).
+# O registro agrupado é um incidente: conta uma vez no alert_count do resumo diário e
+# uma vez no score de risco (pelo score e criação do alerta); as repetições ficam só em
+# `occurrences`, para que um app repetindo envios não infle o risco do funcionário
+FRAUD_ALERT_COALESCE_SECONDS = 600
+
+# Score de risco por funcionário: peso de um alerta cai pela metade a cada meia-vida
+RISK_SCORE_HALF_LIFE_DAYS = 14
+
+# Feed de posições do tracking: remoções (jornadas encerradas) ficam disponíveis por este período;
+# clientes com cursor mais antigo recebem a lista completa. O cursor só avança até as gravações
+# com mais de POSITION_FEED_SETTLE_SECONDS (maior que a duração de uma transação de tracking)
+POSITION_TOMBSTONE_TTL_HOURS = 24
+POSITION_FEED_SETTLE_SECONDS = 5
+
+# Orçamento de consultas SQL por view (nome da rota, com namespace quando houver), conferido pelo
+# QueryBudgetMiddleware: "queries" = total da requisição (inclui sessão e usuário), "duplicates" =
+# execuções repetidas do mesmo SQL parametrizado (N+1). Violações geram aviso no log
+# "attendance.query_budget"; com QUERY_BUDGET_RAISE (ativo na suíte de testes) a requisição falha.
+# QUERY_BUDGET_HEADERS (padrão: DEBUG) expõe X-Query-Count/X-Query-Time-Ms nas respostas.
+QUERY_BUDGETS = {
+    "shift-start": {"queries": 14},
+    "shift-end": {"queries": 28},
+    "shift-tracking": {"queries": 20},
+    "shift-tracking-dashboard": {"queries": 4, "duplicates": 0},
+    "shift-tracking-feed": {"queries": 6, "duplicates": 0},
+    "shift-tracking-clusters": {"queries": 4, "duplicates": 0},
+    "shift-tracking-nearest": {"queries": 5, "duplicates": 0},
+    "shift-playback": {"queries": 6, "duplicates": 0},
+    "fraud-alerts": {"queries": 4, "duplicates": 0},
+    "fraud-alerts-all": {"queries": 4, "duplicates": 0},
+    "fraud-admin-json": {"queries": 5, "duplicates": 0},
+    "fraud-score-top": {"queries": 4, "duplicates": 0},
+    "dashboard:fraud-alerts-json": {"queries": 5, "duplicates": 0},
+    "dashboard:dashboard-home": {"queries": 4, "duplicates": 0},
+    "admin:attendance_workshift_changelist": {"queries": 6, "duplicates": 0},
+    "admin:attendance_fraudalert_changelist": {"queries": 5, "duplicates": 0},
+}
+QUERY_BUDGET_RAISE = False
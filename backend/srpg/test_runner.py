@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class SharedCacheResetResult(unittest.TextTestResult):
+    """
+    Limpa o cache compartilhado antes de cada teste: o banco é revertido entre testes
+    (e os ids reaproveitados), então o estado em cache também precisa ser.
+    """
+
+    def startTest(self, test):
+        caches["shared"].clear()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Isola o cache compartilhado (arquivo) em um diretório temporário por execução,
+    para que revogações e estado de jornada não vazem entre execuções da suíte,
+    e transforma violações do orçamento de consultas por view em erro.
+    """
+
+    def get_resultclass(self):
+        return super().get_resultclass() or SharedCacheResetResult
+
+    def setup_databases(self, **kwargs):
+        # O banco de testes fica em var/ (ver DATABASES["default"]["TEST"])
+        os.makedirs(settings.BASE_DIR / "var", exist_ok=True)
+        return super().setup_databases(**kwargs)
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix="srpg-cache-")
+        caches = {alias: dict(config) for alias, config in settings.CACHES.items()}
+        caches["shared"]["LOCATION"] = self._cache_dir
+        # Views acima do orçamento de consultas (QUERY_BUDGETS) fazem o teste falhar
+        self._cache_override = override_settings(CACHES=caches, QUERY_BUDGET_RAISE=True)
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)